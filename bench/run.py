@@ -0,0 +1,244 @@
+"""
+Clibato Benchmarks
+
+Generates a synthetic tree of dotfiles, then times backups and restores
+of it for each destination type, using a local bare repository as the
+Git remote. Results are written as JSON, to track regressions.
+
+Usage:
+    python -m bench.run --files 10 1000 100000 --output results.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+
+from git import Repo
+
+from clibato import Config
+
+ROOT = Path(__file__).parent.parent
+DESTINATIONS = ['directory', 'repository', 'repository-tree']
+LAYOUTS = ['files', 'tree']
+
+
+def generate_tree(path: Path, files: int, large_ratio: float, small_size: int,
+                  large_size: int, seed: int = 0) -> List[str]:
+    """
+    Generates a tree of files, shaped like a home directory.
+
+    A few files are at the top, like .bashrc, and the rest are nested in
+    directories of up to 100 files each, like ~/.config.
+
+    :param path: Directory in which to generate the files.
+    :param files: Number of files.
+    :param large_ratio: Fraction of large files, e.g. 0.01.
+    :param small_size: Size of small files, in bytes.
+    :param large_size: Size of large files, in bytes.
+    :param seed: Seed for file contents.
+    :return: Relative paths of the files, in POSIX format.
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for i in range(files):
+        if i < 10:
+            relative_path = f'.dotfile-{i}'
+        else:
+            relative_path = f'.config/app-{i // 1000}/dir-{i // 100 % 10}/file-{i}.conf'
+
+        size = large_size if rng.random() < large_ratio else small_size
+        (path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (path / relative_path).write_bytes(_random_bytes(rng, size))
+        paths.append(relative_path)
+
+    return paths
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    # Random.randbytes() needs Python 3.9.
+    if not size:
+        return b''
+
+    return rng.getrandbits(8 * size).to_bytes(size, 'little')
+
+
+def modify_tree(path: Path, paths: List[str], ratio: float, seed: int = 1) -> int:
+    """
+    Appends to a fraction of the files in a tree.
+
+    :return: Number of files modified.
+    """
+    rng = random.Random(seed)
+    modified = rng.sample(paths, max(1, int(len(paths) * ratio)))
+    for relative_path in modified:
+        with open(path / relative_path, 'ab') as fh:
+            fh.write(b'# modified\n')
+
+    return len(modified)
+
+
+def build_config(paths: List[str], source_path: Path, layout: str, destination: dict) -> dict:
+    """Builds a clibato configuration for a tree."""
+    if layout == 'tree':
+        contents = {'home': {'source': str(source_path)}}
+    else:
+        contents = {path: str(source_path / path) for path in paths}
+
+    return {'contents': contents, 'destination': destination}
+
+
+def build_destination(name: str, backup_path: Path, remote_path: Path, jobs: int) -> dict:
+    """Builds the configuration of a destination."""
+    if name == 'directory':
+        return {'type': 'directory', 'path': str(backup_path), 'jobs': jobs}
+
+    return {
+        'type': 'repository',
+        'path': str(backup_path),
+        'remote': str(remote_path),
+        'jobs': jobs,
+        'worktree': name == 'repository',
+    }
+
+
+def timed(func, *args) -> float:
+    """Calls a function and returns the elapsed time, in seconds."""
+    start = time.perf_counter()
+    func(*args)
+    return round(time.perf_counter() - start, 6)
+
+
+def run_case(files: int, destination: str, layout: str, args) -> dict:
+    """
+    Runs a benchmark case in temporary directories.
+
+    Phases:
+    - backup_full: First backup.
+    - backup_unchanged: Backup without changes.
+    - backup_modified: Backup after modifying a fraction of the files.
+    - restore_full: Restore into an empty directory.
+
+    :return: A result dictionary.
+    """
+    with TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        source_path = temp_path / 'source'
+        restore_path = temp_path / 'restore'
+        backup_path = temp_path / 'backup'
+        remote_path = temp_path / 'remote.git'
+        for path in [source_path, restore_path, backup_path]:
+            path.mkdir()
+        Repo.init(remote_path, bare=True)
+
+        start = time.perf_counter()
+        paths = generate_tree(
+            source_path, files, args.large_ratio, args.small_size, args.large_size, args.seed
+        )
+        generate_seconds = round(time.perf_counter() - start, 6)
+        total_bytes = sum((source_path / path).stat().st_size for path in paths)
+
+        destination_data = build_destination(destination, backup_path, remote_path, args.jobs)
+        start = time.perf_counter()
+        config = Config.from_dict(build_config(paths, source_path, layout, dict(destination_data)))
+        config_seconds = round(time.perf_counter() - start, 6)
+        dest = config.destination()
+
+        phases = {
+            'config': config_seconds,
+            'backup_full': timed(dest.backup, config.contents()),
+            'backup_unchanged': timed(dest.backup, config.contents()),
+        }
+        modified = modify_tree(source_path, paths, args.modify_ratio, args.seed + 1)
+        phases['backup_modified'] = timed(dest.backup, config.contents())
+
+        restore_config = Config.from_dict(
+            build_config(paths, restore_path, layout, dict(destination_data))
+        )
+        phases['restore_full'] = timed(
+            restore_config.destination().restore, restore_config.contents()
+        )
+
+        return {
+            'destination': destination,
+            'layout': layout,
+            'files': files,
+            'bytes': total_bytes,
+            'modified': modified,
+            'jobs': args.jobs,
+            'generate_seconds': generate_seconds,
+            'seconds': phases,
+            'counters': dest.counters().as_dict(),
+        }
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parses CLI arguments."""
+    parser = argparse.ArgumentParser(prog='python -m bench.run', description='Clibato Benchmarks')
+    parser.add_argument('--files', type=int, nargs='+', default=[10, 1000],
+                        help='Numbers of files to benchmark with.')
+    parser.add_argument('--destinations', nargs='+', choices=DESTINATIONS, default=DESTINATIONS,
+                        help='Destinations to benchmark.')
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=['files'],
+                        help='One content per file, or a single directory content.')
+    parser.add_argument('--small-size', type=int, default=512,
+                        help='Size of small files, in bytes.')
+    parser.add_argument('--large-size', type=int, default=4 * 1024 * 1024,
+                        help='Size of large files, in bytes.')
+    parser.add_argument('--large-ratio', type=float, default=0.001,
+                        help='Fraction of large files.')
+    parser.add_argument('--modify-ratio', type=float, default=0.01,
+                        help='Fraction of files modified before the incremental backup.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of files to copy in parallel.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for generated file contents.')
+    parser.add_argument('--output', type=Path,
+                        help='Write results to a JSON file, instead of stdout.')
+
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    """Runs the benchmarks."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.getLogger('clibato').setLevel(logging.ERROR)
+
+    results = []
+    for files in args.files:
+        for destination in args.destinations:
+            for layout in args.layouts:
+                result = run_case(files, destination, layout, args)
+                results.append(result)
+                timings = ', '.join(
+                    f'{phase} {seconds:.3f}s' for phase, seconds in result['seconds'].items()
+                )
+                print(f'{destination:>16} {layout:>5} {files:>7} files: {timings}', file=sys.stderr)
+
+    report = {
+        'version': (ROOT / 'VERSION').read_text().strip() or None,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Clibato Startup Benchmarks
+
+Times cold starts of Python processes which import Clibato, or run short
+commands like "clibato version", to catch imports which slow down every
+invocation. Results are written as JSON, to track regressions.
+
+Usage:
+    python -m bench.startup --runs 20 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).parent.parent
+
+CASES = {
+    'python': 'pass',
+    'import': 'import clibato',
+    'version': 'import clibato; clibato.Clibato().execute(["version"])',
+    'import-repository': 'import clibato; clibato.Repository',
+}
+
+# Prints the public top-level modules which were imported, to stderr, since
+# the snippet might print to stdout.
+MODULES = (
+    'import sys; {code}; '
+    'print(" ".join(sorted({{name.partition(".")[0] for name in sys.modules}})), file=sys.stderr)'
+)
+
+ENV = dict(os.environ, PYTHONPATH=str(ROOT))
+
+
+def imported_modules(code: str) -> List[str]:
+    """
+    Lists the top-level modules which a Python snippet imports.
+
+    :param code: Python code.
+    :return: Module names, including those of the interpreter itself.
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', MODULES.format(code=code)],
+        env=ENV, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    ).stderr
+
+    return [name for name in output.split() if not name.startswith('_')]
+
+
+def run_case(code: str, runs: int, baseline: List[str] = ()) -> dict:
+    """
+    Times a Python snippet, each run in a new process.
+
+    :param code: Python code.
+    :param runs: Number of runs.
+    :param baseline: Modules not to list, e.g. those of a bare interpreter.
+    :return: Timings, in seconds, and the modules imported.
+    """
+    env = ENV
+    command = [sys.executable, '-c', code]
+
+    # Warm up, so that bytecode is compiled and files are cached.
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+
+    modules = sorted(set(imported_modules(code)) - set(baseline))
+
+    return {
+        'seconds': {
+            'min': round(min(seconds), 4),
+            'median': round(statistics.median(seconds), 4),
+            'max': round(max(seconds), 4),
+        },
+        'modules': modules,
+    }
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parses CLI arguments."""
+    parser = argparse.ArgumentParser(
+        prog='python -m bench.startup',
+        description='Clibato Startup Benchmarks'
+    )
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES),
+                        help='Cases to benchmark.')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Number of runs per case.')
+    parser.add_argument('--output', type=Path,
+                        help='Write results to a JSON file, instead of stdout.')
+
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    """Runs the benchmarks."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    # Modules of a bare interpreter. sys.stdlib_module_names needs Python 3.10.
+    baseline = imported_modules(CASES['python'])
+
+    results = []
+    for name in args.cases:
+        result = run_case(CASES[name], args.runs, baseline)
+        results.append({'case': name, **result})
+        print(f'{name:>17}: median {result["seconds"]["median"]:.3f}s', file=sys.stderr)
+
+    report = {
+        'version': (ROOT / 'VERSION').read_text().strip() or None,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,41 @@
 import argparse
+import importlib
+import json
 import logging
+import sys
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 from shutil import copyfile
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from .config import Config
-from .content import Content
-from .destination import Destination, Directory, Repository
+from .content import Content, ContentTree
+from .destination import Archive, Destination, Directory, Fanout, Snapshots, Store
+from .manifest import Manifest, ManifestEntry
+from .plan import Operation, Plan
+from .stats import Stats
+from . import stats
 from .error import *
 
 logger = logging.getLogger('clibato')
 
+# Only imported if used: repositories import GitPython, which is slow to
+# import, watches import ctypes, and the server is only needed by "clibato
+# serve" and its clients.
+_LAZY_MODULES = {
+    'Repository': '.repository',
+    'Server': '.server',
+    'Watch': '.watch',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return getattr(importlib.import_module(_LAZY_MODULES[name], __name__), name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 class Clibato:
     """Clibato Controller"""
@@ -34,7 +59,8 @@ class Clibato:
 
         try:
             method = getattr(self, self._args.action)
-            method()
+            with self._instrument():
+                method()
         except (ConfigError, ActionError) as error:
             logger.error(error)
             return False
@@ -59,20 +85,78 @@ class Clibato:
 
     def backup(self):
         """Action: Create backup"""
-        config = self.config()
-        dest = config.destination()
-        dest.backup(config.contents())
+        if self._args.socket:
+            self._request('backup')
+        else:
+            config = self.config()
+            dest = self._destination(config)
+            dest.backup(config.contents())
 
         print('Backup completed.')
 
     def restore(self):
         """Action: Restore backup"""
-        config = self.config()
-        dest = config.destination()
-        dest.restore(config.contents())
+        if self._args.socket:
+            self._request('restore', revision=self._args.revision)
+        else:
+            config = self.config()
+            dest = self._destination(config)
+
+            if self._args.revision:
+                dest.restore_at(config.contents(), self._args.revision)
+            else:
+                dest.restore(config.contents())
 
         print('Restore completed.')
 
+    def serve(self):
+        """Action: Serve backups and restores over a Unix socket, until interrupted"""
+        # pylint: disable=import-outside-toplevel
+        import signal
+        from .server import Server
+
+        subject = Server(self._socket_path(), self._args.jobs)
+
+        # Stop gracefully, e.g. when a service manager stops the server,
+        # i.e. after the current request, so a backup isn't cut in half.
+        signal.signal(signal.SIGTERM, lambda *_: subject.shutdown())
+
+        print(f'Serving on {subject.socket_path()}. Press Ctrl+C to stop.')
+        try:
+            subject.serve()
+        except KeyboardInterrupt:
+            pass
+
+        print('Server stopped.')
+
+    def plan(self):
+        """Action: Plan a backup or restore, without changing anything"""
+        config = self.config()
+        dest = self._destination(config)
+
+        if self._args.plan_action == 'restore':
+            plan = dest.plan_restore(config.contents())
+        else:
+            plan = dest.plan_backup(config.contents())
+
+        print(plan.to_json())
+
+    def watch(self):
+        """Action: Back up contents as they change, until interrupted"""
+        from .watch import Watch  # pylint: disable=import-outside-toplevel
+
+        config = self.config()
+        dest = self._destination(config)
+
+        with Watch(config.contents(), dest, self._args.delay, self._args.poll) as watch:
+            print('Watching for changes. Press Ctrl+C to stop.')
+            try:
+                watch.run()
+            except KeyboardInterrupt:
+                pass
+
+        print('Watch stopped.')
+
     def version(self):
         """Action: Version"""
         with open(self.ROOT / 'VERSION') as fh:
@@ -88,11 +172,98 @@ class Clibato:
 
         :return: A Config object.
         """
+        with stats.phase('config'):
+            return Config.from_file(self._config_path())
+
+    def _config_path(self) -> Path:
         path = Config.locate(self._args.config_path)
         if path is None:
             raise ConfigError(f'Configuration not found: {self._args.config_path}')
 
-        return Config.from_file(path)
+        return path
+
+    def _request(self, action: str, **kwargs) -> None:
+        """
+        Forwards an action to "clibato serve".
+
+        :param action: backup or restore.
+        :param kwargs: Other arguments of the action, e.g. revision.
+        """
+        from . import server  # pylint: disable=import-outside-toplevel
+
+        if self._args.jobs:
+            raise ActionError('Use --jobs with "clibato serve", instead of with --socket.')
+
+        server.request(self._socket_path(), {
+            'action': action,
+            'config': str(self._config_path().resolve()),
+            'level': logging.getLogger('clibato').getEffectiveLevel(),
+            **kwargs
+        })
+
+    def _socket_path(self) -> Path:
+        """The path given with --socket, or the default one."""
+        from .server import Server  # pylint: disable=import-outside-toplevel
+
+        if isinstance(self._args.socket, Path):
+            return self._args.socket
+
+        return Server.default_socket_path()
+
+    @contextmanager
+    def _instrument(self) -> Iterator[None]:
+        """
+        Records stats of, and profiles, the action, as per --stats,
+        --stats-file and --profile. They are reported even if it fails.
+        """
+        show = getattr(self._args, 'stats', False)
+        stats_path = getattr(self._args, 'stats_file', None)
+        profile_path = getattr(self._args, 'profile', None)
+        if not (show or stats_path or profile_path):
+            yield
+            return
+
+        import cProfile  # pylint: disable=import-outside-toplevel
+
+        profiler = cProfile.Profile() if profile_path else None
+        date = datetime.now().astimezone().isoformat(timespec='seconds')
+        ok = False
+
+        with stats.recording() as recorded:
+            if profiler:
+                profiler.enable()
+
+            try:
+                yield
+                ok = True
+            finally:
+                if profiler:
+                    profiler.disable()
+                    profiler.dump_stats(str(profile_path))
+                    logger.info('Profile written: %s', profile_path)
+
+                if show:
+                    # Plans are printed to stdout, so stats go to stderr.
+                    print(recorded.summary(), file=sys.stderr)
+
+                if stats_path:
+                    data = {'action': self._args.action, 'ok': ok, 'date': date}
+                    with open(stats_path, 'w') as fh:
+                        json.dump({**data, **recorded.to_dict()}, fh, indent=2)
+                    logger.info('Stats written: %s', stats_path)
+
+    def _destination(self, config: Config) -> Destination:
+        """
+        Get the configured Destination, with CLI overrides applied.
+
+        :param config: A Config object.
+        :return: A Destination object.
+        """
+        dest = config.destination()
+        if self._args.jobs:
+            dest.set_jobs(self._args.jobs)
+
+        return dest
 
     def _init_logger(self) -> None:
         level = logging.WARNING
@@ -129,8 +300,70 @@ class Clibato:
 
         subparsers = main_parser.add_subparsers(dest='action')
         subparsers.add_parser('init', help='Initialize configuration', parents=[common_parser])
-        subparsers.add_parser('backup', help='Create backup', parents=[common_parser])
-        subparsers.add_parser('restore', help='Restore backup', parents=[common_parser])
+        transfer_parser = Clibato._transfer_argparser()
+        client_parser = Clibato._client_argparser()
+        stats_parser = Clibato._stats_argparser()
+        subparsers.add_parser(
+            'backup',
+            help='Create backup',
+            parents=[common_parser, transfer_parser, client_parser, stats_parser]
+        )
+        restore_parser = subparsers.add_parser(
+            'restore',
+            help='Restore backup',
+            parents=[common_parser, transfer_parser, client_parser, stats_parser]
+        )
+        restore_parser.add_argument(
+            '--at',
+            metavar='REV',
+            dest='revision',
+            help='Restore the backup as of a Git revision, e.g. main~3.'
+        )
+        plan_parser = subparsers.add_parser(
+            'plan',
+            help='Show what a backup or restore would do, as JSON',
+            parents=[common_parser, transfer_parser, stats_parser]
+        )
+        plan_parser.add_argument(
+            'plan_action',
+            nargs='?',
+            default='backup',
+            choices=['backup', 'restore'],
+            help='The action to plan.'
+        )
+        watch_parser = subparsers.add_parser(
+            'watch',
+            help='Back up contents as they change',
+            parents=[common_parser, transfer_parser, stats_parser]
+        )
+        watch_parser.add_argument(
+            '--delay',
+            type=Clibato._positive_float,
+            # Watch.DELAY, without importing the watch.
+            default=1.0,
+            metavar='SECONDS',
+            dest='delay',
+            help='Back up once no changes happen for this long.'
+        )
+        watch_parser.add_argument(
+            '--poll',
+            action='store_true',
+            dest='poll',
+            help='Poll for changes, instead of using inotify.'
+        )
+        serve_parser = subparsers.add_parser(
+            'serve',
+            help='Serve backups and restores over a Unix socket',
+            parents=[common_parser, transfer_parser]
+        )
+        serve_parser.add_argument(
+            '--socket',
+            type=Path,
+            default=None,
+            metavar='PATH',
+            dest='socket',
+            help='Path to the Unix socket.'
+        )
         subparsers.add_parser('version', help='Version information', parents=[common_parser])
 
         return main_parser
@@ -157,3 +390,87 @@ class Clibato:
         )
 
         return common_parser
+
+    @staticmethod
+    def _transfer_argparser():
+        transfer_parser = argparse.ArgumentParser(add_help=False)
+        transfer_parser.add_argument(
+            '-j',
+            '--jobs',
+            type=Clibato._positive_int,
+            default=None,
+            action='store',
+            dest='jobs',
+            help='Number of files to copy in parallel.'
+        )
+
+        return transfer_parser
+
+    @staticmethod
+    def _client_argparser():
+        client_parser = argparse.ArgumentParser(add_help=False)
+        client_parser.add_argument(
+            '--socket',
+            type=Path,
+            nargs='?',
+            default=None,
+            # The default path, see _socket_path().
+            const=True,
+            metavar='PATH',
+            dest='socket',
+            help='Forward the action to "clibato serve", listening on a Unix socket.'
+        )
+
+        return client_parser
+
+    @staticmethod
+    def _stats_argparser():
+        stats_parser = argparse.ArgumentParser(add_help=False)
+        stats_parser.add_argument(
+            '--stats',
+            action='store_true',
+            dest='stats',
+            help='Print the duration, files and bytes of each phase, e.g. git_push.'
+        )
+        stats_parser.add_argument(
+            '--stats-file',
+            type=Path,
+            default=None,
+            metavar='PATH',
+            dest='stats_file',
+            help='Write the stats to a file, as JSON.'
+        )
+        stats_parser.add_argument(
+            '--profile',
+            type=Path,
+            default=None,
+            metavar='PATH',
+            dest='profile',
+            help='Write cProfile output to a file, e.g. for "python -m pstats".'
+        )
+
+        return stats_parser
+
+    @staticmethod
+    def _positive_int(value: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            number = 0
+
+        if number < 1:
+            raise argparse.ArgumentTypeError(f'Must be a positive integer: {value}')
+
+        return number
+
+    @staticmethod
+    def _positive_float(value: str) -> float:
+        try:
+            number = float(value)
+        except ValueError:
+            number = 0
+
+        if not number > 0:
+            raise argparse.ArgumentTypeError(f'Must be a positive number: {value}')
+
+        return number
@@ -1,9 +1,13 @@
 """Clibato Configuration"""
 
+import copy
+import hashlib
 import logging
+import os
+import pickle
+import tempfile
 from pathlib import Path
-from typing import List, Optional
-import yaml
+from typing import List, Optional, Tuple
 
 from .content import Content
 from .destination import Destination
@@ -17,6 +21,9 @@ class Config:
 
     DEFAULT_FILENAME = '.clibato.yml'
 
+    # Increment when the cached objects change, e.g. Content attributes.
+    CACHE_VERSION = 2
+
     def __init__(self, contents: List[Content], destination: Destination):
         self._contents = contents
         self._destination = destination
@@ -55,8 +62,9 @@ class Config:
             missing_keys.sort()
             raise ConfigError('Config has missing keys: %s' % ', '.join(missing_keys))
 
-        for key in required_keys:
-            if not isinstance(data[key], dict):
+        # The destination can also be a list of destinations.
+        for key, types in [('contents', dict), ('destination', (dict, list))]:
+            if not isinstance(data[key], types):
                 raise ConfigError('Config has illegal value for: %s' % key)
 
         return Config(
@@ -69,6 +77,10 @@ class Config:
         """
         Create Config object from a YAML file.
 
+        The validated contents are cached, so that the file is only parsed
+        again if it changes. The destination is created from the cache each
+        time, since its validation depends on the state of the filesystem.
+
         :except ConfigError
 
         :param path: path/to/config.yml
@@ -76,14 +88,91 @@ class Config:
         """
         logger.info('Loading configuration: %s', path)
 
+        key = Config._cache_key(path)
+        cached = Config._read_cache(key)
+        if cached:
+            logger.debug('Loaded configuration from cache')
+            contents, destination = cached
+            return Config(contents, Destination.from_dict(destination))
+
+        # PyYAML is slow to import, and not needed if the config is cached.
+        import yaml  # pylint: disable=import-outside-toplevel
+
+        # The C loader is much faster, but only available if PyYAML was built with libyaml.
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
         try:
-            data = open(str(path), 'r').read()
-            logger.debug(data)
-            data = yaml.safe_load(data)
+            with open(str(path), 'r') as fh:
+                data = yaml.load(fh, Loader=loader)
         except yaml.YAMLError as error:
             raise ConfigError(error) from error
 
-        return Config.from_dict(data)
+        # Destination.from_dict() modifies the data.
+        destination = copy.deepcopy(data.get('destination')) if isinstance(data, dict) else None
+        config = Config.from_dict(data)
+        Config._write_cache(key, (config.contents(), destination))
+
+        return config
+
+    @staticmethod
+    def cache_dir() -> Path:
+        """Directory for cached configurations, i.e. $XDG_CACHE_HOME/clibato"""
+        root = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+        return Path(root, 'clibato')
+
+    @staticmethod
+    def _cache_key(path: Path) -> dict:
+        """Things which, if changed, invalidate the cached config."""
+        path = Path(path).resolve()
+        stat = os.stat(path)
+
+        return {
+            'version': Config.CACHE_VERSION,
+            'path': str(path),
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'inode': stat.st_ino,
+            # Source paths default to the home directory.
+            'home': str(Path.home()),
+        }
+
+    @staticmethod
+    def _cache_path(key: dict) -> Path:
+        name = hashlib.sha1(key['path'].encode()).hexdigest()
+        return Config.cache_dir() / f'config-{name}.pickle'
+
+    @staticmethod
+    def _read_cache(key: dict) -> Optional[Tuple[List[Content], object]]:
+        """Get the cached (contents, destination data), if still valid."""
+        try:
+            with open(Config._cache_path(key), 'rb') as fh:
+                cached_key, value = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as error:  # pylint: disable=broad-except
+            # An unreadable cache is only a cache miss.
+            logger.debug('Ignoring config cache: %s', error)
+            return None
+
+        return value if cached_key == key else None
+
+    @staticmethod
+    def _write_cache(key: dict, value: Tuple[List[Content], object]) -> None:
+        path = Config._cache_path(key)
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+        except OSError as error:
+            logger.debug('Cannot write config cache: %s', error)
+            return
+
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except OSError as error:
+            logger.debug('Cannot write config cache: %s', error)
+            os.unlink(temp_path)
 
     @staticmethod
     def locate(path: Path) -> Optional[Path]:
@@ -1,18 +1,27 @@
+import logging
+import os
+import re
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
 
 from .error import ConfigError
 
+logger = logging.getLogger('clibato')
+
 
 class Content:
     """Clibato Content: An item for backup/restore."""
 
-    def __init__(self, backup_path: str, source_path: str = None):
+    # Configs can have many thousands of contents, and trees expand to more.
+    __slots__ = ('_backup_path', '_source_path')
+
+    def __init__(self, backup_path: str, source_path: str = None, home: Path = None):
         self._backup_path = Path(backup_path)
 
         if source_path:
             self._source_path = Path(source_path)
         else:
-            self._source_path = Path.home() / self._backup_path
+            self._source_path = (home or Path.home()) / self._backup_path
 
         self._validate()
 
@@ -31,12 +40,39 @@ class Content:
         """Path to backup file."""
         return self._backup_path
 
+    def expand(
+        self,
+        root: Path = None,  # pylint: disable=unused-argument
+        paths: Iterable[str] = None  # pylint: disable=unused-argument
+    ) -> Iterator['Content']:
+        """
+        Get the files represented by this content.
+
+        :param root: Ignored. See ContentTree.expand().
+        :param paths: Ignored. See ContentTree.expand().
+        :return: An iterator of Content objects.
+        """
+        yield self
+
+    def match(self, backup_path: str) -> Optional['Content']:
+        """
+        Get the file represented by this content at a backup path.
+
+        :param backup_path: A relative path, e.g. hole/.wabbit
+        :return: A Content object, if the path belongs to this content.
+        """
+        return self if self._backup_path.as_posix() == backup_path else None
+
     def _validate(self):
         if self._backup_path.is_absolute():
             raise ConfigError(f'Backup path cannot be absolute: {self._backup_path}')
 
+        parts = self._backup_path.parts
+        if not parts:
+            raise ConfigError('Backup path cannot be empty')
+
         for illegal_part in ['..', '~']:
-            if illegal_part in self._backup_path.parts:
+            if illegal_part in parts:
                 raise ConfigError(f'Backup path cannot contain: {illegal_part}')
 
         self._source_path = self._source_path.expanduser()
@@ -49,16 +85,382 @@ class Content:
         Create Content objects from a dictionary.
 
         The keys of the dictionary should be the backup paths, and the values,
-        if any, will be treated as source paths.
+        if any, will be treated as source paths. Source paths containing
+        wildcards, and dictionaries, result in ContentTree objects.
+
+        Backup paths must be unique, and cannot be nested in one another,
+        since their backups would overwrite each other.
 
         :param data: A dictionary.
         :return: A list of Content objects.
         """
+        home = Path.home()
         contents = []
         for backup_path in data:
             source_path = data[backup_path]
-            if not isinstance(source_path, str) and (source_path is not None):
+
+            if isinstance(source_path, dict):
+                contents.append(ContentTree.from_dict(backup_path, source_path, home))
+            elif isinstance(source_path, str) and ContentTree.is_glob(source_path):
+                contents.append(ContentTree.from_glob(backup_path, source_path))
+            elif not isinstance(source_path, str) and (source_path is not None):
                 raise ConfigError(f'Illegal source path for {backup_path}: {source_path}')
-            contents.append(Content(backup_path, source_path))
+            else:
+                contents.append(Content(backup_path, source_path, home))
+
+        _check_overlaps(contents)
 
         return contents
+
+
+class ContentTree(Content):
+    """
+    Clibato Content Tree: A directory of items for backup/restore.
+
+    Files are discovered lazily, by walking the directory. Include and
+    exclude patterns are globs, where * doesn't match /, and ** matches
+    anything. Like in .gitignore, patterns without a / are matched against
+    file names, others against paths relative to the directory. Excluded
+    directories are not walked at all, and neither are directories which
+    no include pattern can reach, e.g. with /*.vim, only the top level.
+    """
+
+    __slots__ = ('_include', '_exclude', '_include_patterns', '_exclude_patterns')
+
+    GLOB_CHARS = re.compile(r'[*?\[]')
+
+    def __init__(
+        self,
+        backup_path: str,
+        source_path: str = None,
+        include: List[str] = None,
+        exclude: List[str] = None,
+        home: Path = None
+    ):
+        self._include = list(include or [])
+        self._exclude = list(exclude or [])
+
+        super().__init__(backup_path, source_path, home)
+
+        self._include_patterns = _Patterns(self._include)
+        self._exclude_patterns = _Patterns(self._exclude)
+
+    def __eq__(self, other):
+        return (
+            super().__eq__(other) and
+            self.include() == other.include() and
+            self.exclude() == other.exclude()
+        )
+
+    def include(self) -> List[str]:
+        """Patterns of files to include. Empty means all files."""
+        return self._include
+
+    def exclude(self) -> List[str]:
+        """Patterns of files and directories to exclude."""
+        return self._exclude
+
+    def expand(self, root: Path = None, paths: Iterable[str] = None) -> Iterator[Content]:
+        """
+        Get the files represented by this content.
+
+        :param root: Look for files in $root/$backup_path, instead of the
+            source path, e.g. while restoring from a directory.
+        :param paths: Look for files in a list of backup paths, instead of
+            the filesystem, e.g. while restoring from an archive.
+        :return: An iterator of Content objects.
+        """
+        if paths is not None:
+            for path in paths:
+                content = self.match(path)
+                if content:
+                    yield content
+            return
+
+        directory = root / self._backup_path if root else self._source_path
+        for relative_path in self._walk(directory):
+            yield self._content(relative_path)
+
+    def match(self, backup_path: str) -> Optional[Content]:
+        prefix = self._backup_path.as_posix() + '/'
+        if not backup_path.startswith(prefix):
+            return None
+
+        relative_path = backup_path[len(prefix):]
+        parents = relative_path.split('/')[:-1]
+        for i in range(len(parents)):
+            if self._exclude_patterns.match('/'.join(parents[:i + 1])):
+                return None
+
+        if not self._is_included(relative_path):
+            return None
+
+        return self._content(relative_path)
+
+    def directories(self, relative_path: str = '') -> Iterator[str]:
+        """
+        Get the directories which are walked for files, i.e. the source
+        path and its subdirectories, except the excluded ones.
+
+        :param relative_path: Start at a subdirectory, e.g. plugged
+        :return: An iterator of relative paths, e.g. '', plugged/vim
+        """
+        if relative_path and not self._is_walked(relative_path):
+            return
+
+        stack = [relative_path]
+        while stack:
+            relative_dir = stack.pop()
+            yield relative_dir
+
+            for entry in self._scandir(self._source_path / relative_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    path = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+                    if self._is_walked(path):
+                        stack.append(path)
+
+    def _content(self, relative_path: str) -> Content:
+        return Content(
+            self._backup_path / relative_path,
+            self._source_path / relative_path
+        )
+
+    def _is_included(self, relative_path: str) -> bool:
+        if self._exclude_patterns.match(relative_path):
+            return False
+
+        return not self._include or self._include_patterns.match(relative_path)
+
+    def _is_walked(self, relative_dir: str) -> bool:
+        """Whether a directory is not excluded, and might have included files."""
+        if self._exclude_patterns.match(relative_dir):
+            return False
+
+        return not self._include or self._include_patterns.reaches(relative_dir)
+
+    def _walk(self, directory: Path) -> Iterator[str]:
+        """
+        Walks a directory with os.scandir(), pruning directories which are
+        excluded, or have no included files.
+
+        :param directory: Directory to walk.
+        :return: An iterator of relative paths of files, in sorted order.
+        """
+        stack = [('', self._scandir(directory))]
+        while stack:
+            relative_dir, entries = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                stack.pop()
+                continue
+
+            relative_path = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if self._is_walked(relative_path):
+                    stack.append((relative_path, self._scandir(directory / relative_path)))
+            elif entry.is_file() and self._is_included(relative_path):
+                yield relative_path
+
+    @staticmethod
+    def _scandir(directory: Path) -> Iterator[os.DirEntry]:
+        """Lists a directory, sorted by name. Errors are logged."""
+        try:
+            with os.scandir(directory) as iterator:
+                return iter(sorted(iterator, key=lambda entry: entry.name))
+        except FileNotFoundError as error:
+            logger.error(error)
+        except (NotADirectoryError, PermissionError) as error:
+            logger.warning(error)
+
+        return iter([])
+
+    def _validate(self):
+        super()._validate()
+
+        for key, patterns in [('include', self._include), ('exclude', self._exclude)]:
+            for pattern in patterns:
+                if not isinstance(pattern, str) or not pattern:
+                    raise ConfigError(f'Illegal {key} pattern for {self._backup_path}: {pattern}')
+
+    @staticmethod
+    def is_glob(path: str) -> bool:
+        """Whether a path contains wildcards."""
+        return bool(ContentTree.GLOB_CHARS.search(path))
+
+    @staticmethod
+    def from_glob(backup_path: str, pattern: str):
+        """
+        Create a ContentTree from a source path with wildcards.
+
+        The part of the path before the first wildcard becomes the source
+        path, and the rest, the include pattern, e.g. ~/.vim/**/*.vim. The
+        pattern is anchored to the source path, like in a shell.
+
+        :param backup_path: Backup path.
+        :param pattern: Source path with wildcards.
+        :return: A ContentTree object.
+        """
+        parts = Path(pattern).parts
+        index = next(i for i, part in enumerate(parts) if ContentTree.is_glob(part))
+        if index == 0:
+            raise ConfigError(f'Source path invalid: {pattern}')
+
+        return ContentTree(
+            backup_path,
+            str(Path(*parts[:index])),
+            ['/' + '/'.join(parts[index:])]
+        )
+
+    @staticmethod
+    # pylint: disable-next=arguments-differ
+    def from_dict(backup_path: str, data: dict, home: Path = None):
+        """
+        Create a ContentTree from a dictionary.
+
+        :param backup_path: Backup path.
+        :param data: A dictionary with the keys source, include and exclude.
+        :param home: Home directory, if already known.
+        :return: A ContentTree object.
+        """
+        extra_keys = sorted(data.keys() - ['source', 'include', 'exclude'])
+        if extra_keys:
+            raise ConfigError(f"Illegal keys for {backup_path}: {', '.join(extra_keys)}")
+
+        source_path = data.get('source')
+        if not isinstance(source_path, str) and (source_path is not None):
+            raise ConfigError(f'Illegal source path for {backup_path}: {source_path}')
+
+        include = data.get('include') or []
+        exclude = data.get('exclude') or []
+        for key, value in [('include', include), ('exclude', exclude)]:
+            if not isinstance(value, list):
+                raise ConfigError(f'Illegal {key} patterns for {backup_path}: {value}')
+
+        return ContentTree(backup_path, source_path, include, exclude, home)
+
+
+class _Patterns:
+    """Compiled glob patterns, matched all at once."""
+
+    __slots__ = ('_names', '_paths', '_segments')
+
+    def __init__(self, patterns: List[str]):
+        name_patterns = [_translate(p) for p in patterns if '/' not in p]
+        path_patterns = [p.strip('/') for p in patterns if '/' in p]
+
+        self._names = re.compile('|'.join(name_patterns)) if name_patterns else None
+        self._paths = (
+            re.compile('|'.join(_translate(p) for p in path_patterns)) if path_patterns else None
+        )
+
+        # Path patterns, split into a regex per directory, or None for **.
+        self._segments = [
+            [None if '**' in part else re.compile(_translate(part)) for part in p.split('/')]
+            for p in path_patterns
+        ]
+
+    def match(self, relative_path: str) -> bool:
+        """Whether a relative path matches any of the patterns."""
+        if self._names and self._names.fullmatch(relative_path.rsplit('/', 1)[-1]):
+            return True
+
+        return bool(self._paths and self._paths.fullmatch(relative_path))
+
+    def reaches(self, relative_dir: str) -> bool:
+        """Whether any of the patterns can match a path in a directory."""
+        if self._names:
+            # Names match at any depth.
+            return True
+
+        parts = relative_dir.split('/')
+        return any(_reaches(segments, parts) for segments in self._segments)
+
+
+def _check_overlaps(contents: List[Content]) -> None:
+    """
+    Rejects duplicate and nested backup paths, and warns about contents
+    with the same source path.
+
+    Each backup path is looked up in a set, along with its parents, so
+    this takes linear time, regardless of the number of contents.
+
+    :param contents: Content objects.
+    :return: None
+    """
+    backup_paths = set()
+    source_paths = set()
+    for content in contents:
+        backup_path = content.backup_path().as_posix()
+        if backup_path in backup_paths:
+            raise ConfigError(f'Backup path is not unique: {backup_path}')
+        backup_paths.add(backup_path)
+
+        # Strings hash faster than paths.
+        source_path = str(content.source_path())
+        if source_path in source_paths:
+            logger.warning('Source path is backed up more than once: %s', source_path)
+        source_paths.add(source_path)
+
+    for backup_path in backup_paths:
+        parent = backup_path
+        while '/' in parent:
+            parent = parent.rsplit('/', 1)[0]
+            if parent in backup_paths:
+                raise ConfigError(f'Backup paths cannot be nested: {parent}, {backup_path}')
+
+
+def _reaches(segments: list, parts: List[str]) -> bool:
+    """Whether a split path pattern can match a path in a split directory."""
+    for i, part in enumerate(parts):
+        if i < len(segments) and segments[i] is None:
+            return True
+
+        # The last segment matches files, not directories.
+        if i >= len(segments) - 1 or not segments[i].fullmatch(part):
+            return False
+
+    return True
+
+
+def _translate(pattern: str) -> str:
+    """Translates a glob pattern to a regular expression."""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex += '[' + chars.replace('\\', '\\\\') + ']'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    return f'(?:{regex})'
+
+
+def expand(contents: Iterable[Content], root: Path = None, paths: Iterable[str] = None):
+    """
+    Lazily expands contents into the files they represent.
+
+    :param contents: Content objects.
+    :param root: See ContentTree.expand().
+    :param paths: See ContentTree.expand().
+    :return: An iterator of Content objects.
+    """
+    for content in contents:
+        yield from content.expand(root, paths)
@@ -1,14 +1,37 @@
+import errno
+import importlib
 import logging
 import os
-from pathlib import Path
-from shutil import copyfile
-from git import Repo, Actor
-
+import shutil
+import socket
+import tarfile
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from . import stats, transfer
+from .content import Content, ContentTree, expand
 from .error import ActionError, ConfigError
+from .manifest import Manifest, ManifestEntry, digest
+from .plan import FanoutPlan, Operation, Plan
+from .transfer import Counters, DirectoryCache
 
 logger = logging.getLogger('clibato')
 
 
+# Destination types, and the modules and names of their classes. Modules
+# are only imported if used, e.g. GitPython only for repositories.
+TYPES = {
+    'directory': ('.destination', 'Directory'),
+    'store': ('.destination', 'Store'),
+    'snapshots': ('.destination', 'Snapshots'),
+    'archive': ('.destination', 'Archive'),
+    'repository': ('.repository', 'Repository'),
+}
+
+
 class Destination:
     """Clibato Backup Destination"""
 
@@ -27,77 +50,318 @@ class Destination:
         """Restore the contents"""
         raise NotImplementedError()
 
+    def plan_backup(self, contents) -> Plan:
+        """Plan the backup of the contents, without changing anything"""
+        raise ActionError(f'Planning is not supported for: {type(self).__name__}')
+
+    def plan_restore(self, contents) -> Plan:
+        """Plan the restore of the contents, without changing anything"""
+        raise ActionError(f'Planning is not supported for: {type(self).__name__}')
+
+    def restore_at(self, contents, revision: str):
+        """Restore the contents, as they were at a revision"""
+        raise ActionError(f'Restoring a revision is not supported for: {type(self).__name__}')
+
+    def is_incremental(self) -> bool:
+        """Whether backing up some contents leaves the backups of the others as they are"""
+        return False
+
     @staticmethod
     def from_dict(data: dict):
         """
         Create a Destination object from a dictionary.
 
-        data.type determines the type of object.
+        data.type determines the type of object. A list of dictionaries
+        results in a Fanout of all the destinations.
         """
+        if isinstance(data, list):
+            if not data:
+                raise ConfigError('Destinations cannot be empty')
+
+            for item in data:
+                if not isinstance(item, dict):
+                    raise ConfigError(f'Illegal destination: {item}')
+
+            return Fanout([Destination.from_dict(item) for item in data])
+
         try:
             tipo = data.pop('type', None)
+            if not isinstance(tipo, str) or tipo not in TYPES:
+                raise ConfigError(f"Illegal type: {tipo}")
 
-            if tipo == 'repository':
-                return Repository(**data)
-            if tipo == 'directory':
-                return Directory(**data)
-
-            raise ConfigError(f"Illegal type: {tipo}")
+            module, name = TYPES[tipo]
+            return getattr(importlib.import_module(module, __package__), name)(**data)
         except TypeError as error:
             raise ConfigError(error) from error
 
-    @staticmethod
-    def _ensure_directory(path: Path) -> None:
-        """
-        Creates the directory if it doesn't exist
-
-        :param path: Directory path.
-        :return: None
-        """
-        if path.is_dir():
-            return
-
-        logger.debug('Creating directory: %s', path)
-        os.makedirs(path)
-
 
 class Directory(Destination):
     """Destination type: Directory"""
 
-    def __init__(self, path: str):
+    MANIFEST_PATH = Path('.clibato', 'manifest.json')
+
+    def __init__(
+        self,
+        path: str,
+        checksum: bool = False,
+        jobs: int = 1,
+        copy_method: str = 'auto',
+        delta: bool = False
+    ):
         super().__init__()
 
         self._path = path
+        self._checksum = checksum
+        self._jobs = jobs
+        self._copy_method = copy_method
+        self._delta = delta
+        self._counters = Counters()
         self._validate()
 
     def __eq__(self, other):
         return (
             isinstance(other, type(self)) and
-            self._path == other._path
+            self._path == other._path and
+            self._checksum == other._checksum
         )
 
     def path(self):
         """Storage path"""
         return self._path
 
+    def counters(self) -> Counters:
+        """Counters of the last backup, e.g. bytes_written"""
+        return self._counters
+
+    def jobs(self) -> int:
+        """Number of files to copy in parallel"""
+        return self._jobs
+
+    def set_jobs(self, jobs: int) -> None:
+        """Set the number of files to copy in parallel"""
+        self._jobs = jobs
+        self._validate_jobs()
+
+    def is_incremental(self) -> bool:
+        return True
+
     def backup(self, contents):
-        for content in contents:
-            try:
-                backup_path = self._path / content.backup_path()
-                Destination._ensure_directory(backup_path.parent)
-                copyfile(content.source_path(), backup_path)
-                logger.info('Backed up: %s', content.source_path())
-            except FileNotFoundError as error:
-                logger.error(error)
+        manifest = self._manifest()
+        self._execute(self.plan_backup(contents, manifest), manifest)
+        manifest.save()
 
     def restore(self, contents):
-        for content in contents:
+        self._execute(self.plan_restore(contents))
+
+    def plan_backup(self, contents, manifest: Manifest = None) -> Plan:
+        if manifest is None:
+            manifest = self._manifest()
+
+        items = (
+            (content, manifest.get(content.backup_path()))
+            for content in expand(contents)
+        )
+
+        return self._plan('backup', items, lambda item: self._plan_backup_content(*item))
+
+    def plan_restore(self, contents) -> Plan:
+        return self._plan_restore(
+            expand(contents, self._path),
+            lambda content: self._path / content.backup_path()
+        )
+
+    def _plan(self, action: str, items, func) -> Plan:
+        """
+        Plans an operation for each item.
+
+        Items are planned in parallel, since planning is mostly waiting for
+        stat() calls. A mkdir operation is planned before the first
+        operation that needs a directory which doesn't exist yet.
+
+        :param action: backup or restore.
+        :param items: Items to plan.
+        :param func: A callable that returns an Operation for an item.
+        :return: A Plan object.
+        """
+        plan = Plan(action)
+        known_directories = set()
+
+        with stats.phase('plan'):
+            for _, operation, _ in transfer.run(func, items, self._jobs, errors=()):
+                if operation.action in ['copy', 'link']:
+                    directory = operation.target.parent
+                    if directory not in known_directories:
+                        if not directory.is_dir():
+                            plan.append(Operation('mkdir', directory))
+                            known_directories.update(directory.parents)
+                        known_directories.add(directory)
+
+                plan.append(operation)
+                stats.add('plan', files=1)
+
+        return plan
+
+    def _plan_backup_content(self, content, entry: Optional[ManifestEntry]) -> Operation:
+        """
+        Plans the backup of a content.
+
+        :param content: A Content object.
+        :param entry: Manifest entry of the content's last backup, if any.
+        :return: An Operation object.
+        """
+        source_path = content.source_path()
+        backup_path = self._path / content.backup_path()
+
+        try:
+            stat = os.stat(source_path)
+        except FileNotFoundError as error:
+            return Operation('missing', backup_path, source_path, content, error=str(error))
+
+        if entry and self._is_unchanged(entry, stat, source_path, backup_path):
+            new_entry = None if entry.matches(stat) else ManifestEntry.from_stat(stat, entry.digest)
+            return Operation('skip', backup_path, source_path, content, stat.st_size, new_entry)
+
+        entry = ManifestEntry.from_stat(stat)
+        return Operation('copy', backup_path, source_path, content, stat.st_size, entry)
+
+    def _plan_restore(self, contents, locate) -> Plan:
+        """
+        Plans the restore of contents.
+
+        :param contents: Contents to restore, already expanded.
+        :param locate: A callable that returns the backup file of a content.
+        :return: A Plan object.
+        """
+        def plan_content(content):
+            source_path = content.source_path()
             try:
-                Destination._ensure_directory(content.source_path().parent)
-                copyfile(self._path / content.backup_path(), content.source_path())
-                logger.info('Restored: %s', content.source_path())
+                backup_path = locate(content)
+                stat = os.stat(backup_path)
+                identical = transfer.is_identical(backup_path, source_path)
             except FileNotFoundError as error:
-                logger.error(error)
+                return Operation('missing', source_path, content=content, error=str(error))
+
+            action = 'skip' if identical else 'copy'
+            return Operation(action, source_path, backup_path, content, stat.st_size)
+
+        return self._plan('restore', contents, plan_content)
+
+    def _execute(self, plan: Plan, manifest: Manifest = None) -> List[Content]:
+        """
+        Executes a plan.
+
+        Operations are executed in parallel, but logged in order.
+
+        :param plan: A Plan object.
+        :param manifest: Receives the entries of backed up contents.
+        :return: Contents that were copied.
+        """
+        self._counters = Counters()
+        message = 'Backed up: %s' if plan.action() == 'backup' else 'Restored: %s'
+
+        def operations():
+            for operation in plan:
+                if operation.action == 'mkdir':
+                    logger.debug('Creating directory: %s', operation.target)
+                    os.makedirs(operation.target, exist_ok=True)
+                else:
+                    yield operation
+
+        def execute(operation):
+            return self._execute_operation(operation, plan.action())
+
+        changed = []
+        with stats.phase('transfer'):
+            for operation, entry, error in transfer.run(execute, operations(), self._jobs):
+                content = operation.content
+                if error or operation.error:
+                    logger.error(error or operation.error)
+                    continue
+
+                if entry and manifest is not None:
+                    manifest.set(content.backup_path(), entry)
+
+                if operation.action == 'copy':
+                    logger.info(message, content.source_path())
+                    stats.add('transfer', files=1, size=operation.size)
+                    changed.append(content)
+                elif operation.action == 'link':
+                    logger.debug('Linked: %s', content.source_path())
+                else:
+                    logger.debug('Unchanged: %s', content.source_path())
+
+        if self._counters.get('bytes_compared'):
+            logger.info(
+                'Delta transfer: %d byte(s) compared, %d byte(s) written.',
+                self._counters.get('bytes_compared'),
+                self._counters.get('bytes_written')
+            )
+
+        return changed
+
+    def _execute_operation(self, operation: Operation, action: str) -> Optional[ManifestEntry]:
+        """
+        Executes an operation, except mkdir.
+
+        :param operation: An Operation object.
+        :param action: backup or restore.
+        :return: The new manifest entry of the content, if any.
+        """
+        if operation.action == 'copy':
+            if action == 'restore':
+                transfer.replace(operation.source, operation.target, self._copy_method)
+                return None
+
+            self._copy(operation.source, operation.target, operation.size)
+            if self._checksum and not operation.entry.digest:
+                return operation.entry._replace(digest=digest(operation.source))
+
+        if operation.action == 'link':
+            try:
+                os.link(operation.source, operation.target)
+            except OSError as error:
+                logger.debug('Cannot link %s: %s', operation.source, error)
+                self._copy(operation.content.source_path(), operation.target, operation.size)
+
+        return operation.entry
+
+    def _copy(self, source_path: Path, backup_path: Path, size: int) -> None:
+        """Copies a source file to the backup."""
+        if self._delta and size >= transfer.DELTA_MIN_SIZE and backup_path.is_file():
+            transfer.delta_copy(source_path, backup_path, self._counters)
+        else:
+            transfer.copy(source_path, backup_path, self._copy_method)
+
+    def _is_unchanged(
+        self,
+        entry: ManifestEntry,
+        stat,
+        source_path: Path,
+        backup_path: Path
+    ) -> bool:
+        """
+        Whether a source is unchanged since it was last backed up.
+
+        The stat signature is compared first. If it differs, but the size
+        is the same and a digest was recorded, the digest decides.
+        """
+        try:
+            if os.stat(backup_path).st_size != entry.size:
+                return False
+        except FileNotFoundError:
+            return False
+
+        if entry.matches(stat):
+            return True
+
+        if not (self._checksum and entry.digest) or entry.size != stat.st_size:
+            return False
+
+        return digest(source_path) == entry.digest
+
+    def _manifest(self) -> Manifest:
+        """Load the manifest of the last backup."""
+        return Manifest.load(self._path / self.MANIFEST_PATH)
 
     def _validate(self):
         if not self._path:
@@ -111,105 +375,503 @@ class Directory(Destination):
         if not self._path.is_dir():
             raise ConfigError(f'Path is not a directory: {self._path}')
 
+        self._validate_jobs()
+
+        if self._copy_method not in transfer.COPY_METHODS:
+            raise ConfigError(f'Illegal copy method: {self._copy_method}')
+
+    def _validate_jobs(self):
+        if not isinstance(self._jobs, int) or isinstance(self._jobs, bool) or self._jobs < 1:
+            raise ConfigError(f'Jobs must be a positive integer: {self._jobs}')
 
-class Repository(Directory):
-    """Destination type: Git Repository"""
 
-    def __init__(self, path, remote, branch=None, user_name=None, user_mail=None):
-        self._repo = None
-        self._author = Actor(
-            user_name or 'Clibato',
-            user_mail or 'clibato@jigarius.com'
+class Store(Directory):
+    """
+    Destination type: Content-addressed Store
+
+    File bodies are stored once, under their SHA-256 digest, and shared by
+    all hosts that back up into the same store. Each host has a ref, i.e. a
+    manifest mapping its backup paths to digests.
+
+    $path/objects/ab/cdef...: File bodies.
+    $path/refs/$name.json: Refs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str = None,
+        jobs: int = 1,
+        copy_method: str = 'auto'
+    ):
+        self._name = name or socket.gethostname()
+
+        super().__init__(path, checksum=True, jobs=jobs, copy_method=copy_method)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, type(self)) and
+            self._path == other._path and
+            self._name == other._name
         )
-        self._remote = remote
-        self._branch = branch or 'main'
 
-        super().__init__(path)
+    def name(self) -> str:
+        """Name of the ref, e.g. the hostname"""
+        return self._name
+
+    def plan_restore(self, contents) -> Plan:
+        ref = self._manifest()
+
+        def locate(content):
+            entry = ref.get(content.backup_path())
+            if not entry:
+                raise FileNotFoundError(
+                    errno.ENOENT,
+                    os.strerror(errno.ENOENT),
+                    str(content.backup_path())
+                )
+
+            return self._object_path(entry.digest)
+
+        return self._plan_restore(expand(contents, paths=ref.paths()), locate)
+
+    def _plan_backup_content(self, content, entry: Optional[ManifestEntry]) -> Operation:
+        source_path = content.source_path()
+
+        try:
+            stat = os.stat(source_path)
+            if entry and entry.matches(stat) and self._object_path(entry.digest).is_file():
+                object_path = self._object_path(entry.digest)
+                return Operation('skip', object_path, source_path, content, stat.st_size)
+
+            checksum = digest(source_path)
+        except FileNotFoundError as error:
+            return Operation('missing', None, source_path, content, error=str(error))
+
+        object_path = self._object_path(checksum)
+        new_entry = ManifestEntry.from_stat(stat, checksum)
+        if entry and entry.digest == checksum:
+            return Operation('skip', object_path, source_path, content, stat.st_size, new_entry)
+
+        if object_path.is_file():
+            return Operation('link', object_path, source_path, content, stat.st_size, new_entry)
+
+        return Operation('copy', object_path, source_path, content, stat.st_size, new_entry)
+
+    def _execute_operation(self, operation: Operation, action: str) -> Optional[ManifestEntry]:
+        if action == 'backup' and operation.action == 'link':
+            # The object exists already, only the ref changes.
+            return operation.entry
+
+        if action == 'backup' and operation.action == 'copy':
+            # The source might have changed since it was planned, so the
+            # object is named after the digest of what was actually copied.
+            checksum = transfer.install_digest(
+                operation.source,
+                self._object_path,
+                self._path / 'objects'
+            )
+            logger.debug('Stored object: %s', checksum)
+            return operation.entry._replace(digest=checksum)
+
+        return super()._execute_operation(operation, action)
+
+    def _object_path(self, checksum: str) -> Path:
+        return self._path / 'objects' / checksum[:2] / checksum[2:]
+
+    def _manifest(self) -> Manifest:
+        return Manifest.load(self._path / 'refs' / f'{self._name}.json')
+
+    def _validate(self):
+        super()._validate()
+
+        if not self._name or os.sep in self._name or self._name.startswith('.'):
+            raise ConfigError(f'Name is invalid: {self._name}')
+
+
+class Snapshots(Directory):
+    """
+    Destination type: Snapshots
+
+    Each backup is written to a new directory, named after the time of the
+    backup. Files that didn't change since the previous snapshot are hard
+    linked to it, so unchanged files take no additional space.
+
+    $path/2021-02-13T142500.000000/.bashrc
+    """
+
+    TIME_FORMAT = '%Y-%m-%dT%H%M%S.%f'
+
+    def __init__(
+        self,
+        path: str,
+        keep: int = None,
+        checksum: bool = False,
+        jobs: int = 1,
+        copy_method: str = 'auto'
+    ):
+        self._keep = keep
+        self._snapshot = None
+        self._previous = None
+
+        super().__init__(path, checksum, jobs, copy_method)
 
     def __eq__(self, other):
         return (
             isinstance(other, type(self)) and
             self._path == other._path and
-            self._remote == other._remote and
-            self._branch == other._branch and
-            self._author == other._author
+            self._keep == other._keep and
+            self._checksum == other._checksum
+        )
+
+    def is_incremental(self) -> bool:
+        # Each snapshot must have all the contents.
+        return False
+
+    def snapshots(self) -> List[Path]:
+        """Paths to complete snapshots, oldest first"""
+        return sorted(
+            path for path in self._path.iterdir()
+            if path.is_dir() and self._is_snapshot_name(path.name)
         )
 
     def backup(self, contents):
-        self._git_init()
-        self._git_pull()
+        for path in self._path.glob('*.partial'):
+            logger.info('Removing incomplete snapshot: %s', path)
+            shutil.rmtree(path)
+
+        snapshots = self.snapshots()
+        with self._new_snapshot(snapshots) as manifest:
+            name = self._snapshot.name[:-len('.partial')]
+            self._snapshot.mkdir()
+            self._execute(self.plan_backup(contents, manifest), manifest)
+            manifest.save()
+            self._snapshot.rename(self._path / name)
+            logger.info('Created snapshot: %s', self._path / name)
+
+        self._prune(snapshots + [self._path / name])
+
+    def plan_backup(self, contents, manifest: Manifest = None) -> Plan:
+        if self._snapshot:
+            return super().plan_backup(contents, manifest)
+
+        with self._new_snapshot(self.snapshots()) as new_manifest:
+            return super().plan_backup(contents, new_manifest if manifest is None else manifest)
+
+    def plan_restore(self, contents) -> Plan:
+        snapshots = self.snapshots()
+        if not snapshots:
+            raise ActionError(f'No snapshots found in: {self._path}')
+
+        latest = snapshots[-1]
+        logger.info('Restoring snapshot: %s', latest)
+        return self._plan_restore(
+            expand(contents, latest),
+            lambda content: latest / content.backup_path()
+        )
 
-        repo = self._repo
+    @contextmanager
+    def _new_snapshot(self, snapshots: List[Path]) -> Iterator[Manifest]:
+        """
+        Prepares the paths of a new snapshot, without creating it.
 
-        if repo.is_dirty():
-            raise ActionError(
-                f'Uncommitted changes found in: {self._path}.'
-                'Commit or discard all changes and try again.'
-            )
+        :param snapshots: Existing snapshots.
+        :return: The manifest for the new snapshot.
+        """
+        name = datetime.now().strftime(self.TIME_FORMAT)
+        self._snapshot = self._path / f'{name}.partial'
+        self._previous = snapshots[-1] if snapshots else None
 
-        super().backup(contents)
+        if self._previous:
+            manifest = Manifest.load(self._previous / self.MANIFEST_PATH)
+            manifest = manifest.copy(self._snapshot / self.MANIFEST_PATH)
+        else:
+            manifest = Manifest(self._snapshot / self.MANIFEST_PATH)
 
-        index = repo.index
-        index.reset()
-        for content in contents:
-            index.add(str(content.backup_path()))
+        try:
+            yield manifest
+        finally:
+            self._snapshot = None
+            self._previous = None
 
-        change_count = len(repo.index.diff('HEAD'))
-        logger.info('%d change(s) detected.', change_count)
+    def _plan_backup_content(self, content, entry: Optional[ManifestEntry]) -> Operation:
+        source_path = content.source_path()
+        backup_path = self._snapshot / content.backup_path()
 
-        if change_count == 0:
+        try:
+            stat = os.stat(source_path)
+        except FileNotFoundError as error:
+            return Operation('missing', backup_path, source_path, content, error=str(error))
+
+        if entry and self._previous:
+            previous_path = self._previous / content.backup_path()
+            if self._is_unchanged(entry, stat, source_path, previous_path):
+                new_entry = ManifestEntry.from_stat(stat, entry.digest)
+                return Operation(
+                    'link', backup_path, previous_path, content, stat.st_size, new_entry
+                )
+
+        entry = ManifestEntry.from_stat(stat)
+        return Operation('copy', backup_path, source_path, content, stat.st_size, entry)
+
+    def _prune(self, snapshots: List[Path]) -> None:
+        if not self._keep:
             return
 
-        self._git_commit('Clibato backup')
-        self._git_push()
+        for path in snapshots[:-self._keep]:
+            logger.info('Removing snapshot: %s', path)
+            shutil.rmtree(path)
+
+    def _is_snapshot_name(self, name: str) -> bool:
+        try:
+            datetime.strptime(name, self.TIME_FORMAT)
+        except ValueError:
+            return False
+
+        return True
+
+    def _validate(self):
+        super()._validate()
+
+        if self._keep is not None and (
+            not isinstance(self._keep, int) or isinstance(self._keep, bool) or self._keep < 1
+        ):
+            raise ConfigError(f'Keep must be a positive integer: {self._keep}')
+
+
+class Archive(Directory):
+    """
+    Destination type: Archive
+
+    Contents are streamed into a single, compressed tarball, one file at a
+    time, without staging them on disk.
+
+    $path/$name.tar.gz
+    """
+
+    COMPRESSIONS = {
+        'gz': '.tar.gz',
+        'bz2': '.tar.bz2',
+        'xz': '.tar.xz',
+        'none': '.tar',
+    }
+
+    def __init__(self, path: str, name: str = 'clibato', compression: str = 'gz'):
+        self._name = name
+        self._compression = compression
+
+        super().__init__(path)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, type(self)) and
+            self._path == other._path and
+            self._name == other._name and
+            self._compression == other._compression
+        )
+
+    def is_incremental(self) -> bool:
+        # The archive is written anew each time.
+        return False
+
+    def archive_path(self) -> Path:
+        """Path to the archive"""
+        return self._path / (self._name + self.COMPRESSIONS[self._compression])
+
+    def plan_backup(self, contents, manifest: Manifest = None) -> Plan:
+        return Destination.plan_backup(self, contents)
+
+    def plan_restore(self, contents) -> Plan:
+        return Destination.plan_restore(self, contents)
+
+    def backup(self, contents):
+        archive_path = self.archive_path()
+        temp_path = archive_path.with_name(archive_path.name + '.partial')
+
+        try:
+            with stats.phase('transfer'), tarfile.open(str(temp_path), self._mode('w')) as tar:
+                for content in expand(contents):
+                    try:
+                        self._add(tar, content)
+                        logger.info('Backed up: %s', content.source_path())
+                    except FileNotFoundError as error:
+                        logger.error(error)
+        except BaseException:
+            # The archive might not have been created, e.g. if its path is taken.
+            if temp_path.is_file():
+                temp_path.unlink()
+            raise
+
+        os.replace(temp_path, archive_path)
+        logger.info('Created archive: %s', archive_path)
 
     def restore(self, contents):
-        self._git_init()
-        self._git_pull()
+        archive_path = self.archive_path()
+        trees = [content for content in contents if isinstance(content, ContentTree)]
+        pending = {
+            content.backup_path().as_posix(): content
+            for content in contents
+            if not isinstance(content, ContentTree)
+        }
+
+        if not archive_path.is_file():
+            raise ActionError(f'No archive found: {archive_path}')
+
+        try:
+            with stats.phase('transfer'), tarfile.open(str(archive_path), self._mode('r')) as tar:
+                self._extract(tar, pending, trees)
+        except tarfile.ReadError as error:
+            raise ActionError(f'Cannot read archive: {archive_path}: {error}') from error
 
-        super().restore(contents)
+        for backup_path in pending:
+            logger.error('Not found in %s: %s', archive_path, backup_path)
+
+    @staticmethod
+    def _extract(tar: tarfile.TarFile, pending: dict, trees: List[ContentTree]) -> None:
+        """
+        Restores the members of an archive which belong to contents.
+
+        :param tar: The archive, opened for streaming.
+        :param pending: Contents which are not trees, by backup path.
+            Restored contents are removed.
+        :param trees: ContentTree objects.
+        """
+        directories = DirectoryCache()
+
+        for member in tar:
+            parts = PurePosixPath(member.name).parts
+            if member.name.startswith('/') or '..' in parts or '~' in parts:
+                logger.warning('Skipping unsafe archive member: %s', member.name)
+                continue
+
+            content = pending.pop(member.name, None)
+            if content is None:
+                content = next(filter(None, (tree.match(member.name) for tree in trees)), None)
+            if content is None or not member.isfile():
+                continue
+
+            directories.ensure(content.source_path().parent)
+            with tar.extractfile(member) as src:
+                if transfer.install_fileobj(src, content.source_path()):
+                    logger.info('Restored: %s', content.source_path())
+                    stats.add('transfer', files=1, size=member.size)
+                else:
+                    logger.debug('Unchanged: %s', content.source_path())
+
+            if not (pending or trees):
+                break
+
+    def _add(self, tar: tarfile.TarFile, content) -> None:
+        shared = transfer.read_shared(content.source_path())
+        with BytesIO(shared[1]) if shared else open(content.source_path(), 'rb') as fh:
+            stat = shared[0] if shared else os.fstat(fh.fileno())
+            info = tarfile.TarInfo(content.backup_path().as_posix())
+            info.size = stat.st_size
+            info.mtime = stat.st_mtime
+            info.mode = stat.st_mode & 0o777
+            tar.addfile(info, fh)
+            stats.add('transfer', files=1, size=stat.st_size)
+
+    def _mode(self, action: str) -> str:
+        """Streaming tarfile mode, e.g. w|gz"""
+        compression = '' if self._compression == 'none' else self._compression
+        return f'{action}|{compression}'
 
     def _validate(self):
         super()._validate()
 
-        if not self._remote:
-            raise ConfigError('Remote cannot be empty')
+        if self._compression not in self.COMPRESSIONS:
+            raise ConfigError(f'Illegal compression: {self._compression}')
 
-    def _git_commit(self, message):
-        self._repo.index.commit(message, author=self._author)
+        if not self._name or os.sep in self._name:
+            raise ConfigError(f'Name is invalid: {self._name}')
 
-    def _git_init(self):
-        """Prepare Git repo and remote."""
-        if self._repo:
-            return
 
-        self._repo = repo = Repo.init(self._path, mkdir=False)
+class Fanout(Destination):
+    """
+    Destination type: Fan-out
+
+    Backs up to multiple destinations at once. Contents are expanded once,
+    and all destinations back them up in parallel, in the same order.
+    Reads are shared, see transfer.SharedReads, so a file that several
+    destinations copy is read once. Each destination succeeds or fails on
+    its own, and is planned on its own.
+
+    Restores are done from the first destination.
+    """
+
+    def __init__(self, destinations: List[Destination]):
+        super().__init__()
+
+        self._destinations = destinations
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, type(self)) and
+            self._destinations == other._destinations
+        )
+
+    def destinations(self) -> List[Destination]:
+        """The destinations"""
+        return self._destinations
+
+    def set_jobs(self, jobs: int) -> None:
+        """Set the number of files to copy in parallel, per destination"""
+        for destination in self._destinations:
+            destination.set_jobs(jobs)
+
+    def is_incremental(self) -> bool:
+        return all(destination.is_incremental() for destination in self._destinations)
 
-        if 'origin' in repo.remotes:
-            if repo.remotes.origin.url != self._remote:
-                logger.info('Removing incorrect remote: %s', repo.remotes.origin.url)
-                repo.delete_remote(repo.remotes.origin)
+    def backup(self, contents):
+        contents = list(expand(contents))
+
+        def backup(destination):
+            destination.backup(contents)
+
+        failures = 0
+        jobs = len(self._destinations)
+        with transfer.sharing(jobs) as shared:
+            results = transfer.run(backup, self._destinations, jobs, (Exception,))
+            for destination, _, error in results:
+                if error:
+                    failures += 1
+                    logger.error('Backup failed: %s: %s', self._name(destination), error)
+                else:
+                    logger.info('Backup completed: %s', self._name(destination))
+
+        logger.debug(
+            'Shared reads: %d file(s) read, %d read(s) saved.',
+            shared.counters().get('files_read'),
+            shared.counters().get('files_shared')
+        )
 
-        if 'origin' not in repo.remotes:
-            logger.info('Creating remote: %s (origin)', self._remote)
-            repo.create_remote('origin', self._remote)
+        if failures:
+            raise ActionError(f'Backup failed for {failures} of {jobs} destination(s).')
 
-    def _git_pull(self):
-        """Switch branch and pull remote changes."""
-        repo = self._repo
-        remote = repo.remotes.origin
-        remote.fetch()
+    def restore(self, contents):
+        logger.info('Restoring from: %s', self._name(self._destinations[0]))
+        self._destinations[0].restore(contents)
 
-        if self._branch not in repo.branches:
-            logger.info('Creating branch: %s', self._branch)
-            self._git_commit('Initial commit')
-            repo.create_head(self._branch)
+    def restore_at(self, contents, revision: str):
+        logger.info('Restoring from: %s', self._name(self._destinations[0]))
+        self._destinations[0].restore_at(contents, revision)
 
-        if repo.active_branch != self._branch:
-            logger.info('Switching branch: %s', self._branch)
-            repo.heads[self._branch].checkout()
+    def plan_backup(self, contents) -> FanoutPlan:
+        contents = list(expand(contents))
 
-    def _git_push(self):
-        """Push commits to remote."""
-        logger.info('Pushing commits to origin/%s.', self._branch)
-        self._repo.remotes.origin.push(self._branch)
+        plans = FanoutPlan('backup')
+        for destination in self._destinations:
+            try:
+                plans.append(self._name(destination), destination.plan_backup(contents))
+            except ActionError as error:
+                plans.append(self._name(destination), error=str(error))
+
+        return plans
+
+    def plan_restore(self, contents) -> Plan:
+        return self._destinations[0].plan_restore(contents)
+
+    @staticmethod
+    def _name(destination: Destination) -> str:
+        return f'{type(destination).__name__} ({destination.path()})'
@@ -0,0 +1,133 @@
+import errno
+import logging
+import os
+import queue
+import subprocess
+import threading
+from pathlib import Path
+
+import git
+
+from . import gittree, transfer
+from .error import ActionError
+from .transfer import Counters
+
+logger = logging.getLogger('clibato')
+
+
+class Git(git.Git):
+    """A Git command wrapper which counts the processes it spawns."""
+
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self._counters = Counters()
+
+    def counters(self) -> Counters:
+        """Counters, i.e. git_processes"""
+        return self._counters
+
+    def execute(self, command, *args, **kwargs):
+        self._counters.add('git_processes')
+        return super().execute(command, *args, **kwargs)
+
+
+class Repo(git.Repo):
+    """A Git repository whose commands are counted."""
+
+    GitCommandWrapperType = Git
+
+
+class GitPool:
+    """
+    Long-lived "git hash-object" processes for writing blobs.
+
+    Each process hashes any number of files, one path per line, so writing
+    thousands of blobs costs a handful of processes. Up to "size" processes
+    are started, as needed, so that files can be hashed in parallel. Blobs
+    are read through GitPython's own persistent "git cat-file" processes.
+    """
+
+    def __init__(self, repo: git.Repo, size: int = 1):
+        self._repo = repo
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def hash_file(self, path: Path) -> bytes:
+        """
+        Writes a file to the object database as a blob.
+
+        :param path: Absolute file path.
+        :return: Binary SHA-1 of the blob.
+        """
+        shared = transfer.read_shared(path)
+        if shared:
+            return gittree.hash_data(self._repo.odb, shared[1])
+
+        if '\n' in str(path):
+            return gittree.hash_file(self._repo.odb, path)
+
+        process = self._acquire()
+        try:
+            process.stdin.write(os.fsencode(path) + b'\n')
+            process.stdin.flush()
+            line = process.stdout.readline()
+        except BrokenPipeError:
+            line = b''
+
+        if not line:
+            # git exits when it can't read a file.
+            self._discard(process)
+            if not os.path.exists(path):
+                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), str(path))
+            raise ActionError(f'Cannot hash file: {path}')
+
+        self._idle.put(process)
+        return bytes.fromhex(line.strip().decode('ascii'))
+
+    def close(self) -> None:
+        """Stops all processes."""
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            process.stdin.close()
+            process.proc.wait()
+            self._started -= 1
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            start = self._started < self._size
+            if start:
+                self._started += 1
+
+        if not start:
+            return self._idle.get()
+
+        logger.debug('Starting git hash-object (%d of %d)', self._started, self._size)
+        return self._repo.git.hash_object(
+            '-w', '--no-filters', '--stdin-paths',
+            istream=subprocess.PIPE,
+            as_process=True,
+            env={'GIT_FLUSH': '1'}
+        )
+
+    def _discard(self, process) -> None:
+        process.stdin.close()
+        process.proc.wait()
+        with self._lock:
+            self._started -= 1
@@ -0,0 +1,187 @@
+import hashlib
+import os
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from git.objects.fun import tree_entries_from_data, tree_to_stream
+from gitdb import IStream
+
+BLOB_MODE = 0o100644
+TREE_MODE = 0o040000
+
+
+def hash_file(odb, path: Path) -> bytes:
+    """
+    Writes a file to a Git object database as a blob.
+
+    :param odb: An object database, e.g. Repo.odb
+    :param path: File path.
+    :return: Binary SHA-1 of the blob.
+    """
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        return odb.store(IStream(b'blob', size, fh)).binsha
+
+
+def hash_data(odb, data: bytes) -> bytes:
+    """
+    Writes data to a Git object database as a blob.
+
+    :param odb: An object database, e.g. Repo.odb
+    :param data: Contents of the blob.
+    :return: Binary SHA-1 of the blob.
+    """
+    return odb.store(IStream(b'blob', len(data), BytesIO(data))).binsha
+
+
+def blob_sha(path: Path) -> bytes:
+    """
+    Computes the Git blob SHA-1 of a file, without writing anything.
+
+    :param path: File path.
+    :return: Binary SHA-1.
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        sha.update(b'blob %d\0' % os.fstat(fh.fileno()).st_size)
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.digest()
+
+
+class TreeBuilder:
+    """
+    Edits a Git tree in memory.
+
+    Subtrees are read from the object database only when a path inside
+    them is looked up or changed, and only changed subtrees are written
+    back. Not thread-safe.
+    """
+
+    def __init__(self, odb, binsha: bytes = None):
+        self._odb = odb
+        self._binsha = binsha
+        self._entries = None
+        self._children = {}
+        self._modified = binsha is None
+
+    def binsha(self) -> Optional[bytes]:
+        """Binary SHA-1 of the tree, as of the last write()."""
+        return self._binsha
+
+    def get(self, path: str) -> Optional[Tuple[bytes, int]]:
+        """
+        Get a blob in the tree.
+
+        :param path: A relative POSIX path, e.g. hole/.wabbit
+        :return: (binsha, mode), if the blob exists.
+        """
+        name, _, rest = path.partition('/')
+        if rest:
+            child = self._child(name, create=False)
+            return child.get(rest) if child else None
+
+        entry = self._load().get(name)
+        if entry is None or entry[1] == TREE_MODE:
+            return None
+
+        return entry
+
+    def set(self, path: str, binsha: bytes, mode: int = BLOB_MODE) -> bool:
+        """
+        Puts a blob in the tree, replacing anything at its path.
+
+        :param path: A relative POSIX path, e.g. hole/.wabbit
+        :param binsha: Binary SHA-1 of the blob.
+        :param mode: File mode of the blob.
+        :return: Whether the tree changed.
+        """
+        name, _, rest = path.partition('/')
+        if rest:
+            changed = self._child(name, create=True).set(rest, binsha, mode)
+        else:
+            changed = name in self._children or self._load().get(name) != (binsha, mode)
+            if changed:
+                self._children.pop(name, None)
+                self._load()[name] = (binsha, mode)
+
+        self._modified = self._modified or changed
+        return changed
+
+    def paths(self, directory: str = '') -> Iterator[str]:
+        """
+        Get the paths of all blobs in a directory of the tree.
+
+        Only the subtrees in the directory are read.
+
+        :param directory: A relative POSIX path, e.g. hole
+        :return: An iterator of paths, e.g. hole/.wabbit
+        """
+        name, _, rest = directory.strip('/').partition('/')
+        if name:
+            child = self._child(name, create=False)
+            if child:
+                yield from (f'{name}/{path}' for path in child.paths(rest))
+            return
+
+        for name, (_, mode) in sorted(self._load().items()):
+            if mode == TREE_MODE:
+                yield from (f'{name}/{path}' for path in self._child(name, create=False).paths())
+            else:
+                yield name
+
+    def write(self) -> bytes:
+        """
+        Writes the tree and its changed subtrees to the object database.
+
+        :return: Binary SHA-1 of the tree.
+        """
+        if not self._modified:
+            return self._binsha
+
+        entries = self._load()
+        for name, child in self._children.items():
+            entries[name] = (child.write(), TREE_MODE)
+
+        # Git orders trees as if their names ended with a slash.
+        items = sorted(
+            ((binsha, mode, name) for name, (binsha, mode) in entries.items()),
+            key=lambda item: item[2].encode() + (b'/' if item[1] == TREE_MODE else b'')
+        )
+
+        stream = BytesIO()
+        tree_to_stream(items, stream.write)
+        stream.seek(0)
+
+        self._binsha = self._odb.store(IStream(b'tree', len(stream.getvalue()), stream)).binsha
+        self._modified = False
+
+        return self._binsha
+
+    def _child(self, name: str, create: bool) -> Optional['TreeBuilder']:
+        """Get a subtree, optionally creating it, e.g. in place of a blob."""
+        if name in self._children:
+            return self._children[name]
+
+        entry = self._load().get(name)
+        if entry and entry[1] == TREE_MODE:
+            child = TreeBuilder(self._odb, entry[0])
+        elif create:
+            child = TreeBuilder(self._odb)
+        else:
+            return None
+
+        self._children[name] = child
+        return child
+
+    def _load(self) -> Dict[str, Tuple[bytes, int]]:
+        if self._entries is None:
+            self._entries = {}
+            if self._binsha is not None:
+                data = self._odb.stream(self._binsha).read()
+                for binsha, mode, name in tree_entries_from_data(data):
+                    self._entries[name] = (binsha, mode)
+
+        return self._entries
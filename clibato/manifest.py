@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger('clibato')
+
+
+def digest(path: Path) -> str:
+    """
+    Computes the SHA-256 digest of a file.
+
+    :param path: File path.
+    :return: Hex digest.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class ManifestEntry(NamedTuple):
+    """Signature of a source file at the time it was last backed up."""
+
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: Optional[str] = None
+
+    @staticmethod
+    def from_stat(stat: os.stat_result, checksum: Optional[str] = None):
+        """Create a ManifestEntry from the result of os.stat()."""
+        return ManifestEntry(stat.st_size, stat.st_mtime_ns, stat.st_ino, checksum)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Whether a stat result has the same signature as this entry."""
+        return (
+            self.size == stat.st_size and
+            self.mtime_ns == stat.st_mtime_ns and
+            self.inode == stat.st_ino
+        )
+
+
+class Manifest:
+    """
+    Clibato Manifest: A record of the last backup of each content.
+
+    Entries are keyed by backup path. A missing or unreadable manifest
+    is treated as empty, which simply results in a full backup.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        path: Path,
+        entries: Dict[str, ManifestEntry] = None,
+        modified: bool = False
+    ):
+        self._path = path
+        self._entries = entries or {}
+        self._modified = modified
+
+    def __len__(self):
+        return len(self._entries)
+
+    def path(self) -> Path:
+        """Path to the manifest file."""
+        return self._path
+
+    def paths(self) -> List[str]:
+        """Backup paths in the manifest, e.g. hole/.wabbit"""
+        return list(self._entries)
+
+    def get(self, backup_path: Path) -> Optional[ManifestEntry]:
+        """Get the entry for a backup path, if any."""
+        return self._entries.get(Path(backup_path).as_posix())
+
+    def set(self, backup_path: Path, entry: ManifestEntry) -> None:
+        """Set the entry for a backup path."""
+        key = Path(backup_path).as_posix()
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._modified = True
+
+    def copy(self, path: Path):
+        """
+        Create a copy of the manifest to be saved at another path.
+
+        :param path: path/to/manifest.json
+        :return: A Manifest object.
+        """
+        return Manifest(path, dict(self._entries), modified=True)
+
+    def save(self) -> None:
+        """Write the manifest to disk, if it was modified."""
+        if not self._modified:
+            return
+
+        data = {
+            'version': self.VERSION,
+            'entries': {key: list(entry) for key, entry in self._entries.items()},
+        }
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self._path.with_name(self._path.name + '.tmp')
+        with open(temp_path, 'w') as fh:
+            json.dump(data, fh, separators=(',', ':'))
+        os.replace(temp_path, self._path)
+
+        logger.debug('Manifest saved: %s', self._path)
+        self._modified = False
+
+    @staticmethod
+    def load(path: Path):
+        """
+        Load a manifest from a file.
+
+        :param path: path/to/manifest.json
+        :return: A Manifest object.
+        """
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return Manifest(path)
+        except ValueError as error:
+            logger.warning('Ignoring invalid manifest: %s: %s', path, error)
+            return Manifest(path)
+
+        if not isinstance(data, dict) or data.get('version') != Manifest.VERSION:
+            logger.warning('Ignoring incompatible manifest: %s', path)
+            return Manifest(path)
+
+        entries = {
+            key: ManifestEntry(*value)
+            for key, value in data.get('entries', {}).items()
+        }
+
+        return Manifest(path, entries)
@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from .content import Content
+from .manifest import ManifestEntry
+
+
+class Operation(NamedTuple):
+    """
+    A planned file operation.
+
+    mkdir: Create the target directory.
+    copy: Copy the source file to the target.
+    link: Hard link the target to the source file.
+    skip: Nothing to do, the target is up-to-date.
+    missing: The source file doesn't exist.
+    """
+
+    action: str
+    target: Optional[Path] = None
+    source: Optional[Path] = None
+    content: Optional[Content] = None
+    size: int = 0
+    entry: Optional[ManifestEntry] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Get a JSON-friendly representation of the operation."""
+        data = {'action': self.action}
+
+        if self.content:
+            data['backup_path'] = self.content.backup_path().as_posix()
+        if self.source:
+            data['source'] = str(self.source)
+        if self.target:
+            data['target'] = str(self.target)
+        if self.action in ['copy', 'link']:
+            data['size'] = self.size
+        if self.error:
+            data['error'] = self.error
+
+        return data
+
+
+class Plan:
+    """Clibato Plan: The operations that make up a backup or a restore."""
+
+    ACTIONS = ['mkdir', 'copy', 'link', 'skip', 'missing']
+
+    def __init__(self, action: str, operations: List[Operation] = None):
+        self._action = action
+        self._operations = operations or []
+
+    def __iter__(self) -> Iterator[Operation]:
+        return iter(self._operations)
+
+    def __len__(self):
+        return len(self._operations)
+
+    def action(self) -> str:
+        """The planned action, i.e. backup or restore."""
+        return self._action
+
+    def operations(self) -> List[Operation]:
+        """The planned operations, in order of execution."""
+        return self._operations
+
+    def append(self, operation: Operation) -> None:
+        """Add an operation to the plan."""
+        self._operations.append(operation)
+
+    def summary(self) -> dict:
+        """Number of operations per action, and the number of bytes to copy."""
+        summary = {action: 0 for action in self.ACTIONS}
+        summary['bytes'] = 0
+
+        for operation in self._operations:
+            summary[operation.action] += 1
+            if operation.action == 'copy':
+                summary['bytes'] += operation.size
+
+        return summary
+
+    def to_dict(self) -> dict:
+        """Get a JSON-friendly representation of the plan."""
+        return {
+            'action': self._action,
+            'summary': self.summary(),
+            'operations': [operation.to_dict() for operation in self._operations],
+        }
+
+    def to_json(self) -> str:
+        """Get the plan as JSON."""
+        return json.dumps(self.to_dict(), indent=2)
+
+
+class FanoutPlan:
+    """
+    Clibato Fanout Plan: The plans of the destinations of a Fanout.
+
+    Destinations which cannot plan, e.g. archives, have an error instead.
+    """
+
+    def __init__(self, action: str):
+        self._action = action
+        self._plans: List[Tuple[str, Optional[Plan], Optional[str]]] = []
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[Plan], Optional[str]]]:
+        return iter(self._plans)
+
+    def __len__(self):
+        return len(self._plans)
+
+    def action(self) -> str:
+        """The planned action, i.e. backup or restore."""
+        return self._action
+
+    def append(self, name: str, plan: Plan = None, error: str = None) -> None:
+        """
+        Add the plan of a destination.
+
+        :param name: Name of the destination.
+        :param plan: A Plan object.
+        :param error: Why the destination has no plan.
+        """
+        self._plans.append((name, plan, error))
+
+    def to_dict(self) -> dict:
+        """Get a JSON-friendly representation of the plans."""
+        destinations = []
+        for name, plan, error in self._plans:
+            data = {'destination': name}
+            if plan is not None:
+                data['summary'] = plan.summary()
+                data['operations'] = [operation.to_dict() for operation in plan]
+            if error:
+                data['error'] = error
+            destinations.append(data)
+
+        return {'action': self._action, 'destinations': destinations}
+
+    def to_json(self) -> str:
+        """Get the plans as JSON."""
+        return json.dumps(self.to_dict(), indent=2)
@@ -0,0 +1,710 @@
+import json
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+from git import (
+    Actor, Commit, Git, GitCommandError, InvalidGitRepositoryError, NoSuchPathError, Tree
+)
+from gitdb.exc import BadName, BadObject
+
+from . import gitpool, gittree, stats, transfer
+from .content import Content, ContentTree, expand
+from .destination import Directory
+from .error import ActionError, ConfigError
+from .manifest import Manifest, ManifestEntry
+from .plan import Operation, Plan
+from .transfer import DirectoryCache
+
+logger = logging.getLogger('clibato')
+
+
+class Repository(Directory):  # pylint: disable=too-many-instance-attributes
+    """
+    Destination type: Git Repository
+
+    By default, contents are copied into the work tree, and committed from
+    there. Without a work tree, contents are hashed straight into the object
+    database, and commits are built from the previous commit's tree, in
+    memory. The work tree and the index are then left untouched.
+    """
+
+    MANIFEST_PATH = Path('.git', 'clibato', 'manifest.json')
+    TREE_MANIFEST_PATH = Path('.git', 'clibato', 'tree-manifest.json')
+    FETCH_CACHE_PATH = Path('.git', 'clibato', 'fetch.json')
+    MAINTENANCE_DEFAULTS = {
+        'loose_objects': 1000,
+        'packs': 10,
+        'background': True,
+    }
+
+    def __init__(
+        self, path, remote, *, branch=None,
+        user_name=None, user_mail=None, checksum=False, jobs=1,
+        copy_method='auto', delta=False, worktree=True, depth=None, filter=None,
+        fetch_ttl=0, maintenance=False
+    ):
+        # pylint: disable=redefined-builtin
+        self._repo = None
+        self._pool = None
+        self._worktree = worktree
+        self._depth = depth
+        self._filter = filter
+        self._fetch_ttl = fetch_ttl
+        self._maintenance = maintenance
+        self._author = Actor(
+            user_name or 'Clibato',
+            user_mail or 'clibato@jigarius.com'
+        )
+        self._remote = remote
+        self._branch = branch or 'main'
+
+        super().__init__(path, checksum, jobs, copy_method, delta)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, type(self)) and
+            self._path == other._path and
+            self._remote == other._remote and
+            self._branch == other._branch and
+            self._author == other._author and
+            self._checksum == other._checksum and
+            self._worktree == other._worktree and
+            self._depth == other._depth and
+            self._filter == other._filter and
+            self._fetch_ttl == other._fetch_ttl and
+            self._maintenance == other._maintenance
+        )
+
+    def backup(self, contents):
+        self._git_init()
+        spawned = self._repo.git.counters().get('git_processes')
+
+        if self._worktree:
+            self._backup_worktree(contents)
+        else:
+            self._git_fetch()
+            self._pool = gitpool.GitPool(self._repo, self._jobs)
+            try:
+                self._backup_tree(contents)
+            finally:
+                self._pool.close()
+                self._pool = None
+
+        spawned = self._repo.git.counters().get('git_processes') - spawned
+        self._counters.add('git_processes', spawned)
+        stats.count('git_processes', spawned)
+        logger.debug('Git processes spawned: %d', spawned)
+
+    def _backup_worktree(self, contents) -> None:
+        """Commits the contents from the work tree."""
+        self._git_pull()
+
+        repo = self._repo
+        head = gittree.TreeBuilder(repo.odb, repo.head.commit.tree.binsha)
+
+        if self._is_dirty(contents, head):
+            raise ActionError(
+                f'Uncommitted changes found in: {self._path}.'
+                'Commit or discard all changes and try again.'
+            )
+
+        manifest = self._manifest()
+        changed = self._execute(self.plan_backup(contents, manifest), manifest)
+
+        # Only the backup paths are staged, and the commit is built from
+        # HEAD's tree, so whatever else the user staged stays staged, and
+        # out of the backup.
+        index = repo.index
+        change_count = 0
+        if changed:
+            with stats.phase('git_index'):
+                index.add([str(content.backup_path()) for content in changed])
+            for content in changed:
+                path = content.backup_path().as_posix()
+                entry = index.entries[(path, 0)]
+                if head.set(path, entry.binsha, entry.mode):
+                    change_count += 1
+
+        logger.info('%d change(s) detected.', change_count)
+
+        if change_count == 0:
+            manifest.save()
+            return
+
+        self._commit_tree(head)
+        manifest.save()
+        self._git_push()
+        self._git_maintenance()
+
+    @stats.timed('git_status')
+    def _is_dirty(self, contents, head: gittree.TreeBuilder) -> bool:
+        """
+        Whether the backup paths of the contents have uncommitted changes.
+
+        Only the index entries and work tree files of the contents are
+        checked, so the rest of the repository can be as large, or as
+        dirty, as it likes. Work tree files are only hashed if their stat
+        signature differs from the one in the index.
+
+        :param contents: Contents to check.
+        :param head: The tree of HEAD.
+        :return: True if there are staged or unstaged changes.
+        """
+        index = self._repo.index
+        index_mtime_ns = os.stat(index.path).st_mtime_ns
+        index_paths = None
+
+        for content in contents:
+            prefix = content.backup_path().as_posix()
+            if isinstance(content, ContentTree):
+                if index_paths is None:
+                    index_paths = [path for path, stage in index.entries if stage == 0]
+                paths = set(head.paths(prefix))
+                paths.update(path for path in index_paths if path.startswith(prefix + '/'))
+                paths = sorted(paths)
+            else:
+                paths = [prefix]
+
+            for item in content.expand(paths=paths):
+                path = item.backup_path().as_posix()
+                entry = index.entries.get((path, 0))
+                blob = head.get(path)
+                if entry is None and blob is None:
+                    continue
+
+                if entry is None or blob is None or entry.binsha != blob[0]:
+                    logger.debug('Staged changes found: %s', path)
+                    return True
+
+                if self._is_modified(entry, index_mtime_ns):
+                    logger.debug('Unstaged changes found: %s', path)
+                    return True
+
+        return False
+
+    def _is_modified(self, entry, index_mtime_ns: int) -> bool:
+        """Whether a work tree file differs from its index entry."""
+        path = self._path / entry.path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return True
+
+        if stat.st_size != entry.size:
+            return True
+
+        # Files modified right before the index was written are "racy",
+        # i.e. they might have changed without their stat changing.
+        seconds, nanoseconds = entry.mtime
+        mtime_ns = seconds * 10 ** 9 + nanoseconds
+        if mtime_ns == stat.st_mtime_ns < index_mtime_ns:
+            return False
+
+        return gittree.blob_sha(path) != entry.binsha
+
+    def restore(self, contents):
+        self._git_init()
+
+        if not self._worktree:
+            self._git_fetch()
+            self._restore_tree(self.plan_restore(contents), self._tree())
+            return
+
+        self._git_pull()
+
+        super().restore(contents)
+
+    def plan_backup(self, contents, manifest: Manifest = None) -> Plan:
+        if self._worktree:
+            return super().plan_backup(contents, manifest)
+
+        # Plans don't change anything, so the repository isn't created, and
+        # the branch isn't moved, but read as a backup would find it.
+        if self._git_open():
+            tree = self._tree(update=False)
+        else:
+            logger.warning('Repository not found: %s', self._path)
+            tree = gittree.TreeBuilder(None)
+
+        if manifest is None:
+            manifest = self._manifest()
+
+        return self._plan_tree_backup(contents, manifest, tree)
+
+    def plan_restore(self, contents) -> Plan:
+        if self._worktree:
+            return super().plan_restore(contents)
+
+        if not self._git_open():
+            raise ActionError(f'Repository not found: {self._path}')
+
+        tree = self._tree(update=False)
+        if tree.binsha() is None:
+            raise ActionError(f'Branch not found: {self._branch}')
+
+        return self._plan_tree_restore(contents, tree, self._branch)
+
+    def restore_at(self, contents, revision: str):
+        self._git_init()
+        self._git_fetch()
+
+        try:
+            commit = self._repo.commit(revision)
+        except (BadName, BadObject, ValueError) as error:
+            raise ActionError(f'Revision not found: {revision}') from error
+
+        logger.info('Restoring commit: %s', commit.hexsha[:7])
+        tree = gittree.TreeBuilder(self._repo.odb, commit.tree.binsha)
+        self._restore_tree(self._plan_tree_restore(contents, tree, revision), tree)
+
+    @stats.timed('plan')
+    def _plan_tree_restore(self, contents, tree: gittree.TreeBuilder, name: str) -> Plan:
+        """
+        Plans a restore from a tree, without a work tree.
+
+        Only the parts of the tree that hold the contents are read.
+
+        :param contents: Contents to restore.
+        :param tree: A TreeBuilder object.
+        :param name: Name of the tree in messages, e.g. a branch.
+        :return: A Plan object.
+        """
+        plan = Plan('restore')
+        for content in self._expand_tree(contents, tree):
+            source_path = content.source_path()
+            blob = tree.get(content.backup_path().as_posix())
+            if not blob:
+                error = f'Not found in {name}: {content.backup_path()}'
+                plan.append(Operation('missing', source_path, content=content, error=error))
+                continue
+
+            size = self._repo.odb.info(blob[0]).size
+            try:
+                identical = (
+                    os.stat(source_path).st_size == size and
+                    gittree.blob_sha(source_path) == blob[0]
+                )
+            except FileNotFoundError:
+                identical = False
+
+            action = 'skip' if identical else 'copy'
+            plan.append(Operation(action, source_path, None, content, size))
+
+        stats.add('plan', files=len(plan))
+        return plan
+
+    def _backup_tree(self, contents) -> None:
+        """Commits the contents without using the work tree."""
+        manifest = self._manifest()
+        tree = self._tree()
+        changed = self._execute(self._plan_tree_backup(contents, manifest, tree), manifest)
+
+        change_count = 0
+        for content in changed:
+            entry = manifest.get(content.backup_path())
+            if tree.set(content.backup_path().as_posix(), bytes.fromhex(entry.digest)):
+                change_count += 1
+
+        logger.info('%d change(s) detected.', change_count)
+
+        if not self._commit_tree(tree):
+            manifest.save()
+            return
+
+        manifest.save()
+        self._git_push()
+        self._git_maintenance()
+
+    def _commit_tree(self, tree: gittree.TreeBuilder) -> bool:
+        """
+        Commits a tree to the branch, without using the index.
+
+        :param tree: A TreeBuilder object.
+        :return: False if the tree is the same as the branch's.
+        """
+        repo = self._repo
+        parent = repo.heads[self._branch].commit if self._branch in repo.heads else None
+        with stats.phase('git_commit'):
+            binsha = tree.write()
+            if parent and parent.tree.binsha == binsha:
+                return False
+
+            commit = Commit.create_from_tree(
+                repo,
+                Tree(repo, binsha),
+                'Clibato backup',
+                parent_commits=[parent] if parent else [],
+                author=self._author,
+                committer=self._author
+            )
+
+        if parent:
+            repo.heads[self._branch].set_commit(commit, logmsg='Clibato backup')
+        else:
+            logger.info('Creating branch: %s', self._branch)
+            repo.create_head(self._branch, commit)
+
+        return True
+
+    @stats.timed('plan')
+    def _plan_tree_backup(self, contents, manifest: Manifest, tree: gittree.TreeBuilder) -> Plan:
+        """
+        Plans a backup without a work tree.
+
+        A content is unchanged if its stat signature matches the manifest,
+        and the blob recorded in the manifest is still in the tree.
+        """
+        def stat_source(content):
+            return os.stat(content.source_path())
+
+        plan = Plan('backup')
+        for content, stat, error in transfer.run(stat_source, expand(contents), self._jobs):
+            source_path = content.source_path()
+            if error:
+                plan.append(Operation('missing', None, source_path, content, error=str(error)))
+                continue
+
+            entry = manifest.get(content.backup_path())
+            blob = tree.get(content.backup_path().as_posix())
+            if entry and entry.matches(stat) and blob and blob[0].hex() == entry.digest:
+                plan.append(Operation('skip', None, source_path, content, stat.st_size))
+            else:
+                entry = ManifestEntry.from_stat(stat)
+                plan.append(Operation('copy', None, source_path, content, stat.st_size, entry))
+
+        stats.add('plan', files=len(plan))
+        return plan
+
+    def _execute_operation(self, operation: Operation, action: str) -> Optional[ManifestEntry]:
+        if self._worktree:
+            return super()._execute_operation(operation, action)
+
+        if operation.action == 'copy':
+            binsha = self._pool.hash_file(operation.source)
+            return operation.entry._replace(digest=binsha.hex())
+
+        return operation.entry
+
+    @stats.timed('transfer')
+    def _restore_tree(self, plan: Plan, tree: gittree.TreeBuilder) -> None:
+        """Restores contents from a tree, without using the work tree."""
+        directories = DirectoryCache()
+
+        for operation in plan:
+            content = operation.content
+            if operation.error:
+                logger.error(operation.error)
+                continue
+
+            if operation.action == 'skip':
+                logger.debug('Unchanged: %s', content.source_path())
+                continue
+
+            binsha, _ = tree.get(content.backup_path().as_posix())
+            directories.ensure(operation.target.parent)
+            transfer.install_fileobj(self._repo.odb.stream(binsha), operation.target)
+            logger.info('Restored: %s', content.source_path())
+            stats.add('transfer', files=1, size=operation.size)
+
+    @staticmethod
+    def _expand_tree(contents, tree: gittree.TreeBuilder) -> Iterator[Content]:
+        """Expands contents into the files they represent in a tree."""
+        for content in contents:
+            yield from content.expand(paths=tree.paths(content.backup_path().as_posix()))
+
+    def _tree(self, update: bool = True) -> gittree.TreeBuilder:
+        """
+        The tree of the branch, or an empty one.
+
+        :param update: Whether to create or fast-forward the branch first.
+            Otherwise, the tree is the one it would have.
+        """
+        repo = self._repo
+        commit = self._git_branch() if update else self._branch_commit()
+        if commit is None:
+            return gittree.TreeBuilder(repo.odb)
+
+        return gittree.TreeBuilder(repo.odb, commit.tree.binsha)
+
+    def _manifest(self) -> Manifest:
+        if self._worktree:
+            return super()._manifest()
+
+        return Manifest.load(self._path / self.TREE_MANIFEST_PATH)
+
+    def _validate(self):
+        super()._validate()
+
+        if not self._remote:
+            raise ConfigError('Remote cannot be empty')
+
+        if not isinstance(self._worktree, bool):
+            raise ConfigError(f'Worktree must be a boolean: {self._worktree}')
+
+        if self._depth is not None and (
+            not isinstance(self._depth, int) or isinstance(self._depth, bool) or self._depth < 1
+        ):
+            raise ConfigError(f'Depth must be a positive integer: {self._depth}')
+
+        if self._filter is not None and (not isinstance(self._filter, str) or not self._filter):
+            raise ConfigError(f'Filter is invalid: {self._filter}')
+
+        fetch_ttl = self._fetch_ttl
+        if not isinstance(fetch_ttl, int) or isinstance(fetch_ttl, bool) or fetch_ttl < 0:
+            raise ConfigError(f'Fetch TTL must be a non-negative integer: {self._fetch_ttl}')
+
+        self._validate_maintenance()
+
+    def _validate_maintenance(self):
+        if isinstance(self._maintenance, bool):
+            self._maintenance = dict(self.MAINTENANCE_DEFAULTS) if self._maintenance else {}
+            return
+
+        if not isinstance(self._maintenance, dict):
+            raise ConfigError(f'Maintenance is invalid: {self._maintenance}')
+
+        extra_keys = sorted(self._maintenance.keys() - self.MAINTENANCE_DEFAULTS.keys())
+        if extra_keys:
+            raise ConfigError(f"Maintenance has illegal keys: {', '.join(extra_keys)}")
+
+        self._maintenance = {**self.MAINTENANCE_DEFAULTS, **self._maintenance}
+        for key in ['loose_objects', 'packs']:
+            value = self._maintenance[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise ConfigError(f'Maintenance {key} must be a positive integer: {value}')
+
+    @stats.timed('git_commit')
+    def _git_commit(self, message):
+        self._repo.index.commit(message, author=self._author)
+
+    def _git_open(self) -> bool:
+        """
+        Open the Git repo, without creating it.
+
+        :return: Whether the repo exists.
+        """
+        if self._repo:
+            return True
+
+        try:
+            self._repo = gitpool.Repo(self._path)
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            return False
+
+        return True
+
+    def _has_origin(self) -> bool:
+        """Whether the repo's origin is the configured remote."""
+        remotes = self._repo.remotes
+        return 'origin' in remotes and remotes.origin.url == self._remote
+
+    @stats.timed('git_init')
+    def _git_init(self):
+        """Prepare Git repo and remote."""
+        if self._repo and self._has_origin():
+            return
+
+        self._repo = repo = self._repo or gitpool.Repo.init(self._path, mkdir=False)
+
+        if 'origin' in repo.remotes:
+            if repo.remotes.origin.url != self._remote:
+                logger.info('Removing incorrect remote: %s', repo.remotes.origin.url)
+                repo.delete_remote(repo.remotes.origin)
+
+        if 'origin' not in repo.remotes:
+            logger.info('Creating remote: %s (origin)', self._remote)
+            repo.create_remote('origin', self._remote)
+
+        if self._filter:
+            # Objects filtered out of fetches are fetched from the
+            # "promisor" remote, on demand.
+            with repo.config_writer() as config:
+                config.set_value('core', 'repositoryformatversion', 1)
+                config.set_value('extensions', 'partialClone', 'origin')
+                config.set_value('remote "origin"', 'promisor', 'true')
+                config.set_value('remote "origin"', 'partialclonefilter', self._filter)
+
+    @stats.timed('git_pull')
+    def _git_pull(self):
+        """Switch branch and pull remote changes."""
+        repo = self._repo
+        self._git_fetch()
+
+        if self._branch not in repo.branches:
+            logger.info('Creating branch: %s', self._branch)
+            if self._git_branch() is None:
+                self._git_commit('Initial commit')
+                repo.create_head(self._branch)
+
+        if repo.active_branch != self._branch:
+            logger.info('Switching branch: %s', self._branch)
+            repo.heads[self._branch].checkout()
+
+    @stats.timed('git_fetch')
+    def _git_fetch(self):
+        """
+        Fetch remote changes.
+
+        Only the configured branch is fetched, optionally shallow, i.e.
+        the last "depth" commits, and partially, e.g. without blobs. The
+        fetch is skipped if the branch didn't move in origin.
+        """
+        if self._is_fetched():
+            logger.debug('Skipping fetch, origin/%s is up-to-date.', self._branch)
+            return
+
+        options = {}
+        if self._depth:
+            options['depth'] = self._depth
+        if self._filter:
+            options['filter'] = self._filter
+
+        refspec = f'+refs/heads/{self._branch}:refs/remotes/origin/{self._branch}'
+        try:
+            self._repo.remotes.origin.fetch(refspec, **options)
+        except GitCommandError as error:
+            if "couldn't find remote ref" not in str(error):
+                raise
+            logger.debug('Branch not found in origin: %s', self._branch)
+
+        self._set_fetched()
+
+    def _is_fetched(self) -> bool:
+        """
+        Whether origin/$branch is up-to-date.
+
+        Within "fetch_ttl" seconds of the last check, it is assumed to be.
+        Otherwise, the branch is looked up in origin, which is much cheaper
+        than a fetch, and compared to the one fetched last.
+        """
+        checked = self._fetch_cache().get(self._branch)
+        if checked and time.time() - checked < self._fetch_ttl:
+            return True
+
+        output = self._repo.git.ls_remote('origin', f'refs/heads/{self._branch}')
+        remote_sha = output.split('\t', 1)[0] if output else None
+
+        remote = self._repo.remotes.origin
+        local_sha = remote.refs[self._branch].commit.hexsha if self._branch in remote.refs else None
+        if remote_sha != local_sha:
+            return False
+
+        self._set_fetched()
+        return True
+
+    def _set_fetched(self) -> None:
+        """Records the time at which origin/$branch was last checked."""
+        cache = self._fetch_cache()
+        cache[self._branch] = time.time()
+
+        path = self._path / self.FETCH_CACHE_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(cache))
+
+    def _fetch_cache(self) -> dict:
+        try:
+            cache = json.loads((self._path / self.FETCH_CACHE_PATH).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        return cache if isinstance(cache, dict) else {}
+
+    def _git_branch(self) -> Optional[Commit]:
+        """
+        Create or fast-forward the branch to origin, without checking it out.
+
+        :return: The commit of the branch, if it exists.
+        """
+        repo = self._repo
+        commit = self._branch_commit()
+        if commit is None:
+            return None
+
+        if self._branch not in repo.heads:
+            head = repo.create_head(self._branch, commit)
+            head.set_tracking_branch(repo.remotes.origin.refs[self._branch])
+        elif repo.heads[self._branch].commit != commit:
+            logger.info('Fast-forwarding branch: %s', self._branch)
+            repo.heads[self._branch].set_commit(commit)
+
+        return commit
+
+    def _branch_commit(self) -> Optional[Commit]:
+        """
+        The commit of the branch once fast-forwarded to origin, without
+        changing anything.
+
+        :return: A Commit object, or None if the branch doesn't exist.
+        """
+        repo = self._repo
+        commit = repo.heads[self._branch].commit if self._branch in repo.heads else None
+        if not self._has_origin() or self._branch not in repo.remotes.origin.refs:
+            return commit
+
+        remote_commit = repo.remotes.origin.refs[self._branch].commit
+        if commit is None or (commit != remote_commit and repo.is_ancestor(commit, remote_commit)):
+            return remote_commit
+
+        return commit
+
+    @stats.timed('git_push')
+    def _git_push(self):
+        """Push commits to remote."""
+        logger.info('Pushing commits to origin/%s.', self._branch)
+        self._repo.remotes.origin.push(self._branch)
+
+    @stats.timed('git_maintenance')
+    def _git_maintenance(self):
+        """
+        Pack loose objects and write the commit-graph, if needed.
+
+        Every backup adds loose objects, which slow Git down once there
+        are thousands of them. When the number of loose objects or packs
+        crosses its threshold, "git maintenance" is run, by default in a
+        detached process, so that the backup doesn't wait for it. Loose
+        objects are packed by one run, and deleted by the next.
+        """
+        if not self._maintenance:
+            return
+
+        objects_path = Path(self._repo.git_dir, 'objects')
+        loose_count = sum(
+            len(os.listdir(directory))
+            for directory in objects_path.glob('[0-9a-f][0-9a-f]')
+        )
+        pack_count = len(list(objects_path.glob('pack/*.pack')))
+
+        tasks = []
+        if loose_count >= self._maintenance['loose_objects']:
+            tasks.append('loose-objects')
+        if pack_count >= self._maintenance['packs']:
+            tasks.append('incremental-repack')
+
+        if not tasks:
+            logger.debug(
+                'Maintenance not needed: %d loose object(s), %d pack(s).',
+                loose_count,
+                pack_count
+            )
+            return
+
+        tasks.append('commit-graph')
+        command = ['maintenance', 'run', *(f'--task={task}' for task in tasks)]
+        logger.info('Running maintenance: %s', ', '.join(tasks))
+
+        if not self._maintenance['background']:
+            self._repo.git.maintenance(*command[1:])
+            return
+
+        self._repo.git.counters().add('git_processes')
+        subprocess.Popen(  # pylint: disable=consider-using-with
+            [Git.GIT_PYTHON_GIT_EXECUTABLE or 'git', *command],
+            cwd=self._path,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
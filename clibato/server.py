@@ -0,0 +1,268 @@
+"""Clibato Server: Backups and restores served over a Unix socket"""
+
+import json
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from .config import Config
+from .error import ActionError, ConfigError
+
+logger = logging.getLogger('clibato')
+
+ACTIONS = ('ping', 'backup', 'restore')
+
+
+class Server:
+    """
+    Serves backups and restores over a Unix socket.
+
+    Configs and their destinations, and with them, open Git repositories,
+    are kept between requests. A config is loaded again when its file
+    changes. Requests are served one at a time, in the order they arrive,
+    so backups never overlap.
+
+    The protocol is JSON, one object per line. A request is an object with
+    the keys action, config, level and revision. The server replies with
+    any number of log records, i.e. {"level": 20, "message": "..."}, and
+    then a result, i.e. {"ok": true} or {"ok": false, "error": "..."}.
+    """
+
+    # Seconds for a client to send its request.
+    TIMEOUT = 10
+
+    def __init__(self, socket_path: Path, jobs: int = None):
+        self._socket_path = Path(socket_path)
+        self._jobs = jobs
+        self._configs: Dict[Path, Tuple[tuple, Config]] = {}
+        self._socket = None
+        self._running = False
+
+    def socket_path(self) -> Path:
+        """Path to the Unix socket"""
+        return self._socket_path
+
+    @staticmethod
+    def default_socket_path() -> Path:
+        """$XDG_RUNTIME_DIR/clibato.sock, or a socket in the cache directory"""
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if runtime_dir:
+            return Path(runtime_dir, 'clibato.sock')
+
+        return Config.cache_dir() / 'clibato.sock'
+
+    def serve(self) -> None:
+        """Serves requests until shutdown() is called, or interrupted."""
+        self._bind()
+        self._running = True
+        logger.info('Serving on: %s', self._socket_path)
+
+        try:
+            while self._running:
+                connection, _ = self._socket.accept()
+                if self._running:
+                    self._handle(connection)
+                else:
+                    connection.close()
+        finally:
+            self._socket.close()
+            self._socket = None
+            try:
+                self._socket_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self) -> None:
+        """Stops serving, after the current request, if any."""
+        self._running = False
+
+        # Wake up accept().
+        with socket.socket(socket.AF_UNIX) as sock:
+            try:
+                sock.connect(str(self._socket_path))
+            except OSError:
+                pass
+
+    def _bind(self) -> None:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ActionError('Unix sockets are not supported on this platform')
+
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._socket_path.exists():
+            with socket.socket(socket.AF_UNIX) as sock:
+                try:
+                    sock.connect(str(self._socket_path))
+                except ConnectionRefusedError:
+                    logger.debug('Removing stale socket: %s', self._socket_path)
+                    self._socket_path.unlink()
+                else:
+                    raise ActionError(f'Already serving on: {self._socket_path}')
+
+        self._socket = socket.socket(socket.AF_UNIX)
+        # Only the user may connect.
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(str(self._socket_path))
+        finally:
+            os.umask(umask)
+
+        self._socket.listen()
+
+    def _handle(self, connection: socket.socket) -> None:
+        """Serves a request."""
+        def send(message: dict) -> None:
+            connection.sendall(json.dumps(message).encode() + b'\n')
+
+        with connection, connection.makefile('rb') as reader:
+            connection.settimeout(self.TIMEOUT)
+            try:
+                line = reader.readline()
+                if not line:
+                    # The client changed its mind, e.g. shutdown().
+                    return
+
+                data = json.loads(line)
+                self._validate(data)
+            except (OSError, ValueError) as error:
+                logger.warning('Illegal request: %s', error)
+                try:
+                    send({'ok': False, 'error': f'Illegal request: {error}'})
+                except OSError:
+                    pass
+                return
+
+            connection.settimeout(None)
+            start = time.monotonic()
+            response = self._execute(data, send)
+            logger.info(
+                'Served %s in %.3fs: %s',
+                data['action'],
+                time.monotonic() - start,
+                'OK' if response['ok'] else response['error']
+            )
+
+            try:
+                send(response)
+            except OSError as error:
+                logger.warning('Cannot send response: %s', error)
+
+    @staticmethod
+    def _validate(data) -> None:
+        """Raises a ValueError if a request is illegal."""
+        if not isinstance(data, dict):
+            raise ValueError('Not an object')
+
+        if data.get('action') not in ACTIONS:
+            raise ValueError(f"Illegal action: {data.get('action')}")
+
+        if data['action'] != 'ping' and not isinstance(data.get('config'), str):
+            raise ValueError('Config path is required')
+
+        if not isinstance(data.get('level', logging.WARNING), int):
+            raise ValueError(f"Illegal level: {data['level']}")
+
+    def _execute(self, data: dict, send: Callable[[dict], None]) -> dict:
+        """
+        Executes a request, sending log records to the client.
+
+        :param data: The request.
+        :param send: A callable that sends a message to the client.
+        :return: The result.
+        """
+        handler = _Handler(send)
+        handler.setLevel(data.get('level') or logging.WARNING)
+        level, propagate = logger.level, logger.propagate
+        logger.addHandler(handler)
+        logger.setLevel(handler.level)
+        logger.propagate = False
+
+        try:
+            if data['action'] != 'ping':
+                config = self._config(Path(data['config']))
+                destination = config.destination()
+                if data['action'] == 'backup':
+                    destination.backup(config.contents())
+                elif data.get('revision'):
+                    destination.restore_at(config.contents(), data['revision'])
+                else:
+                    destination.restore(config.contents())
+        except (ConfigError, ActionError, OSError) as error:
+            return {'ok': False, 'error': str(error)}
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception(error)
+            return {'ok': False, 'error': f'Unexpected error: {error}'}
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            logger.propagate = propagate
+
+        return {'ok': True}
+
+    def _config(self, path: Path) -> Config:
+        """Get a config, loading it only if its file changed."""
+        stat = os.stat(path)
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        cached = self._configs.get(path)
+        if cached and cached[0] == signature:
+            logger.debug('Using loaded configuration: %s', path)
+            return cached[1]
+
+        config = Config.from_file(path)
+        if self._jobs:
+            config.destination().set_jobs(self._jobs)
+
+        self._configs[path] = (signature, config)
+        return config
+
+
+class _Handler(logging.Handler):
+    """Sends log records to a client."""
+
+    def __init__(self, send: Callable[[dict], None]):
+        super().__init__()
+        self._send = send
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._send({'level': record.levelno, 'message': record.getMessage()})
+        except OSError:
+            # The client is gone, but the request is completed anyway.
+            pass
+
+
+def request(socket_path: Path, data: dict) -> None:
+    """
+    Sends a request to a server, logging the records it sends back.
+
+    :except ActionError
+
+    :param socket_path: Path to the server's socket.
+    :param data: The request. See Server.
+    :return: None
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ActionError('Unix sockets are not supported on this platform')
+
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except (FileNotFoundError, ConnectionRefusedError) as error:
+            raise ActionError(f'Server not running: {socket_path}') from error
+
+        sock.sendall(json.dumps(data).encode() + b'\n')
+        with sock.makefile('rb') as reader:
+            for line in reader:
+                message = json.loads(line)
+                if 'ok' not in message:
+                    logger.log(message['level'], message['message'])
+                    continue
+
+                if not message['ok']:
+                    raise ActionError(message['error'])
+                return
+
+    raise ActionError('Server closed the connection unexpectedly')
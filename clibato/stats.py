@@ -0,0 +1,145 @@
+"""Clibato Stats: Durations, file counts and bytes of the phases of an action"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+class Stats:
+    """
+    Durations, file counts and bytes, per phase, e.g. git_push.
+
+    Phases can nest, e.g. git_fetch happens during git_pull, and the same
+    phase can happen more than once, e.g. with multiple destinations, in
+    which case the durations add up. Thread-safe.
+    """
+
+    def __init__(self):
+        self._phases = {}
+        self._counters = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times a phase.
+
+        :param name: Name of the phase, e.g. git_push.
+        """
+        # Phases are listed in the order they start.
+        totals = self._totals(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                totals['seconds'] += time.perf_counter() - start
+                totals['calls'] += 1
+
+    def add(self, name: str, files: int = 0, size: int = 0) -> None:
+        """
+        Adds files, and their bytes, to a phase.
+
+        :param name: Name of the phase, e.g. transfer.
+        :param files: Number of files.
+        :param size: Number of bytes.
+        """
+        totals = self._totals(name)
+        with self._lock:
+            totals['files'] += files
+            totals['bytes'] += size
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increments a counter, e.g. git_processes."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        """Get a JSON-friendly representation of the stats."""
+        with self._lock:
+            return {
+                'seconds': round(time.perf_counter() - self._start, 6),
+                'phases': {
+                    name: {**totals, 'seconds': round(totals['seconds'], 6)}
+                    for name, totals in self._phases.items()
+                },
+                'counters': dict(self._counters),
+            }
+
+    def summary(self) -> str:
+        """Get the stats as a table, for humans."""
+        data = self.to_dict()
+        lines = [f"{'Phase':<16} {'Seconds':>9} {'Calls':>6} {'Files':>8} {'Bytes':>12}"]
+        for name, totals in data['phases'].items():
+            lines.append(
+                f"{name:<16} {totals['seconds']:>9.3f} {totals['calls']:>6} "
+                f"{totals['files']:>8} {totals['bytes']:>12}"
+            )
+        lines.append(f"{'total':<16} {data['seconds']:>9.3f}")
+
+        for name, value in sorted(data['counters'].items()):
+            lines.append(f'{name}: {value}')
+
+        return '\n'.join(lines)
+
+    def _totals(self, name: str) -> dict:
+        with self._lock:
+            if name not in self._phases:
+                self._phases[name] = {'seconds': 0.0, 'calls': 0, 'files': 0, 'bytes': 0}
+
+            return self._phases[name]
+
+
+# The stats being recorded, if any.
+_current: Optional[Stats] = None  # pylint: disable=invalid-name
+
+
+@contextmanager
+def recording() -> Iterator[Stats]:
+    """Records the stats of everything that happens within."""
+    global _current  # pylint: disable=global-statement
+
+    previous, _current = _current, Stats()
+    try:
+        yield _current
+    finally:
+        _current = previous
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Times a phase, if stats are being recorded. See Stats.phase()."""
+    if _current is None:
+        yield
+        return
+
+    with _current.phase(name):
+        yield
+
+
+def timed(name: str) -> Callable:
+    """A decorator that times a function as a phase. See Stats.phase()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add(name: str, files: int = 0, size: int = 0) -> None:
+    """Adds files to a phase, if stats are being recorded. See Stats.add()."""
+    if _current is not None:
+        _current.add(name, files, size)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increments a counter, if stats are being recorded. See Stats.count()."""
+    if _current is not None:
+        _current.count(name, value)
@@ -0,0 +1,539 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .error import ActionError
+from .manifest import digest
+
+logger = logging.getLogger('clibato')
+
+# Permissions of new files are determined by the umask, which can only be
+# read by setting it.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+# ioctl request to share the data blocks of a file, i.e. _IOW(0x94, 9, int).
+FICLONE = 0x40049409
+
+COPY_METHODS = ('auto', 'reflink', 'copy_file_range', 'sendfile', 'copyfile')
+
+# Block size for delta transfers.
+DELTA_BLOCK_SIZE = 64 * 1024
+
+# Files smaller than this are copied, even if delta transfers are enabled.
+DELTA_MIN_SIZE = 1024 * 1024
+
+# Errors which mean that a copy method is not supported for a pair of files.
+_UNSUPPORTED = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.EXDEV,
+}
+
+
+class Counters:
+    """Thread-safe named counters, e.g. bytes_written."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: int = 1) -> None:
+        """Increments a counter."""
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        """Get the value of a counter."""
+        return self._values.get(name, 0)
+
+    def as_dict(self) -> dict:
+        """Get all counters."""
+        with self._lock:
+            return dict(self._values)
+
+
+class DirectoryCache:
+    """
+    Creates directories, remembering the ones known to exist.
+
+    Each directory is checked and created at most once, even when
+    multiple threads need it at the same time.
+    """
+
+    def __init__(self):
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, path: Path) -> None:
+        """
+        Creates the directory if it doesn't exist.
+
+        :param path: Directory path.
+        :return: None
+        """
+        if path in self._known:
+            return
+
+        with self._lock:
+            if path in self._known:
+                return
+
+            if not path.is_dir():
+                logger.debug('Creating directory: %s', path)
+                os.makedirs(path, exist_ok=True)
+
+            self._known.add(path)
+
+
+class SharedReads:
+    """
+    Reads each file once for several readers, e.g. the destinations of a
+    Fanout, which back up the same files in parallel.
+
+    The first reader of a file reads it from disk, and the others get the
+    same bytes from memory, as long as the file's stat signature didn't
+    change in between. The bytes are dropped once all readers got them, or
+    to make room for other files. Files larger than MAX_SIZE are not
+    shared, i.e. each reader reads them on its own.
+    """
+
+    MAX_SIZE = 8 * 1024 * 1024
+
+    # Bytes kept in memory at most.
+    MAX_TOTAL = 64 * 1024 * 1024
+
+    def __init__(self, readers: int):
+        self._readers = readers
+        self._files = {}
+        self._total = 0
+        self._counters = Counters()
+        self._lock = threading.Lock()
+
+    def counters(self) -> Counters:
+        """Counters, i.e. files_read and files_shared"""
+        return self._counters
+
+    def read(self, path: Path) -> Optional[Tuple[os.stat_result, bytes]]:
+        """
+        Reads a file, or gets it from another reader.
+
+        :param path: File path.
+        :return: The stat and the contents of the file, or None if it is
+            not shared, e.g. because it is too large.
+        """
+        stat = os.stat(path)
+        if stat.st_size > self.MAX_SIZE:
+            return None
+
+        key = (os.fspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            shared = self._files.get(key)
+            owner = shared is None
+            if owner:
+                self._evict(self.MAX_TOTAL - stat.st_size)
+                shared = self._files[key] = _SharedFile(self._readers)
+                self._total += stat.st_size
+
+        try:
+            if owner:
+                try:
+                    with open(path, 'rb') as fh:
+                        shared.data = fh.read()
+                finally:
+                    shared.ready.set()
+                self._counters.add('files_read')
+            else:
+                shared.ready.wait()
+                self._counters.add('files_shared')
+        finally:
+            with self._lock:
+                shared.readers -= 1
+                if shared.readers == 0 and self._files.get(key) is shared:
+                    del self._files[key]
+                    self._total -= stat.st_size
+
+        # The read failed, or the file changed while it was being read.
+        if shared.data is None or len(shared.data) != stat.st_size:
+            return None
+
+        return stat, shared.data
+
+    def _evict(self, limit: int) -> None:
+        """Drops the oldest files until at most "limit" bytes are kept."""
+        while self._files and self._total > limit:
+            key = next(iter(self._files))
+            del self._files[key]
+            self._total -= key[1]
+
+
+class _SharedFile:
+    """A file being shared by SharedReads."""
+
+    def __init__(self, readers: int):
+        self.readers = readers
+        self.data = None
+        self.ready = threading.Event()
+
+
+# The reads being shared, if any.
+_shared: Optional[SharedReads] = None  # pylint: disable=invalid-name
+
+
+@contextmanager
+def sharing(readers: int) -> Iterator[SharedReads]:
+    """Shares the reads of files between "readers" readers, within."""
+    global _shared  # pylint: disable=global-statement
+
+    previous, _shared = _shared, SharedReads(readers)
+    try:
+        yield _shared
+    finally:
+        _shared = previous
+
+
+def read_shared(path: Path) -> Optional[Tuple[os.stat_result, bytes]]:
+    """Reads a file, if reads are being shared. See SharedReads.read()."""
+    if _shared is None:
+        return None
+
+    return _shared.read(path)
+
+
+def run(
+    func: Callable,
+    items: Iterable,
+    jobs: int = 1,
+    errors: Tuple[type, ...] = (FileNotFoundError,)
+) -> Iterator[Tuple[object, object, Optional[Exception]]]:
+    """
+    Calls a function for each item, using up to "jobs" threads.
+
+    Results are yielded in the order of the items, regardless of the order
+    in which they complete, so that log output is deterministic. Items are
+    consumed lazily; at most 2 x jobs of them are in flight at any time.
+
+    Exceptions of the types listed in "errors" are yielded along with the
+    item they belong to. Other exceptions are raised in item order.
+
+    :param func: A callable that accepts an item.
+    :param items: Items to process.
+    :param jobs: Number of threads.
+    :param errors: Exception types to collect instead of raising.
+    :return: An iterator of (item, result, error) tuples.
+    """
+    def call(item):
+        try:
+            return item, func(item), None
+        except errors as error:
+            return item, None, error
+
+    if jobs <= 1:
+        for item in items:
+            yield call(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(call, item))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def copy(source: Path, target: Path, method: str = 'auto') -> str:
+    """
+    Copies the contents of a file.
+
+    With method "auto", the fastest supported method is used: a reflink,
+    os.copy_file_range(), os.sendfile() and lastly, shutil.copyfile().
+    Other methods are forced, and raise an ActionError if unsupported.
+    If reads are being shared, "auto" writes the shared contents instead.
+
+    :param source: Source file.
+    :param target: Target file.
+    :param method: One of COPY_METHODS.
+    :return: Name of the method that was used.
+    """
+    shared = read_shared(source) if method == 'auto' else None
+    if shared:
+        with open(target, 'wb') as dst:
+            dst.write(shared[1])
+        logger.debug('Copied from a shared read: %s', source)
+        return 'shared'
+
+    if method == 'copyfile':
+        shutil.copyfile(source, target)
+        logger.debug('Copied with %s: %s', method, source)
+        return method
+
+    methods = _FAST_METHODS if method == 'auto' else {method: _FAST_METHODS[method]}
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        for name, func in methods.items():
+            try:
+                func(src.fileno(), dst.fileno(), size)
+            except OSError as error:
+                if method != 'auto':
+                    raise ActionError(
+                        f'Copy method {method} failed for {source}: {error}'
+                    ) from error
+                if error.errno not in _UNSUPPORTED:
+                    raise
+
+                os.lseek(src.fileno(), 0, os.SEEK_SET)
+                os.lseek(dst.fileno(), 0, os.SEEK_SET)
+                os.ftruncate(dst.fileno(), 0)
+                continue
+
+            logger.debug('Copied with %s: %s', name, source)
+            return name
+
+    shutil.copyfile(source, target)
+    logger.debug('Copied with copyfile: %s', source)
+    return 'copyfile'
+
+
+def replace(source: Path, target: Path, method: str = 'auto') -> None:
+    """
+    Copies a file to a temporary file, which then replaces the target.
+
+    The target is never left half-written. The permissions of an existing
+    target are preserved, and if the target is a symlink, the file it
+    points to is replaced.
+
+    :param source: Source file.
+    :param target: Target file.
+    :param method: One of COPY_METHODS.
+    """
+    target = _real_path(target)
+    with _staging_file(target) as temp_path:
+        copy(source, temp_path, method)
+        _replace(temp_path, target)
+
+
+def install_fileobj(fh: BinaryIO, target: Path) -> bool:
+    """
+    Writes a stream to a file, unless the file already has that content.
+
+    Like replace(), but the stream is staged in a temporary file first.
+
+    :param fh: A readable binary stream.
+    :param target: Target file.
+    :return: Whether the target was written.
+    """
+    target = _real_path(target)
+
+    with _staging_file(target) as temp_path:
+        with open(temp_path, 'wb') as dst:
+            shutil.copyfileobj(fh, dst)
+
+        if is_identical(temp_path, target):
+            os.unlink(temp_path)
+            return False
+
+        _replace(temp_path, target)
+
+    return True
+
+
+def install_digest(source: Path, locate: Callable[[str], Path], staging_dir: Path) -> str:
+    """
+    Copies a file to a path named after the SHA-256 digest of its contents.
+
+    The digest is computed while copying, so it always matches the bytes
+    written, even if the source changes meanwhile.
+
+    :param source: Source file.
+    :param locate: A callable that returns the target path for a digest.
+    :param staging_dir: Directory for the temporary file, on the same
+        filesystem as the targets.
+    :return: The digest.
+    """
+    sha = hashlib.sha256()
+    shared = read_shared(source)
+    with _staging_file(staging_dir / 'object') as temp_path:
+        with open(temp_path, 'wb') as dst:
+            if shared:
+                sha.update(shared[1])
+                dst.write(shared[1])
+            else:
+                with open(source, 'rb') as src:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        sha.update(chunk)
+                        dst.write(chunk)
+
+        checksum = sha.hexdigest()
+        target = locate(checksum)
+        os.makedirs(target.parent, exist_ok=True)
+        _replace(temp_path, target)
+
+    return checksum
+
+
+def is_identical(source: Path, target: Path) -> bool:
+    """
+    Whether two files have the same content.
+
+    Sizes and modification times are compared first. If the sizes are
+    equal but the modification times are not, digests are compared.
+
+    :param source: A file.
+    :param target: Another file, which need not exist.
+    :return: True if both files are identical.
+    """
+    try:
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+
+    source_stat = os.stat(source)
+    if source_stat.st_size != target_stat.st_size:
+        return False
+
+    if source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+        return True
+
+    return digest(source) == digest(target)
+
+
+def _real_path(path: Path) -> Path:
+    return Path(os.path.realpath(path)) if os.path.islink(path) else Path(path)
+
+
+@contextmanager
+def _staging_file(target: Path) -> Iterator[Path]:
+    """A temporary file next to the target, removed if anything fails."""
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f'.{target.name}.',
+        suffix='.clibato',
+        dir=target.parent
+    )
+    os.close(fd)
+
+    try:
+        yield Path(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _replace(temp_path: Path, target: Path) -> None:
+    try:
+        shutil.copymode(target, temp_path)
+    except FileNotFoundError:
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+
+    os.replace(temp_path, target)
+
+
+def delta_copy(source: Path, target: Path, counters: Counters = None) -> None:
+    """
+    Updates a file in place, only writing the blocks that differ.
+
+    Both files are read block by block, at the same offsets, and only the
+    blocks of the target that don't match the source are rewritten. The
+    target is then truncated to the size of the source. This works well
+    for files which are appended to or modified in place, like shell
+    histories and SQLite databases.
+
+    :param source: Source file.
+    :param target: Target file, which must exist.
+    :param counters: Receives bytes_compared and bytes_written.
+    """
+    compared = written = offset = 0
+    with open(source, 'rb') as src, open(target, 'r+b') as dst:
+        while True:
+            block = src.read(DELTA_BLOCK_SIZE)
+            if not block:
+                break
+
+            if dst.read(len(block)) != block:
+                dst.seek(offset)
+                dst.write(block)
+                written += len(block)
+            compared += len(block)
+            offset += len(block)
+
+        dst.truncate(offset)
+
+    if counters:
+        counters.add('bytes_compared', compared)
+        counters.add('bytes_written', written)
+
+    logger.debug('Copied with delta: %s (%d of %d bytes written)', source, written, compared)
+
+
+def _reflink(src: int, dst: int, _size: int) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, 'Reflinks are not supported')
+
+    fcntl.ioctl(dst, FICLONE, src)
+
+
+def _copy_file_range(src: int, dst: int, size: int) -> None:
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'os.copy_file_range() is not available')
+
+    # Keep going until EOF, in case the file grew since it was measured.
+    copied = 0
+    while True:
+        count = os.copy_file_range(src, dst, max(size - copied, 1024 * 1024))
+        if count == 0:
+            break
+        copied += count
+
+    _check_copied(copied, size, 'os.copy_file_range()')
+
+
+def _sendfile(src: int, dst: int, size: int) -> None:
+    if not hasattr(os, 'sendfile'):
+        raise OSError(errno.ENOSYS, 'os.sendfile() is not available')
+
+    offset = 0
+    while True:
+        count = os.sendfile(dst, src, offset, max(size - offset, 1024 * 1024))
+        if count == 0:
+            break
+        offset += count
+
+    _check_copied(offset, size, 'os.sendfile()')
+
+
+def _check_copied(copied: int, size: int, name: str) -> None:
+    # Some filesystems, e.g. procfs, report EOF instead of an error for
+    # copies they don't support. An empty copy of a non-empty file is
+    # taken to mean just that, so that the next method is tried.
+    if copied == 0 and size > 0:
+        raise OSError(errno.ENOSYS, f'{name} copied nothing')
+
+
+_FAST_METHODS = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+}
@@ -0,0 +1,387 @@
+"""Clibato Watch: Backups of contents as they change"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set
+
+from git import GitCommandError
+
+from .content import Content, ContentTree
+from .error import ActionError
+
+if TYPE_CHECKING:
+    from .destination import Destination
+
+logger = logging.getLogger('clibato')
+
+
+class Inotify:
+    """
+    Watches directories with inotify, on Linux.
+
+    Watches are not recursive, i.e. each directory is watched on its own.
+    """
+
+    # See inotify(7).
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+
+    # struct inotify_event, without the name.
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+        self._directories = {}
+
+    def add(self, directory: Path) -> bool:
+        """
+        Watches a directory. Watching it again has no effect.
+
+        :param directory: Directory path.
+        :return: Whether the directory is being watched.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            logger.warning('Cannot watch %s: %s', directory, os.strerror(ctypes.get_errno()))
+            return False
+
+        self._directories[wd] = Path(directory)
+        return True
+
+    def read(self, timeout: Optional[float]) -> Set[Path]:
+        """
+        Waits for changes.
+
+        :param timeout: Seconds to wait, or None to wait indefinitely.
+        :return: Paths of the changed entries of the watched directories.
+            If changes were lost, the watched directories themselves.
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                logger.warning('Too many changes at once, rescanning.')
+                paths.update(self._directories.values())
+            elif mask & self.IN_IGNORED:
+                # The directory was deleted.
+                self._directories.pop(wd, None)
+            elif name and wd in self._directories:
+                paths.add(self._directories[wd] / os.fsdecode(name))
+
+        return paths
+
+    def close(self) -> None:
+        """Stops watching."""
+        os.close(self._fd)
+
+
+class Poller:
+    """
+    Watches directories by listing them periodically.
+
+    Used where inotify is not available, e.g. on macOS, or not reliable,
+    e.g. on network filesystems.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self._interval = interval
+        self._listings = {}
+
+    def add(self, directory: Path) -> bool:
+        """
+        Watches a directory. Watching it again has no effect.
+
+        :param directory: Directory path.
+        :return: Whether the directory is being watched.
+        """
+        directory = Path(directory)
+        if directory in self._listings:
+            return True
+
+        listing = self._list(directory)
+        if listing is None:
+            logger.warning('Cannot watch %s: Directory not found', directory)
+            return False
+
+        self._listings[directory] = listing
+        return True
+
+    def read(self, timeout: Optional[float]) -> Set[Path]:
+        """
+        Waits for changes.
+
+        :param timeout: Seconds to wait, or None to wait indefinitely.
+        :return: Paths of the changed entries of the watched directories.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            paths = set()
+            for directory, listing in list(self._listings.items()):
+                new_listing = self._list(directory)
+                if new_listing is None:
+                    del self._listings[directory]
+                    continue
+
+                for name, signature in new_listing.items():
+                    if listing.get(name) != signature:
+                        paths.add(directory / name)
+                self._listings[directory] = new_listing
+
+            if paths:
+                return paths
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+
+            time.sleep(self._interval if remaining is None else min(self._interval, remaining))
+
+    def close(self) -> None:
+        """Stops watching."""
+        self._listings = {}
+
+    @staticmethod
+    def _list(directory: Path) -> Optional[Dict[str, tuple]]:
+        """Stat signatures of the entries of a directory, if it exists."""
+        listing = {}
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Subdirectories are only new or not.
+                            listing[entry.name] = ()
+                            continue
+
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    listing[entry.name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        return listing
+
+
+def watcher(poll: bool = False, interval: float = 1.0):
+    """
+    Get the best available watcher.
+
+    :param poll: Whether to poll, even if inotify is available.
+    :param interval: Seconds between polls.
+    :return: An Inotify or a Poller object.
+    """
+    if not poll:
+        try:
+            return Inotify()
+        except (AttributeError, OSError) as error:
+            logger.debug('Cannot use inotify: %s', error)
+
+    logger.debug('Polling for changes every %.2fs', interval)
+    return Poller(interval)
+
+
+class Watch:  # pylint: disable=too-many-instance-attributes
+    """
+    Backs up contents as they change.
+
+    The parent directories of contents, and all directories of content
+    trees, are watched. Changes are collected until none happen for "delay"
+    seconds, and the changed files are then backed up at once, e.g. in a
+    single commit. Destinations which cannot back up some of the contents
+    on their own, like archives, back up all of them.
+
+    Failed backups, e.g. when the remote is unreachable, are logged, and
+    their contents are backed up again along with the next changes.
+    """
+
+    DELAY = 1.0
+
+    # Changes are backed up after this many delays, even if they don't stop.
+    MAX_DELAYS = 10
+
+    def __init__(
+        self,
+        contents: List[Content],
+        destination: 'Destination',
+        delay: float = DELAY,
+        poll: bool = False
+    ):
+        self._contents = contents
+        self._destination = destination
+        self._delay = delay
+        self._watcher = watcher(poll, min(delay, 1.0))
+        self._failed = []
+
+        self._files = {}
+        self._parents = {}
+        self._trees = []
+        for content in contents:
+            if isinstance(content, ContentTree):
+                self._trees.append(content)
+            else:
+                self._files[content.source_path()] = content
+                self._parents.setdefault(content.source_path().parent, []).append(content)
+
+        for directory in sorted(self._parents):
+            self._watcher.add(directory)
+
+        for tree in self._trees:
+            for directory in tree.directories():
+                self._watcher.add(tree.source_path() / directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self) -> None:
+        """Backs up all contents, and then their changes, until interrupted."""
+        self._backup(self._contents)
+
+        while True:
+            self.backup_changes()
+
+    def backup_changes(self, timeout: float = None) -> List[Content]:
+        """
+        Waits for changes, and backs up the changed files.
+
+        :param timeout: Seconds to wait for a change, or None to wait indefinitely.
+        :return: The contents that were backed up.
+        """
+        paths = self._watcher.read(timeout)
+        if not paths:
+            return []
+
+        deadline = time.monotonic() + self._delay * self.MAX_DELAYS
+        while time.monotonic() < deadline:
+            more_paths = self._watcher.read(self._delay)
+            if not more_paths:
+                break
+            paths.update(more_paths)
+
+        contents = self._match(paths)
+        if not contents:
+            return []
+
+        for content in contents:
+            logger.debug('Changed: %s', content.source_path())
+
+        if not self._destination.is_incremental():
+            contents = self._contents
+        elif self._failed:
+            merged = {content.source_path(): content for content in self._failed + contents}
+            contents = [merged[path] for path in sorted(merged)]
+
+        self._backup(contents)
+        return contents
+
+    def close(self) -> None:
+        """Stops watching."""
+        self._watcher.close()
+
+    def _backup(self, contents: List[Content]) -> None:
+        try:
+            self._destination.backup(contents)
+        except (ActionError, GitCommandError, OSError) as error:
+            # Keep watching, the next backup might succeed.
+            logger.error(error)
+            self._failed = contents
+        else:
+            self._failed = []
+
+    def _match(self, paths: Set[Path]) -> List[Content]:
+        """
+        Get the contents of changed paths.
+
+        :param paths: Changed files and directories.
+        :return: Content objects, sorted by source path.
+        """
+        contents = {}
+        for path in paths:
+            if path in self._files:
+                contents[path] = self._files[path]
+
+            # Changes in the directory were lost.
+            for content in self._parents.get(path, []):
+                contents[content.source_path()] = content
+
+            for tree in self._trees:
+                for content in self._match_tree(tree, path):
+                    contents[content.source_path()] = content
+
+        return [contents[path] for path in sorted(contents)]
+
+    def _match_tree(self, tree: ContentTree, path: Path) -> Iterator[Content]:
+        """
+        Get the files of a content tree at a changed path.
+
+        New directories are watched, and all files in them are changed.
+        """
+        try:
+            relative_path = path.relative_to(tree.source_path()).as_posix()
+        except ValueError:
+            return
+
+        if relative_path == '.':
+            # Changes in the root directory were lost.
+            relative_path = ''
+
+        prefix = tree.backup_path().as_posix()
+        if not path.is_dir() or path.is_symlink():
+            content = tree.match(f'{prefix}/{relative_path}')
+            if content and path.is_file():
+                yield content
+            return
+
+        for directory in tree.directories(relative_path):
+            self._watcher.add(tree.source_path() / directory)
+            try:
+                with os.scandir(tree.source_path() / directory) as iterator:
+                    names = [entry.name for entry in iterator if entry.is_file()]
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            for name in sorted(names):
+                file_path = f'{directory}/{name}' if directory else name
+                content = tree.match(f'{prefix}/{file_path}')
+                if content:
+                    yield content
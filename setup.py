@@ -34,7 +34,7 @@ setuptools.setup(
         "Tracker": "https://github.com/jigarius/clibato/issues"
     },
     packages=setuptools.find_packages(),
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=install_requires,
     entry_points={
         'console_scripts': ['clibato=clibato.__main__:main'],
@@ -3,8 +3,10 @@ from pathlib import Path
 import os
 import logging
 from tempfile import NamedTemporaryFile, TemporaryDirectory
-from typing import Tuple
+from typing import List, Tuple
 import unittest
+from unittest import mock
+from git import Repo
 import yaml
 
 
@@ -21,6 +23,13 @@ class TestCase(unittest.TestCase):
     def setUp(self) -> None:
         self._fixtures = []
 
+        # Keep cached configs out of the real cache directory.
+        cache_dir = TemporaryDirectory()
+        self._fixtures.append(cache_dir)
+        environ = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_dir.name})
+        environ.start()
+        self.addCleanup(environ.stop)
+
     def tearDown(self) -> None:
         for fixture in self._fixtures:
             path = Path(fixture.name)
@@ -164,3 +173,50 @@ class TestCase(unittest.TestCase):
         (target_path / self.WABBIT_PATH).write_text('I am a wabbit')
 
         return source_path, backup_path
+
+    def create_git_remote(self, commits: List[dict] = None) -> Path:
+        """
+        Creates a bare Git repository to be used as a remote.
+
+        The repository allows partial clones.
+
+        :param commits: Files to commit to the main branch, e.g.
+            [{'.bunny': 'I am a bunny'}], one dictionary per commit.
+        :return: Path to the repository.
+        """
+        remote_dir = TemporaryDirectory()
+        self._fixtures.append(remote_dir)
+        remote = Repo.init(remote_dir.name, bare=True)
+        with remote.config_writer() as config:
+            config.set_value('uploadpack', 'allowFilter', 'true')
+            config.set_value('uploadpack', 'allowAnySHA1InWant', 'true')
+
+        if commits:
+            self.push_git_commits(Path(remote_dir.name), commits)
+
+        return Path(remote_dir.name)
+
+    def push_git_commits(self, remote_path: Path, commits: List[dict]) -> None:
+        """
+        Pushes commits to the main branch of a Git repository.
+
+        :param remote_path: Path to the repository.
+        :param commits: Files to commit, one dictionary per commit, e.g.
+            [{'.bunny': 'I am a bunny'}]
+        :return: None
+        """
+        work_dir = TemporaryDirectory()
+        self._fixtures.append(work_dir)
+        work_path = Path(work_dir.name)
+
+        repo = Repo.clone_from(str(remote_path), work_dir.name)
+        if 'main' in repo.remotes.origin.refs:
+            repo.git.checkout('-B', 'main', 'origin/main')
+        for i, files in enumerate(commits):
+            for path, text in files.items():
+                (work_path / path).parent.mkdir(parents=True, exist_ok=True)
+                (work_path / path).write_text(text)
+            repo.index.add(list(files))
+            repo.index.commit(f'Commit #{i + 1}')
+
+        repo.git.push('origin', 'HEAD:refs/heads/main')
@@ -0,0 +1,180 @@
+from io import BytesIO
+from pathlib import Path
+import tarfile
+from tempfile import gettempdir
+from unittest import mock
+
+from clibato import ActionError, Content, ContentTree, ConfigError
+from clibato.destination import Archive, Destination
+from .support import TestCase
+
+
+class TestArchive(TestCase):
+    """Test destination.Archive"""
+
+    def test_from_dict(self):
+        """Destination.from_dict() creates an Archive"""
+        subject = Destination.from_dict({
+            'type': 'archive',
+            'path': gettempdir(),
+            'compression': 'xz'
+        })
+
+        self.assertEqual(Archive(gettempdir(), compression='xz'), subject)
+        self.assertEqual(Path(gettempdir(), 'clibato.tar.xz'), subject.archive_path())
+
+    def test_restore_at_is_not_supported(self):
+        """.restore_at() is not supported"""
+        subject = Archive(gettempdir())
+
+        message = 'Restoring a revision is not supported for: Archive'
+        with self.assertRaisesRegex(ActionError, message):
+            subject.restore_at([], 'main')
+
+    def test_plan_is_not_supported(self):
+        """.plan_backup() and .plan_restore() are not supported"""
+        subject = Archive(gettempdir())
+
+        with self.assertRaisesRegex(ActionError, 'Planning is not supported for: Archive'):
+            subject.plan_backup([])
+
+        with self.assertRaisesRegex(ActionError, 'Planning is not supported for: Archive'):
+            subject.plan_restore([])
+
+    def test_compression_is_validated(self):
+        """Compression must be supported"""
+        with self.assertRaisesRegex(ConfigError, 'Illegal compression: zip'):
+            Archive(gettempdir(), compression='zip')
+
+    def test_backup_and_restore(self):
+        """.backup() creates an archive that .restore() can read"""
+        for compression in Archive.COMPRESSIONS:
+            source_path, backup_path = self.create_file_fixtures(location='source')
+            subject = Archive(str(backup_path), compression=compression)
+            contents = [
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+                Content('.skunk', source_path / '.skunk'),
+                Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+            ]
+
+            with self.assertLogs('clibato', None) as cm:
+                subject.backup(contents)
+
+            self.assertEqual(
+                [
+                    f'INFO:clibato:Backed up: {source_path / self.BUNNY_PATH}',
+                    'ERROR:clibato:[Errno 2] No such file or directory: '
+                    f"'{source_path / '.skunk'}'",
+                    f'INFO:clibato:Backed up: {source_path / self.WABBIT_PATH}',
+                    f'INFO:clibato:Created archive: {subject.archive_path()}',
+                ],
+                cm.output
+            )
+
+            (source_path / self.BUNNY_PATH).unlink()
+            (source_path / self.WABBIT_PATH).unlink()
+
+            with self.assertLogs('clibato', None) as cm:
+                subject.restore(contents)
+
+            self.assertEqual(
+                [
+                    f'INFO:clibato:Restored: {source_path / self.BUNNY_PATH}',
+                    f'INFO:clibato:Restored: {source_path / self.WABBIT_PATH}',
+                    f'ERROR:clibato:Not found in {subject.archive_path()}: .skunk',
+                ],
+                cm.output
+            )
+            self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+            self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_backup_and_restore_tree(self):
+        """.backup() and .restore() expand content trees"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Archive(str(backup_path))
+        subject.backup([ContentTree('burrow', str(source_path))])
+        (source_path / self.BUNNY_PATH).unlink()
+        (source_path / self.WABBIT_PATH).unlink()
+
+        subject.restore([ContentTree('burrow', str(source_path), ['hole/*'])])
+
+        self.assert_file_not_exists(source_path / self.BUNNY_PATH)
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_restore_without_archive(self):
+        """.restore() fails if there is no archive, or it cannot be read"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Archive(str(backup_path))
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        with self.assertRaisesRegex(ActionError, 'No archive found: .*clibato.tar.gz'):
+            subject.restore(contents)
+
+        subject.archive_path().write_text('I am not an archive')
+        with self.assertRaisesRegex(ActionError, 'Cannot read archive: .*clibato.tar.gz'):
+            subject.restore(contents)
+
+    def test_backup_failure(self):
+        """.backup() leaves no partial archive, and raises the original error"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Archive(str(backup_path))
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+        temp_path = subject.archive_path().with_name('clibato.tar.gz.partial')
+
+        temp_path.mkdir()
+        with self.assertRaises(IsADirectoryError) as cm:
+            subject.backup(contents)
+
+        # Not raised while handling another error, i.e. by the cleanup.
+        self.assertIsNone(cm.exception.__context__)
+
+        temp_path.rmdir()
+        with mock.patch.object(Archive, '_add', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                subject.backup(contents)
+
+        self.assert_file_not_exists(temp_path)
+        self.assert_file_not_exists(subject.archive_path())
+
+    def test_restore_skips_unsafe_members(self):
+        """.restore() skips members with absolute paths or parent references"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Archive(str(backup_path))
+        (source_path / self.BUNNY_PATH).unlink()
+
+        with tarfile.open(str(subject.archive_path()), 'w:gz') as tar:
+            for name in ['/.bunny', '.config/../../.bunny', self.BUNNY_PATH]:
+                info = tarfile.TarInfo(name)
+                info.size = len(name)
+                tar.addfile(info, BytesIO(name.encode()))
+
+        with self.assertLogs('clibato', 'WARNING') as cm:
+            subject.restore([
+                ContentTree('.config', source_path / '.config'),
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            ])
+
+        self.assertEqual(
+            [
+                'WARNING:clibato:Skipping unsafe archive member: /.bunny',
+                'WARNING:clibato:Skipping unsafe archive member: .config/../../.bunny',
+            ],
+            cm.output
+        )
+        self.assert_file_contents(source_path / self.BUNNY_PATH, self.BUNNY_PATH)
+
+    def test_restore_selected_contents(self):
+        """.restore() only extracts the requested contents"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Archive(str(backup_path))
+        subject.backup([
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ])
+        (source_path / self.BUNNY_PATH).unlink()
+        (source_path / self.WABBIT_PATH).unlink()
+
+        subject.restore([Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)])
+
+        self.assert_file_not_exists(source_path / self.BUNNY_PATH)
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
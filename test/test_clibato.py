@@ -1,7 +1,11 @@
-from contextlib import redirect_stdout
+from contextlib import redirect_stderr, redirect_stdout
 from io import StringIO
+import json
 import logging
+import pstats
 from pathlib import Path
+import subprocess
+import sys
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 from clibato import Clibato
 from .support import TestCase
@@ -12,7 +16,7 @@ class TestClibato(TestCase):
 
     def test_parse_args_action(self):
         """.parse_args() can parse all possible actions"""
-        actions = ['init', 'backup', 'restore', 'version']
+        actions = ['init', 'backup', 'restore', 'plan', 'watch', 'version']
         for action in actions:
             args = Clibato.parse_args([action])
             self.assertEqual(action, args.action)
@@ -38,6 +42,28 @@ class TestClibato(TestCase):
         args = Clibato.parse_args(['init', '-c', str(config_path)])
         self.assertEqual(config_path, args.config_path)
 
+    def test_parse_args_reads_arg_jobs(self):
+        """.parse_args() understands the --jobs and -j arguments"""
+        for action in ['backup', 'restore']:
+            args = Clibato.parse_args([action, '--jobs', '4'])
+            self.assertEqual(4, args.jobs)
+
+            args = Clibato.parse_args([action, '-j', '2'])
+            self.assertEqual(2, args.jobs)
+
+            args = Clibato.parse_args([action])
+            self.assertIsNone(args.jobs)
+
+    def test_parse_args_reads_watch_args(self):
+        """.parse_args() understands the --delay and --poll arguments"""
+        args = Clibato.parse_args(['watch'])
+        self.assertEqual(1.0, args.delay)
+        self.assertFalse(args.poll)
+
+        args = Clibato.parse_args(['watch', '--delay', '0.5', '--poll'])
+        self.assertEqual(0.5, args.delay)
+        self.assertTrue(args.poll)
+
     def test_config_file_not_found(self):
         """.execute() shows error when config file can't be located"""
         config_path = 'missing.config.yml'
@@ -154,6 +180,117 @@ class TestClibato(TestCase):
         expected = '\n'.join(['Restore completed.', ''])
         self.assert_output(expected, output.getvalue())
 
+    def test_restore_at(self):
+        """Test: clibato restore --at main -c /path/to/config.yml"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        config_path = self.create_clibato_config({
+            'contents': {
+                self.BUNNY_PATH: str(source_path / self.BUNNY_PATH),
+            },
+            'destination': {
+                'type': 'directory',
+                'path': str(backup_path)
+            }
+        })
+
+        with self.assertLogs('clibato', logging.ERROR) as cm:
+            app = Clibato()
+            self.assertFalse(app.execute(['restore', '--at', 'main', '-c', config_path]))
+
+        self.assert_log_record(
+            cm.records[0],
+            level='ERROR',
+            message='Restoring a revision is not supported for: Directory'
+        )
+        self.assert_file_not_exists(source_path / self.BUNNY_PATH)
+
+    def test_plan(self):
+        """Test: clibato plan -c /path/to/config.yml"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        config_path = self.create_clibato_config({
+            'contents': {
+                self.BUNNY_PATH: str(source_path / self.BUNNY_PATH),
+            },
+            'destination': {
+                'type': 'directory',
+                'path': str(backup_path)
+            }
+        })
+
+        for args in [['plan'], ['plan', 'backup'], ['plan', 'restore']]:
+            with redirect_stdout(StringIO()) as output:
+                app = Clibato()
+                self.assertTrue(app.execute(args + ['-c', config_path]))
+
+            plan = json.loads(output.getvalue())
+            self.assertEqual(args[-1] if len(args) > 1 else 'backup', plan['action'])
+
+        self.assert_file_not_exists(backup_path / self.BUNNY_PATH)
+
+    def test_backup_with_stats(self):
+        """Test: clibato backup --stats --stats-file stats.json --profile backup.prof"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        config_path = self.create_clibato_config({
+            'contents': {
+                self.BUNNY_PATH: str(source_path / self.BUNNY_PATH),
+                self.WABBIT_PATH: str(source_path / self.WABBIT_PATH)
+            },
+            'destination': {
+                'type': 'directory',
+                'path': str(backup_path)
+            }
+        })
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        stats_path = Path(directory.name, 'stats.json')
+        profile_path = Path(directory.name, 'backup.prof')
+
+        with redirect_stdout(StringIO()) as output, redirect_stderr(StringIO()) as errors:
+            app = Clibato()
+            self.assertTrue(app.execute([
+                'backup',
+                '-c', config_path,
+                '--stats',
+                '--stats-file', str(stats_path),
+                '--profile', str(profile_path)
+            ]))
+
+        self.assert_output('Backup completed.\n', output.getvalue())
+        self.assertRegex(errors.getvalue(), r'(?m)^transfer +[0-9.]+ +1 +2 +25$')
+
+        with open(stats_path) as fh:
+            data = json.load(fh)
+
+        self.assertEqual('backup', data['action'])
+        self.assertTrue(data['ok'])
+        self.assertEqual(['config', 'plan', 'transfer'], list(data['phases']))
+        self.assertEqual(2, data['phases']['plan']['files'])
+        self.assertEqual({'calls': 1, 'files': 2, 'bytes': 25}, {
+            key: value
+            for key, value in data['phases']['transfer'].items()
+            if key != 'seconds'
+        })
+
+        self.assertGreater(pstats.Stats(str(profile_path)).total_calls, 0)
+
+    def test_backup_with_stats_file_on_error(self):
+        """Test: clibato backup --stats-file stats.json, when the backup fails"""
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        stats_path = Path(directory.name, 'stats.json')
+
+        with self.assertLogs('clibato', logging.ERROR):
+            app = Clibato()
+            self.assertFalse(app.execute([
+                'backup', '-c', 'missing.config.yml', '--stats-file', str(stats_path)
+            ]))
+
+        with open(stats_path) as fh:
+            data = json.load(fh)
+
+        self.assertFalse(data['ok'])
+        self.assertEqual(1, data['phases']['config']['calls'])
+
     def test_version(self):
         """Test: clibato version"""
         with redirect_stdout(StringIO()) as output:
@@ -179,6 +316,45 @@ class TestClibato(TestCase):
 
         self.assert_output(expected, output.getvalue())
 
+    def test_import_is_lazy(self):
+        """PyYAML and GitPython are imported only when needed"""
+        code = '; '.join([
+            'import sys',
+            'import clibato',
+            "clibato.Clibato().execute(['version'])",
+            "print('yaml' in sys.modules, 'git' in sys.modules)",
+            'clibato.Repository',
+            "print('yaml' in sys.modules, 'git' in sys.modules)",
+        ])
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=Clibato.ROOT,
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+
+        self.assertEqual(['False False', 'False True'], result.stdout.splitlines()[-2:])
+
+    def test_import_of_actions_is_lazy(self):
+        """Modules of the watch, serve and stats are imported only when needed"""
+        modules = ['clibato.watch', 'clibato.server', 'ctypes', 'cProfile']
+        code = '; '.join([
+            'import sys',
+            'import clibato',
+            "clibato.Clibato().execute(['version'])",
+            f'print([name for name in {modules!r} if name in sys.modules])',
+        ])
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=Clibato.ROOT,
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+
+        self.assertEqual('[]', result.stdout.splitlines()[-1])
+
     @staticmethod
     def _get_version():
         with open(Clibato.ROOT / 'VERSION') as fh:
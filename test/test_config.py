@@ -1,8 +1,11 @@
 from shutil import copyfile
 from pathlib import Path
 import tempfile
+from unittest import mock
+import yaml
 
-from clibato import Clibato, Content, Directory, Config, ConfigError
+from clibato import Clibato, Content, Config, ConfigError
+from clibato.destination import Archive, Directory, Fanout
 from .support import TestCase
 
 
@@ -61,6 +64,30 @@ class TestConfig(TestCase):
             })
         )
 
+    def test_from_dict_with_destination_list(self):
+        """.from_dict() creates a Fanout from a list of destinations"""
+        config = Config.from_dict({
+            'contents': {
+                '.bashrc': None,
+            },
+            'destination': [
+                {'type': 'directory', 'path': tempfile.gettempdir()},
+                {'type': 'archive', 'path': tempfile.gettempdir()},
+            ]
+        })
+
+        self.assertEqual(
+            Fanout([Directory(tempfile.gettempdir()), Archive(tempfile.gettempdir())]),
+            config.destination()
+        )
+
+        for destinations, message in [
+            ([], 'Destinations cannot be empty'),
+            (['oops'], 'Illegal destination: oops'),
+        ]:
+            with self.assertRaisesRegex(ConfigError, message):
+                Config.from_dict({'contents': {}, 'destination': destinations})
+
     def test_from_dict_cannot_contain_illegal_keys(self):
         """.from_dict() fails if when extra keys are found"""
         message = 'Config has illegal keys: bar, foo'
@@ -130,6 +157,50 @@ class TestConfig(TestCase):
             message=f'Loading configuration: {config_path}'
         )
 
+    def test_from_file_with_cache(self):
+        """.from_file() caches the config, until the file changes"""
+        config_path = self.create_clibato_config({
+            'contents': {'.bashrc': None},
+            'destination': {'type': 'directory', 'path': tempfile.gettempdir()}
+        })
+        expected = Config(
+            contents=[Content('.bashrc')],
+            destination=Directory(path=tempfile.gettempdir()),
+        )
+
+        self.assertEqual(expected, Config.from_file(config_path))
+        self.assertEqual(1, len(list(Config.cache_dir().glob('config-*.pickle'))))
+
+        with mock.patch('yaml.load') as load, self.assertLogs('clibato', 'DEBUG') as cm:
+            self.assertEqual(expected, Config.from_file(config_path))
+
+        load.assert_not_called()
+        self.assertIn('DEBUG:clibato:Loaded configuration from cache', cm.output)
+
+        with open(config_path, 'w') as fh:
+            yaml.safe_dump({
+                'contents': {'.bashrc': None, '.vimrc': None},
+                'destination': {'type': 'directory', 'path': tempfile.gettempdir()}
+            }, fh)
+
+        self.assertEqual(
+            [Content('.bashrc'), Content('.vimrc')],
+            Config.from_file(config_path).contents()
+        )
+
+    def test_from_file_with_broken_cache(self):
+        """.from_file() ignores an unreadable cache"""
+        config_path = self.create_clibato_config({
+            'contents': {'.bashrc': None},
+            'destination': {'type': 'directory', 'path': tempfile.gettempdir()}
+        })
+        Config.from_file(config_path)
+
+        for path in Config.cache_dir().glob('config-*.pickle'):
+            path.write_bytes(b'oops')
+
+        self.assertEqual([Content('.bashrc')], Config.from_file(config_path).contents())
+
     def test_from_file_with_non_existent_file(self):
         """.from_file() fails for if file doesn't exist"""
         with self.assertRaises(FileNotFoundError):
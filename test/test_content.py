@@ -1,6 +1,10 @@
+import os
 import unittest
+from unittest import mock
 from pathlib import Path
-from clibato import Content, ConfigError
+from tempfile import TemporaryDirectory
+from clibato import Content, ContentTree, ConfigError
+from .support import TestCase
 
 
 class TestContent(unittest.TestCase):
@@ -28,10 +32,54 @@ class TestContent(unittest.TestCase):
             Content.from_dict({'.bashrc': None})
         )
 
-    def test_from_dict_source_path_cannot_be_dictionary(self):
-        """.from_dict() fails if content entry is a dictionary"""
-        with self.assertRaisesRegex(ConfigError, 'Illegal source path for .bashrc: {}'):
-            Content.from_dict({'.bashrc': {}})
+    def test_from_dict_source_path_cannot_be_list(self):
+        """.from_dict() fails if content entry is a list"""
+        with self.assertRaisesRegex(ConfigError, r'Illegal source path for .bashrc: \[\]'):
+            Content.from_dict({'.bashrc': []})
+
+    def test_from_dict_with_tree(self):
+        """.from_dict() creates trees from dictionaries and wildcards"""
+        self.assertEqual(
+            [
+                ContentTree('.vim', None, ['*.vim'], ['plugged']),
+                ContentTree('.config/fish', '~/.config/fish', ['/**/*.fish']),
+            ],
+            Content.from_dict({
+                '.vim': {'include': ['*.vim'], 'exclude': ['plugged']},
+                '.config/fish': '~/.config/fish/**/*.fish',
+            })
+        )
+
+    def test_from_dict_with_tree_illegal_keys(self):
+        """.from_dict() fails if a tree has illegal keys"""
+        with self.assertRaisesRegex(ConfigError, 'Illegal keys for .vim: bunny'):
+            Content.from_dict({'.vim': {'bunny': 'wabbit'}})
+
+    def test_from_dict_backup_paths_must_be_unique(self):
+        """.from_dict() fails if backup paths are the same"""
+        with self.assertRaisesRegex(ConfigError, 'Backup path is not unique: hole/.wabbit'):
+            Content.from_dict({'hole/.wabbit': None, './hole//.wabbit': '/tmp/.wabbit'})
+
+    def test_from_dict_backup_paths_cannot_be_nested(self):
+        """.from_dict() fails if a backup path is inside another"""
+        message = 'Backup paths cannot be nested: hole, hole/.wabbit'
+        with self.assertRaisesRegex(ConfigError, message):
+            Content.from_dict({'hole/.wabbit': None, '.bunny': None, 'hole': {}})
+
+    def test_from_dict_with_duplicate_source_path(self):
+        """.from_dict() warns if a source path is backed up twice"""
+        with self.assertLogs('clibato', 'WARNING') as cm:
+            Content.from_dict({'.bunny': '/tmp/.bunny', 'hole/.bunny': '/tmp/.bunny'})
+
+        self.assertEqual(
+            ['WARNING:clibato:Source path is backed up more than once: /tmp/.bunny'],
+            cm.output
+        )
+
+    def test_backup_path_cannot_be_empty(self):
+        """.new() raises if backup path is empty"""
+        with self.assertRaisesRegex(ConfigError, 'Backup path cannot be empty'):
+            Content('.')
 
     def test_backup_path(self):
         """.backup_path() works"""
@@ -104,3 +152,130 @@ class TestContent(unittest.TestCase):
             message = f'Backup path cannot contain: {part}'
             with self.assertRaisesRegex(ConfigError, message):
                 Content(str(Path(part, '.bashrc')))
+
+
+class TestContentTree(TestCase):
+    """Test clibato.ContentTree"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        self._root = Path(directory.name)
+        for path in [
+            'init.vim',
+            'colors/bunny.vim',
+            'colors/README.md',
+            'plugged/wabbit/plugin.vim',
+            'undo/.bunny.vim.un~',
+        ]:
+            (self._root / path).parent.mkdir(parents=True, exist_ok=True)
+            (self._root / path).write_text(path)
+
+    def test_inheritance(self):
+        """ContentTree must extend Content"""
+        self.assertTrue(issubclass(ContentTree, Content))
+
+    def test_expand(self):
+        """.expand() walks the source path"""
+        subject = ContentTree('.vim', str(self._root))
+
+        self.assertEqual(
+            [
+                Content('.vim/colors/README.md', str(self._root / 'colors' / 'README.md')),
+                Content('.vim/colors/bunny.vim', str(self._root / 'colors' / 'bunny.vim')),
+                Content('.vim/init.vim', str(self._root / 'init.vim')),
+                Content(
+                    '.vim/plugged/wabbit/plugin.vim',
+                    str(self._root / 'plugged' / 'wabbit' / 'plugin.vim')
+                ),
+                Content('.vim/undo/.bunny.vim.un~', str(self._root / 'undo' / '.bunny.vim.un~')),
+            ],
+            list(subject.expand())
+        )
+
+    def test_expand_with_patterns(self):
+        """.expand() applies include and exclude patterns"""
+        subject = ContentTree('.vim', str(self._root), ['*.vim'], ['plugged', 'undo/'])
+
+        self.assertEqual(
+            ['.vim/colors/bunny.vim', '.vim/init.vim'],
+            [content.backup_path().as_posix() for content in subject.expand()]
+        )
+
+    def test_expand_with_path_patterns(self):
+        """.expand() matches patterns with slashes against relative paths"""
+        subject = ContentTree('.vim', str(self._root), ['**/*.vim'], ['colors/*'])
+
+        self.assertEqual(
+            ['.vim/init.vim', '.vim/plugged/wabbit/plugin.vim'],
+            [content.backup_path().as_posix() for content in subject.expand()]
+        )
+
+    def test_expand_prunes_unreachable_directories(self):
+        """.expand() doesn't walk directories which no include pattern reaches"""
+        subject = ContentTree('.vim', str(self._root), ['/*.vim'])
+
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir:
+            self.assertEqual(
+                ['.vim/init.vim'],
+                [content.backup_path().as_posix() for content in subject.expand()]
+            )
+
+        scandir.assert_called_once_with(self._root)
+
+    def test_directories(self):
+        """.directories() skips excluded directories, and those no include pattern reaches"""
+        for include, exclude, expected in [
+            ([], ['undo'], ['', 'colors', 'plugged', 'plugged/wabbit']),
+            (['*.vim'], [], ['', 'colors', 'plugged', 'plugged/wabbit', 'undo']),
+            (['/*.vim'], [], ['']),
+            (
+                ['colors/*.vim', 'plugged/*/plugin.vim'],
+                [],
+                ['', 'colors', 'plugged', 'plugged/wabbit']
+            ),
+            (['plugged/**/*.vim'], ['wabbit'], ['', 'plugged']),
+        ]:
+            with self.subTest(include=include, exclude=exclude):
+                subject = ContentTree('.vim', str(self._root), include, exclude)
+                self.assertEqual(expected, sorted(subject.directories()))
+
+    def test_expand_with_root(self):
+        """.expand() walks $root/$backup_path if a root is given"""
+        subject = ContentTree('colors', '~/.vim/colors', ['*.vim'])
+
+        self.assertEqual(
+            [Content('colors/bunny.vim', '~/.vim/colors/bunny.vim')],
+            list(subject.expand(root=self._root))
+        )
+
+    def test_expand_with_paths(self):
+        """.expand() filters backup paths if paths are given"""
+        subject = ContentTree('.vim', '~/.vim', exclude=['plugged'])
+
+        self.assertEqual(
+            [Content('.vim/init.vim', '~/.vim/init.vim')],
+            list(subject.expand(paths=['.bashrc', '.vim/init.vim', '.vim/plugged/plugin.vim']))
+        )
+
+    def test_expand_missing_directory(self):
+        """.expand() logs an error if the directory doesn't exist"""
+        subject = ContentTree('.vim', str(self._root / 'skunk'))
+
+        with self.assertLogs('clibato', 'ERROR'):
+            self.assertEqual([], list(subject.expand()))
+
+    def test_from_glob(self):
+        """.from_glob() splits the path at the first wildcard"""
+        self.assertEqual(
+            ContentTree('.vim', '~/.vim', ['/*.vim']),
+            ContentTree.from_glob('.vim', '~/.vim/*.vim')
+        )
+
+        subject = ContentTree.from_glob('.vim', str(self._root / '*.vim'))
+        self.assertEqual(
+            ['.vim/init.vim'],
+            [content.backup_path().as_posix() for content in subject.expand()]
+        )
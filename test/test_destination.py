@@ -2,7 +2,9 @@ from pathlib import Path
 from tempfile import gettempdir
 import unittest
 
-from clibato import Content, ConfigError, Destination, Directory, Repository
+from clibato import transfer, Content, ContentTree, ConfigError
+from clibato.destination import Destination, Directory
+from clibato.repository import Repository
 from .support import TestCase
 
 
@@ -168,6 +170,202 @@ class TestDirectory(TestCase):
         self.assert_file_not_exists(backup_path / skunk_path)
         self.assert_file_contents(backup_path / self.WABBIT_PATH, 'I am a wabbit')
 
+    def test_backup_skips_unchanged_files(self):
+        """.backup() skips files that didn't change since the last backup"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ]
+
+        subject.backup(contents)
+        self.assert_file_exists(backup_path / Directory.MANIFEST_PATH)
+
+        (source_path / self.WABBIT_PATH).write_text('I am a wabbit too')
+        with self.assertLogs('clibato', None) as cm:
+            subject.backup(contents)
+
+        self.assert_length(cm.records, 1)
+        self.assert_log_record(
+            cm.records[0],
+            level='INFO',
+            message=f'Backed up: {source_path / self.WABBIT_PATH}'
+        )
+
+        self.assert_file_contents(backup_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(backup_path / self.WABBIT_PATH, 'I am a wabbit too')
+
+    def test_backup_replaces_missing_backup_files(self):
+        """.backup() copies unchanged files if the backup copy is gone"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path))
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        subject.backup(contents)
+        (backup_path / self.BUNNY_PATH).unlink()
+        subject.backup(contents)
+
+        self.assert_file_contents(backup_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_backup_with_checksum(self):
+        """.backup() skips touched files with unchanged digests"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path), checksum=True)
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        subject.backup(contents)
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.backup(contents)
+
+        self.assertIn(
+            f'DEBUG:clibato:Unchanged: {source_path / self.BUNNY_PATH}',
+            cm.output
+        )
+
+    def test_backup_with_jobs(self):
+        """.backup() logs in content order when copying in parallel"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path), jobs=4)
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.backup([
+                Content('.skunk', source_path / '.skunk'),
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+                Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+            ])
+
+        self.assertEqual(
+            [
+                f"ERROR:clibato:[Errno 2] No such file or directory: '{source_path / '.skunk'}'",
+                f'INFO:clibato:Backed up: {source_path / self.BUNNY_PATH}',
+                f'INFO:clibato:Backed up: {source_path / self.WABBIT_PATH}',
+            ],
+            cm.output
+        )
+
+        self.assert_file_contents(backup_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(backup_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_copy_method_is_validated(self):
+        """Copy method must be supported"""
+        with self.assertRaisesRegex(ConfigError, 'Illegal copy method: teleport'):
+            Directory(gettempdir(), copy_method='teleport')
+
+    def test_backup_with_delta(self):
+        """.backup() rewrites only changed blocks of large files"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path), delta=True)
+        history_path = source_path / '.history'
+        contents = [Content('.history', history_path)]
+
+        history_path.write_bytes(b'ls -la\n' * transfer.DELTA_MIN_SIZE)
+        subject.backup(contents)
+        self.assertEqual({}, subject.counters().as_dict())
+
+        with open(history_path, 'ab') as fh:
+            fh.write(b'exit\n')
+        subject.backup(contents)
+
+        self.assertEqual(
+            history_path.read_bytes(),
+            (backup_path / '.history').read_bytes()
+        )
+        counters = subject.counters()
+        self.assertEqual(history_path.stat().st_size, counters.get('bytes_compared'))
+        self.assertLess(counters.get('bytes_written'), transfer.DELTA_BLOCK_SIZE + 1)
+
+    def test_plan_backup(self):
+        """.plan_backup() plans operations without changing anything"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content('.skunk', source_path / '.skunk'),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ]
+
+        plan = subject.plan_backup(contents)
+
+        self.assertEqual(
+            [
+                ('copy', backup_path / self.BUNNY_PATH),
+                ('missing', backup_path / '.skunk'),
+                ('mkdir', backup_path / 'hole'),
+                ('copy', backup_path / self.WABBIT_PATH),
+            ],
+            [(operation.action, operation.target) for operation in plan]
+        )
+        self.assertEqual([], list(backup_path.iterdir()))
+
+        subject.backup(contents)
+        plan = subject.plan_backup(contents)
+
+        self.assertEqual(
+            ['skip', 'missing', 'skip'],
+            [operation.action for operation in plan]
+        )
+
+    def test_jobs(self):
+        """.jobs() and .set_jobs()"""
+        subject = Directory(gettempdir())
+        self.assertEqual(1, subject.jobs())
+
+        subject.set_jobs(8)
+        self.assertEqual(8, subject.jobs())
+
+    def test_jobs_must_be_positive(self):
+        """Jobs must be a positive integer"""
+        for jobs in [0, -1, '4', True]:
+            with self.assertRaisesRegex(ConfigError, 'Jobs must be a positive integer'):
+                Directory(gettempdir(), jobs=jobs)
+
+
+class TestDirectoryRestore(TestCase):
+    """Test destination.Directory restores"""
+
+    def test_backup_and_restore_tree(self):
+        """.backup() and .restore() expand content trees"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Directory(path=str(backup_path))
+        contents = [ContentTree('burrow', str(source_path), exclude=['hole'])]
+
+        subject.backup(contents)
+
+        self.assert_file_contents(backup_path / 'burrow' / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_not_exists(backup_path / 'burrow' / self.WABBIT_PATH)
+
+        (source_path / self.BUNNY_PATH).unlink()
+        subject.restore(contents)
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_plan_restore(self):
+        """.plan_restore() plans operations without changing anything"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        subject = Directory(path=str(backup_path))
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+
+        plan = subject.plan_restore([
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+        ])
+
+        self.assertEqual(
+            [
+                ('skip', source_path / self.BUNNY_PATH),
+                ('mkdir', source_path / 'hole'),
+                ('copy', source_path / self.WABBIT_PATH),
+            ],
+            [(operation.action, operation.target) for operation in plan]
+        )
+        self.assertEqual(
+            {'mkdir': 1, 'copy': 1, 'link': 0, 'skip': 1, 'missing': 0, 'bytes': 13},
+            plan.summary()
+        )
+
     def test_restore(self):
         """.restore()"""
         source_path, backup_path = self.create_file_fixtures(location='backup')
@@ -194,6 +392,67 @@ class TestDirectory(TestCase):
         self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
         self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
 
+    def test_restore_with_jobs(self):
+        """.restore() works when copying in parallel"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        subject = Directory(path=str(backup_path), jobs=4)
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.restore([
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+                Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+            ])
+
+        self.assertEqual(
+            [
+                f'INFO:clibato:Restored: {source_path / self.BUNNY_PATH}',
+                f'INFO:clibato:Restored: {source_path / self.WABBIT_PATH}',
+            ],
+            cm.output
+        )
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_restore_skips_identical_files(self):
+        """.restore() doesn't rewrite files that are already identical"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        subject = Directory(path=str(backup_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ]
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+        (source_path / self.WABBIT_PATH).parent.mkdir()
+        (source_path / self.WABBIT_PATH).write_text('I am a rabbit')
+        inode = (source_path / self.BUNNY_PATH).stat().st_ino
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.restore(contents)
+
+        self.assertEqual(
+            [f'INFO:clibato:Restored: {source_path / self.WABBIT_PATH}'],
+            cm.output
+        )
+        self.assertEqual(inode, (source_path / self.BUNNY_PATH).stat().st_ino)
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_restore_preserves_permissions_and_symlinks(self):
+        """.restore() keeps the mode of existing files and follows symlinks"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        subject = Directory(path=str(backup_path))
+        real_path = source_path / '.bunny.real'
+        real_path.write_text('I was a bunny')
+        real_path.chmod(0o600)
+        (source_path / self.BUNNY_PATH).symlink_to(real_path)
+
+        subject.restore([Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)])
+
+        self.assertTrue((source_path / self.BUNNY_PATH).is_symlink())
+        self.assert_file_contents(real_path, 'I am a bunny')
+        self.assertEqual(0o600, real_path.stat().st_mode & 0o777)
+        self.assertEqual([], list(source_path.glob('*.clibato')))
+
     def test_restore_file_not_found(self):
         """.restore() logs and continues if a file is not found"""
         source_path, backup_path = self.create_file_fixtures(location='backup')
@@ -220,62 +479,3 @@ class TestDirectory(TestCase):
 
         self.assert_file_not_exists(source_path / skunk_path)
         self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
-
-
-class TestRepository(TestCase):
-    """Test destination.Repository"""
-
-    def test_new(self):
-        """Instance creation."""
-        subject = Repository(
-            gettempdir(),
-            'git@github.com:jigarius/clibato.git',
-            'backup',
-            'Jigarius',
-            'jigarius@example.com',
-        )
-
-        self.assertIsInstance(subject, Repository)
-
-    def test__eq__(self):
-        """__eq__()"""
-        subject = Repository(gettempdir(), 'git@github.com:bunny/wabbit.git')
-
-        self.assertEqual(
-            subject,
-            Repository(gettempdir(), 'git@github.com:bunny/wabbit.git')
-        )
-
-        self.assertNotEqual(
-            subject,
-            Repository(gettempdir(), 'git@github.com:bucky/wabbit.git')
-        )
-
-        self.assertNotEqual(
-            subject,
-            Directory(gettempdir())
-        )
-
-    def test_inheritance(self):
-        """Repository must extend Directory"""
-        self.assert_is_subclass(Repository, Destination)
-
-    def test_path_cannot_be_empty(self):
-        """Path cannot be empty"""
-        message = 'Path cannot be empty'
-        with self.assertRaisesRegex(ConfigError, message):
-            Repository('', 'git@github.com:jigarius/clibato.git')
-
-    def test_remote_cannot_be_empty(self):
-        """Remote cannot be empty"""
-        message = 'Remote cannot be empty'
-        with self.assertRaisesRegex(ConfigError, message):
-            Repository(gettempdir(), '')
-
-    @unittest.skip('TODO')
-    def test_backup(self):
-        """.backup()"""
-
-    @unittest.skip('TODO')
-    def test_restore(self):
-        """.backup()"""
@@ -0,0 +1,102 @@
+from git import Repo
+
+from clibato import ActionError, Content, ContentTree
+from clibato.destination import Archive, Directory, Fanout, Store
+from clibato.repository import Repository
+from .support import TestCase
+
+
+class TestFanout(TestCase):
+    """Test destination.Fanout"""
+
+    def test_backup(self):
+        """.backup() backs up to all destinations, independently"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        _, other_path = self.create_file_fixtures(location='source')
+        broken = Repository(str(other_path), str(other_path / 'missing'))
+        subject = Fanout([Directory(str(backup_path)), broken, Archive(str(other_path))])
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            ContentTree('hole', source_path / 'hole'),
+        ]
+
+        with self.assertLogs('clibato', None) as cm:
+            with self.assertRaisesRegex(ActionError, 'Backup failed for 1 of 3 destination'):
+                subject.backup(contents)
+
+        self.assertIn(f'INFO:clibato:Backup completed: Directory ({backup_path})', cm.output)
+        self.assertIn(f'INFO:clibato:Backup completed: Archive ({other_path})', cm.output)
+        self.assertTrue(any(
+            line.startswith(f'ERROR:clibato:Backup failed: Repository ({other_path})')
+            for line in cm.output
+        ))
+
+        self.assert_file_contents(backup_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(backup_path / self.WABBIT_PATH, 'I am a wabbit')
+        self.assert_file_exists(other_path / 'clibato.tar.gz')
+
+    def test_backup_reads_once(self):
+        """.backup() reads each file once, for all destinations"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        store_path = self.create_file_fixtures(location='source')[1]
+        remote_path = self.create_git_remote()
+        (backup_path / 'repo').mkdir()
+        repository = Repository(str(backup_path / 'repo'), str(remote_path), worktree=False)
+        subject = Fanout([
+            Directory(str(backup_path)),
+            Store(str(store_path), 'bunny'),
+            Archive(str(backup_path)),
+            repository,
+        ])
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+        ]
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.backup(contents)
+
+        self.assertIn('DEBUG:clibato:Shared reads: 2 file(s) read, 6 read(s) saved.', cm.output)
+        self.assert_file_contents(backup_path / self.WABBIT_PATH, 'I am a wabbit')
+        self.assert_file_exists(backup_path / 'clibato.tar.gz')
+        self.assertEqual(
+            b'I am a wabbit',
+            (Repo(remote_path).heads['main'].commit.tree / self.WABBIT_PATH).data_stream.read()
+        )
+
+        (source_path / self.WABBIT_PATH).unlink()
+        Store(str(store_path), 'bunny').restore(contents)
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_plan_backup(self):
+        """.plan_backup() plans each destination on its own"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Fanout([Directory(str(backup_path)), Archive(str(backup_path))])
+
+        plans = subject.plan_backup([Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)])
+
+        self.assertEqual('backup', plans.action())
+        (directory_name, plan, error), (archive_name, no_plan, archive_error) = plans
+        self.assertEqual(f'Directory ({backup_path})', directory_name)
+        self.assertEqual(['copy'], [operation.action for operation in plan])
+        self.assertIsNone(error)
+        self.assertEqual(f'Archive ({backup_path})', archive_name)
+        self.assertIsNone(no_plan)
+        self.assertIn('not supported', archive_error)
+
+    def test_restore(self):
+        """.restore() restores from the first destination"""
+        source_path, backup_path = self.create_file_fixtures(location='backup')
+        subject = Fanout([Directory(str(backup_path)), Archive(str(backup_path))])
+
+        subject.restore([Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)])
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_is_incremental(self):
+        """.is_incremental() only if all destinations are incremental"""
+        _, backup_path = self.create_file_fixtures(location='source')
+        directory = Directory(str(backup_path))
+
+        self.assertTrue(Fanout([directory, Store(str(backup_path))]).is_incremental())
+        self.assertFalse(Fanout([directory, Archive(str(backup_path))]).is_incremental())
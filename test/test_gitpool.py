@@ -0,0 +1,50 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clibato import gitpool, gittree
+from .support import TestCase
+
+
+class TestGitPool(TestCase):
+    """Test clibato.gitpool.GitPool"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        self._path = Path(directory.name)
+        self._repo = gitpool.Repo.init(self._path)
+
+    def test_hash_file(self):
+        """.hash_file() writes blobs through a single process"""
+        paths = []
+        for i in range(5):
+            paths.append(self._path / f'bunny-{i}')
+            paths[-1].write_text(f'I am bunny #{i}')
+
+        counters = self._repo.git.counters()
+        spawned = counters.get('git_processes')
+
+        with gitpool.GitPool(self._repo) as subject:
+            for path in paths:
+                binsha = subject.hash_file(path)
+
+                self.assertEqual(gittree.blob_sha(path), binsha)
+                self.assertEqual(path.read_bytes(), self._repo.odb.stream(binsha).read())
+
+        # 1 hash-object process, plus GitPython's cat-file process.
+        self.assertEqual(spawned + 2, counters.get('git_processes'))
+
+    def test_hash_file_not_found(self):
+        """.hash_file() raises FileNotFoundError for missing files"""
+        (self._path / self.BUNNY_PATH).write_text('I am a bunny')
+
+        with gitpool.GitPool(self._repo) as subject:
+            with self.assertRaises(FileNotFoundError):
+                subject.hash_file(self._path / '.skunk')
+
+            self.assertEqual(
+                gittree.blob_sha(self._path / self.BUNNY_PATH),
+                subject.hash_file(self._path / self.BUNNY_PATH)
+            )
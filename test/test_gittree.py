@@ -0,0 +1,75 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from git import Repo
+
+from clibato import gittree
+from .support import TestCase
+
+
+class TestTreeBuilder(TestCase):
+    """Test clibato.gittree.TreeBuilder"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        self._path = Path(directory.name)
+        self._repo = Repo.init(self._path)
+
+    def test_write(self):
+        """.write() creates the same tree as git"""
+        (self._path / self.BUNNY_PATH).write_text('I am a bunny')
+        (self._path / 'hole').mkdir()
+        (self._path / self.WABBIT_PATH).write_text('I am a wabbit')
+        (self._path / 'hole-in-one').write_text('I am a hole')
+        self._repo.index.add([self.BUNNY_PATH, self.WABBIT_PATH, 'hole-in-one'])
+        expected = self._repo.index.write_tree().binsha
+
+        subject = gittree.TreeBuilder(self._repo.odb)
+        for path in ['hole-in-one', 'hole/.wabbit', '.bunny']:
+            blob = gittree.hash_file(self._repo.odb, self._path / path)
+            subject.set(path, blob)
+
+        self.assertEqual(expected, subject.write())
+
+    def test_set(self):
+        """.set() only writes changed subtrees"""
+        odb = self._repo.odb
+        bunny = self._blob('I am a bunny')
+        wabbit = self._blob('I am a wabbit')
+
+        tree = gittree.TreeBuilder(odb)
+        tree.set('.bunny', bunny)
+        tree.set('hole/.wabbit', wabbit)
+        binsha = tree.write()
+
+        subject = gittree.TreeBuilder(odb, binsha)
+        self.assertEqual((wabbit, gittree.BLOB_MODE), subject.get('hole/.wabbit'))
+        self.assertIsNone(subject.get('hole'))
+        self.assertIsNone(subject.get('hole/.skunk'))
+        self.assertEqual(['.bunny', 'hole/.wabbit'], list(subject.paths()))
+        self.assertEqual(['hole/.wabbit'], list(subject.paths('hole')))
+        self.assertEqual([], list(subject.paths('.skunk')))
+
+        self.assertFalse(subject.set('hole/.wabbit', wabbit))
+        self.assertEqual(binsha, subject.write())
+
+        self.assertTrue(subject.set('hole/.wabbit', bunny))
+        self.assertNotEqual(binsha, subject.write())
+        self.assertEqual((bunny, gittree.BLOB_MODE), subject.get('hole/.wabbit'))
+
+    def test_blob_sha(self):
+        """blob_sha() computes the same SHA-1 as git"""
+        (self._path / self.BUNNY_PATH).write_text('I am a bunny')
+
+        self.assertEqual(
+            gittree.hash_file(self._repo.odb, self._path / self.BUNNY_PATH),
+            gittree.blob_sha(self._path / self.BUNNY_PATH)
+        )
+
+    def _blob(self, text: str) -> bytes:
+        path = self._path / 'blob'
+        path.write_text(text)
+        return gittree.hash_file(self._repo.odb, path)
@@ -0,0 +1,73 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clibato import Manifest, ManifestEntry
+from clibato.manifest import digest
+from .support import TestCase
+
+
+class TestManifest(TestCase):
+    """Test clibato.Manifest"""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._tempdir = TemporaryDirectory()
+        self._path = Path(self._tempdir.name, '.clibato', 'manifest.json')
+
+    def tearDown(self) -> None:
+        self._tempdir.cleanup()
+        super().tearDown()
+
+    def test_load_missing_file(self):
+        """.load() returns an empty manifest if the file doesn't exist"""
+        subject = Manifest.load(self._path)
+
+        self.assert_length(subject, 0)
+        self.assertEqual(self._path, subject.path())
+
+    def test_load_invalid_file(self):
+        """.load() ignores invalid manifests"""
+        self._path.parent.mkdir()
+        self._path.write_text('{oops')
+
+        with self.assertLogs('clibato', 'WARNING'):
+            subject = Manifest.load(self._path)
+
+        self.assert_length(subject, 0)
+
+    def test_save_and_load(self):
+        """.save() writes entries that .load() can read"""
+        entry = ManifestEntry(12, 1234567890, 42, 'abc')
+        subject = Manifest(self._path)
+        subject.set(Path('hole', '.wabbit'), entry)
+        subject.save()
+
+        self.assertEqual(entry, Manifest.load(self._path).get(Path('hole', '.wabbit')))
+
+    def test_save_only_if_modified(self):
+        """.save() doesn't write an unmodified manifest"""
+        Manifest(self._path).save()
+
+        self.assert_file_not_exists(self._path)
+
+    def test_entry_matches(self):
+        """ManifestEntry.matches() compares size, mtime and inode"""
+        path = Path(self._tempdir.name, '.bunny')
+        path.write_text('I am a bunny')
+        entry = ManifestEntry.from_stat(os.stat(path))
+
+        self.assertTrue(entry.matches(os.stat(path)))
+
+        path.write_text('I am a wabbit')
+        self.assertFalse(entry.matches(os.stat(path)))
+
+    def test_digest(self):
+        """digest() returns the SHA-256 of a file"""
+        path = Path(self._tempdir.name, '.bunny')
+        path.write_text('I am a bunny')
+
+        self.assertEqual(
+            'fe3d071dcff7f54de2b66a624ff7f9dda0aff2e528f6271bdb9b4cf7e56c2f8f',
+            digest(path)
+        )
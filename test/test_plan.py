@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+from clibato import Content, ManifestEntry, Operation, Plan
+from clibato.plan import FanoutPlan
+from .support import TestCase
+
+
+class TestPlan(TestCase):
+    """Test clibato.Plan"""
+
+    def test_summary(self):
+        """.summary() counts operations and bytes to copy"""
+        subject = self._build_plan()
+
+        self.assertEqual(
+            {'mkdir': 1, 'copy': 1, 'link': 0, 'skip': 1, 'missing': 1, 'bytes': 12},
+            subject.summary()
+        )
+
+    def test_to_json(self):
+        """.to_json() describes all operations"""
+        subject = self._build_plan()
+
+        self.assertEqual(
+            {
+                'action': 'backup',
+                'summary': subject.summary(),
+                'operations': [
+                    {'action': 'mkdir', 'target': str(Path('/backup/hole'))},
+                    {
+                        'action': 'copy',
+                        'backup_path': 'hole/.wabbit',
+                        'source': str(Path('/source/hole/.wabbit')),
+                        'target': str(Path('/backup/hole/.wabbit')),
+                        'size': 12,
+                    },
+                    {
+                        'action': 'skip',
+                        'backup_path': '.bunny',
+                        'source': str(Path('/source/.bunny')),
+                        'target': str(Path('/backup/.bunny')),
+                    },
+                    {
+                        'action': 'missing',
+                        'backup_path': '.skunk',
+                        'source': str(Path('/source/.skunk')),
+                        'error': 'Not found',
+                    },
+                ],
+            },
+            json.loads(subject.to_json())
+        )
+
+    def test_fanout_plan_to_json(self):
+        """FanoutPlan.to_json() describes the plan, or the error, of each destination"""
+        plan = self._build_plan()
+        subject = FanoutPlan('backup')
+        subject.append('Directory (/backup)', plan)
+        subject.append('Archive (/backup)', error='Planning is not supported for: Archive')
+
+        self.assertEqual(
+            {
+                'action': 'backup',
+                'destinations': [
+                    {
+                        'destination': 'Directory (/backup)',
+                        'summary': plan.summary(),
+                        'operations': plan.to_dict()['operations'],
+                    },
+                    {
+                        'destination': 'Archive (/backup)',
+                        'error': 'Planning is not supported for: Archive',
+                    },
+                ],
+            },
+            json.loads(subject.to_json())
+        )
+
+    @staticmethod
+    def _build_plan():
+        wabbit = Content('hole/.wabbit', '/source/hole/.wabbit')
+        bunny = Content('.bunny', '/source/.bunny')
+        skunk = Content('.skunk', '/source/.skunk')
+        entry = ManifestEntry(12, 1, 1)
+
+        return Plan('backup', [
+            Operation('mkdir', Path('/backup/hole')),
+            Operation(
+                'copy', Path('/backup/hole/.wabbit'), wabbit.source_path(), wabbit, 12, entry
+            ),
+            Operation('skip', Path('/backup/.bunny'), bunny.source_path(), bunny, 12),
+            Operation('missing', None, skunk.source_path(), skunk, error='Not found'),
+        ])
@@ -0,0 +1,366 @@
+from tempfile import gettempdir
+import unittest
+
+from git import Repo
+
+from clibato import ActionError, Content, ContentTree, ConfigError
+from clibato.destination import Destination, Directory
+from clibato.repository import Repository
+from .support import TestCase
+
+
+class TestRepository(TestCase):
+    """Test destination.Repository"""
+
+    def test_new(self):
+        """Instance creation."""
+        subject = Repository(
+            gettempdir(),
+            'git@github.com:jigarius/clibato.git',
+            branch='backup',
+            user_name='Jigarius',
+            user_mail='jigarius@example.com',
+        )
+
+        self.assertIsInstance(subject, Repository)
+
+    def test__eq__(self):
+        """__eq__()"""
+        subject = Repository(gettempdir(), 'git@github.com:bunny/wabbit.git')
+
+        self.assertEqual(
+            subject,
+            Repository(gettempdir(), 'git@github.com:bunny/wabbit.git')
+        )
+
+        self.assertNotEqual(
+            subject,
+            Repository(gettempdir(), 'git@github.com:bucky/wabbit.git')
+        )
+
+        self.assertNotEqual(
+            subject,
+            Directory(gettempdir())
+        )
+
+    def test_inheritance(self):
+        """Repository must extend Directory"""
+        self.assert_is_subclass(Repository, Destination)
+
+    def test_path_cannot_be_empty(self):
+        """Path cannot be empty"""
+        message = 'Path cannot be empty'
+        with self.assertRaisesRegex(ConfigError, message):
+            Repository('', 'git@github.com:jigarius/clibato.git')
+
+    def test_remote_cannot_be_empty(self):
+        """Remote cannot be empty"""
+        message = 'Remote cannot be empty'
+        with self.assertRaisesRegex(ConfigError, message):
+            Repository(gettempdir(), '')
+
+    def test_worktree_must_be_boolean(self):
+        """Worktree must be a boolean"""
+        with self.assertRaisesRegex(ConfigError, 'Worktree must be a boolean: no'):
+            Repository(gettempdir(), 'git@github.com:jigarius/clibato.git', worktree='no')
+
+    def test_backup_without_worktree(self):
+        """.backup() commits from the object database, without a work tree"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        remote_path = self.create_git_remote()
+        subject = Repository(str(backup_path), str(remote_path), worktree=False)
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+        ]
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.backup(contents)
+
+        self.assertIn('INFO:clibato:2 change(s) detected.', cm.output)
+        self.assertEqual(['.git'], [path.name for path in backup_path.iterdir()])
+
+        remote = Repo(remote_path)
+        commit = remote.heads['main'].commit
+        self.assertEqual('Clibato backup', commit.message)
+        self.assertEqual(b'I am a wabbit', (commit.tree / 'hole' / '.wabbit').data_stream.read())
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.backup(contents)
+
+        self.assertIn('INFO:clibato:0 change(s) detected.', cm.output)
+        self.assertEqual(commit, remote.heads['main'].commit)
+        self.assertLess(subject.counters().get('git_processes'), 10)
+
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+        subject.backup(contents)
+
+        self.assertEqual((commit,), remote.heads['main'].commit.parents)
+        self.assertEqual(
+            b'I am a bunny, still',
+            (remote.heads['main'].commit.tree / '.bunny').data_stream.read()
+        )
+
+    def test_plan_without_worktree(self):
+        """.plan_backup() and .plan_restore() don't change the repository"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        remote_path = self.create_git_remote()
+        subject = Repository(str(backup_path), str(remote_path), worktree=False)
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        with self.assertLogs('clibato', 'WARNING') as cm:
+            plan = subject.plan_backup(contents)
+
+        self.assertEqual([f'WARNING:clibato:Repository not found: {backup_path}'], cm.output)
+        self.assertEqual(['copy'], [operation.action for operation in plan])
+        self.assertEqual([], list(backup_path.iterdir()))
+
+        with self.assertRaisesRegex(ActionError, f'Repository not found: {backup_path}'):
+            subject.plan_restore(contents)
+
+        # Another host backs up, and origin/main is fetched, but main stays.
+        subject.backup(contents)
+        commit = Repo(backup_path).heads['main'].commit
+        other_path = self.create_file_fixtures(location='source')[1]
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+        Repository(str(other_path), str(remote_path), worktree=False).backup(contents)
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+        Repo(backup_path).remotes.origin.fetch()
+
+        subject = Repository(str(backup_path), str(remote_path), worktree=False)
+        for plan in [subject.plan_backup(contents), subject.plan_restore(contents)]:
+            self.assertEqual(['copy'], [operation.action for operation in plan])
+        self.assertEqual(commit, Repo(backup_path).heads['main'].commit)
+
+    def test_restore_without_worktree(self):
+        """.restore() reads from the object database, without a work tree"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        remote_path = self.create_git_remote()
+        subject = Repository(str(backup_path), str(remote_path), worktree=False)
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+            Content('.skunk', source_path / '.skunk'),
+        ]
+        subject.backup(contents[:2])
+        (source_path / self.WABBIT_PATH).unlink()
+        (source_path / 'hole').rmdir()
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.restore(contents)
+
+        self.assertEqual(
+            [
+                'DEBUG:clibato:Skipping fetch, origin/main is up-to-date.',
+                f'DEBUG:clibato:Unchanged: {source_path / self.BUNNY_PATH}',
+                f"DEBUG:clibato:Creating directory: {source_path / 'hole'}",
+                f'INFO:clibato:Restored: {source_path / self.WABBIT_PATH}',
+                'ERROR:clibato:Not found in main: .skunk',
+            ],
+            cm.output
+        )
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_depth_is_validated(self):
+        """Depth must be a positive integer"""
+        with self.assertRaisesRegex(ConfigError, 'Depth must be a positive integer: 0'):
+            Repository(gettempdir(), 'git@github.com:jigarius/clibato.git', depth=0)
+
+    def test_restore_shallow_partial(self):
+        """.restore() fetches only the tip of the branch, without blobs"""
+        remote_path = self.create_git_remote([
+            {self.BUNNY_PATH: 'I was a bunny'},
+            {self.BUNNY_PATH: 'I am a bunny', self.WABBIT_PATH: 'I am a wabbit'},
+        ])
+        for worktree in [True, False]:
+            # Empty source and backup directories.
+            source_path, _ = self.create_file_fixtures(location='backup')
+            _, backup_path = self.create_file_fixtures(location='source')
+            contents = [
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+                Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+            ]
+
+            subject = Repository(
+                str(backup_path), str(remote_path), depth=1, filter='blob:none', worktree=worktree
+            )
+            subject.restore(contents)
+
+            self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+            self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+
+            repo = Repo(backup_path)
+            self.assertEqual('1', repo.git.rev_list('--count', 'main'))
+            self.assertTrue((backup_path / '.git' / 'shallow').is_file())
+            self.assertEqual('true', repo.git.config('remote.origin.promisor'))
+
+    def test_fetch_ttl_is_validated(self):
+        """Fetch TTL must be a non-negative integer"""
+        with self.assertRaisesRegex(ConfigError, 'Fetch TTL must be a non-negative integer: -1'):
+            Repository(gettempdir(), 'git@github.com:jigarius/clibato.git', fetch_ttl=-1)
+
+    def test_restore_skips_fetch(self):
+        """.restore() only fetches if the branch moved in origin"""
+        remote_path = self.create_git_remote([{self.BUNNY_PATH: 'I am a bunny'}])
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+        subject = Repository(str(backup_path), str(remote_path), worktree=False)
+        skip_message = 'DEBUG:clibato:Skipping fetch, origin/main is up-to-date.'
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.restore(contents)
+            subject.restore(contents)
+
+        self.assertEqual(1, cm.output.count(skip_message))
+
+        self.push_git_commits(remote_path, [{self.BUNNY_PATH: 'I am a bunny, still'}])
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.restore(contents)
+
+        self.assertNotIn(skip_message, cm.output)
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny, still')
+
+    def test_restore_skips_fetch_within_ttl(self):
+        """.restore() doesn't check origin within the fetch TTL"""
+        remote_path = self.create_git_remote([{self.BUNNY_PATH: 'I am a bunny'}])
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+        subject = Repository(str(backup_path), str(remote_path), worktree=False, fetch_ttl=3600)
+
+        subject.restore(contents)
+        self.push_git_commits(remote_path, [{self.BUNNY_PATH: 'I am a bunny, still'}])
+        subject.restore(contents)
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_restore_at(self):
+        """.restore_at() streams blobs from a commit, without a checkout"""
+        remote_path = self.create_git_remote([
+            {self.BUNNY_PATH: 'I was a bunny', self.WABBIT_PATH: 'I was a wabbit'},
+            {self.BUNNY_PATH: 'I am a bunny'},
+        ])
+
+        commit = Repo(remote_path).commit('main~1')
+
+        for worktree in [True, False]:
+            source_path, backup_path = self.create_file_fixtures(location='source')
+            subject = Repository(str(backup_path), str(remote_path), worktree=worktree)
+            contents = [
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+                ContentTree('hole', source_path / 'hole'),
+            ]
+
+            with self.assertLogs('clibato', None) as cm:
+                subject.restore_at(contents, 'origin/main~1')
+
+            self.assertEqual(
+                [
+                    f'INFO:clibato:Restoring commit: {commit.hexsha[:7]}',
+                    f'INFO:clibato:Restored: {source_path / self.BUNNY_PATH}',
+                    f'INFO:clibato:Restored: {source_path / self.WABBIT_PATH}',
+                ],
+                [line for line in cm.output if line.startswith('INFO:clibato:Restor')]
+            )
+            self.assert_file_contents(source_path / self.BUNNY_PATH, 'I was a bunny')
+            self.assert_file_contents(source_path / self.WABBIT_PATH, 'I was a wabbit')
+            self.assertEqual(['.git'], [path.name for path in backup_path.iterdir()])
+
+            with self.assertRaisesRegex(ActionError, 'Revision not found: bunny'):
+                subject.restore_at(contents, 'bunny')
+
+    def test_backup_checks_backup_paths_only(self):
+        """.backup() only fails on uncommitted changes to backup paths"""
+        remote_path = self.create_git_remote([{'unrelated': 'I am unrelated'}])
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Repository(str(backup_path), str(remote_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            ContentTree('hole', source_path / 'hole'),
+        ]
+
+        subject.backup(contents)
+        (backup_path / 'unrelated').write_text('I am dirty')
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.backup(contents)
+
+        self.assertIn('INFO:clibato:1 change(s) detected.', cm.output)
+        self.assertEqual('I am dirty', (backup_path / 'unrelated').read_text())
+
+        # Staged changes outside the backup paths stay staged, and out of the backup.
+        (backup_path / 'staged').write_text('I am staged')
+        repo = Repo(backup_path)
+        repo.index.add(['staged'])
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny, once more')
+
+        subject.backup(contents)
+
+        self.assertEqual(
+            ['staged'],
+            [diff.b_path for diff in repo.index.diff('HEAD', R=True)]
+        )
+        head = Repo(remote_path).heads['main'].commit.tree
+        self.assertEqual(b'I am a bunny, once more', (head / self.BUNNY_PATH).data_stream.read())
+        self.assertNotIn('staged', [blob.path for blob in head.blobs])
+
+        for path in [self.BUNNY_PATH, self.WABBIT_PATH]:
+            original = (backup_path / path).read_text()
+            (backup_path / path).write_text('I am dirty')
+
+            with self.assertRaisesRegex(ActionError, 'Uncommitted changes found in'):
+                subject.backup(contents)
+
+            (backup_path / path).write_text(original)
+
+    def test_maintenance_is_validated(self):
+        """Maintenance must have positive thresholds"""
+        remote = 'git@github.com:jigarius/clibato.git'
+
+        with self.assertRaisesRegex(ConfigError, 'Maintenance has illegal keys: bunny'):
+            Repository(gettempdir(), remote, maintenance={'bunny': 1})
+
+        with self.assertRaisesRegex(ConfigError, 'Maintenance packs must be a positive integer: 0'):
+            Repository(gettempdir(), remote, maintenance={'packs': 0})
+
+    def test_backup_runs_maintenance(self):
+        """.backup() packs loose objects once there are enough of them"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        remote_path = self.create_git_remote()
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+        ]
+        subject = Repository(
+            str(backup_path),
+            str(remote_path),
+            worktree=False,
+            maintenance={'loose_objects': 10, 'background': False}
+        )
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.backup(contents)
+
+        self.assertIn(
+            'DEBUG:clibato:Maintenance not needed: 5 loose object(s), 0 pack(s).',
+            cm.output
+        )
+
+        with self.assertLogs('clibato', None) as cm:
+            for i in range(2):
+                (source_path / self.BUNNY_PATH).write_text(f'I am bunny #{i}')
+                subject.backup(contents)
+
+        self.assertIn('INFO:clibato:Running maintenance: loose-objects, commit-graph', cm.output)
+
+        objects_path = backup_path / '.git' / 'objects'
+        self.assert_length(list(objects_path.glob('pack/*.pack')), 1)
+        self.assertTrue((objects_path / 'info' / 'commit-graphs').is_dir())
+
+    @unittest.skip('TODO')
+    def test_backup(self):
+        """.backup()"""
+
+    @unittest.skip('TODO')
+    def test_restore(self):
+        """.backup()"""
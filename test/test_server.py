@@ -0,0 +1,185 @@
+from contextlib import redirect_stdout
+from io import StringIO
+import json
+import os
+from pathlib import Path
+import signal
+import socket
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import threading
+
+import yaml
+
+from clibato import ActionError, Clibato
+from clibato import server
+from clibato.server import Server
+from .support import TestCase
+
+
+class TestServer(TestCase):
+    """Test server.Server"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        self._socket_path = Path(directory.name, 'clibato.sock')
+
+        self._source_path, self._backup_path = self.create_file_fixtures(location='source')
+        self._config_path = self.create_clibato_config({
+            'contents': {
+                self.BUNNY_PATH: str(self._source_path / self.BUNNY_PATH),
+            },
+            'destination': {'type': 'directory', 'path': str(self._backup_path)}
+        })
+
+        self._subject = Server(self._socket_path)
+        self._thread = threading.Thread(target=self._subject.serve)
+        self._thread.start()
+        self._wait()
+
+    def tearDown(self) -> None:
+        self._subject.shutdown()
+        self._thread.join()
+
+        super().tearDown()
+
+    def test_backup_and_restore(self):
+        """.serve() serves backups and restores, with their logs"""
+        with self.assertLogs('clibato', 'INFO') as cm:
+            server.request(self._socket_path, {
+                'action': 'backup',
+                'config': self._config_path,
+                'level': 20
+            })
+
+        source_path = self._source_path / self.BUNNY_PATH
+        self.assertIn(f'INFO:clibato:Backed up: {source_path}', cm.output)
+        self.assert_file_contents(self._backup_path / self.BUNNY_PATH, 'I am a bunny')
+
+        source_path.unlink()
+        server.request(self._socket_path, {'action': 'restore', 'config': self._config_path})
+
+        self.assert_file_contents(source_path, 'I am a bunny')
+
+    def test_config_is_kept(self):
+        """.serve() keeps configs until their files change"""
+        data = {'action': 'backup', 'config': self._config_path, 'level': 10}
+        server.request(self._socket_path, data)
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            server.request(self._socket_path, data)
+
+        self.assertIn(f'DEBUG:clibato:Using loaded configuration: {self._config_path}', cm.output)
+
+        with open(self._config_path, 'w') as fh:
+            yaml.safe_dump({
+                'contents': {self.WABBIT_PATH: str(self._source_path / self.WABBIT_PATH)},
+                'destination': {'type': 'directory', 'path': str(self._backup_path)}
+            }, fh)
+
+        server.request(self._socket_path, data)
+
+        self.assert_file_contents(self._backup_path / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_errors(self):
+        """.serve() sends errors to the client, and keeps serving"""
+        with self.assertRaisesRegex(ActionError, 'Restoring a revision is not supported'):
+            server.request(self._socket_path, {
+                'action': 'restore',
+                'config': self._config_path,
+                'revision': 'main'
+            })
+
+        with self.assertRaisesRegex(ActionError, 'Illegal request: Illegal action: oops'):
+            server.request(self._socket_path, {'action': 'oops'})
+
+        server.request(self._socket_path, {'action': 'ping'})
+
+    def test_already_serving(self):
+        """.serve() fails if another server is listening on the socket"""
+        with self.assertRaisesRegex(ActionError, f'Already serving on: {self._socket_path}'):
+            Server(self._socket_path).serve()
+
+    def test_request_without_server(self):
+        """request() fails if the server is not running"""
+        socket_path = self._socket_path.with_name('missing.sock')
+        with self.assertRaisesRegex(ActionError, f'Server not running: {socket_path}'):
+            server.request(socket_path, {'action': 'ping'})
+
+    def test_client(self):
+        """Test: clibato backup --socket"""
+        with redirect_stdout(StringIO()) as output:
+            self.assertTrue(Clibato().execute([
+                'backup', '--config', self._config_path, '--socket', str(self._socket_path)
+            ]))
+
+        self.assertEqual('Backup completed.\n', output.getvalue())
+        self.assert_file_contents(self._backup_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def _wait(self) -> None:
+        """Waits for the server to listen."""
+        for _ in range(100):
+            with socket.socket(socket.AF_UNIX) as sock:
+                try:
+                    sock.connect(str(self._socket_path))
+                    sock.sendall(json.dumps({'action': 'ping'}).encode() + b'\n')
+                    sock.recv(1024)
+                    return
+                except OSError:
+                    threading.Event().wait(0.01)
+
+        self.fail('Server did not start')
+
+
+class TestServeAction(TestCase):
+    """Test: clibato serve"""
+
+    def test_sigterm(self):
+        """SIGTERM stops the server after the current request"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        config_path = self.create_clibato_config({
+            'contents': {self.BUNNY_PATH: str(source_path / self.BUNNY_PATH)},
+            'destination': {'type': 'directory', 'path': str(backup_path)}
+        })
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        socket_path = Path(directory.name, 'clibato.sock')
+
+        with subprocess.Popen(
+            [sys.executable, '-m', 'clibato', 'serve', '--socket', str(socket_path)],
+            cwd=Clibato.ROOT,
+            env={**os.environ, 'PYTHONUNBUFFERED': '1'},
+            stdout=subprocess.PIPE,
+            text=True
+        ) as process:
+            self.addCleanup(process.kill)
+            self.assertIn('Serving on', process.stdout.readline())
+
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.settimeout(5)
+                for _ in range(100):
+                    try:
+                        sock.connect(str(socket_path))
+                        break
+                    except OSError:
+                        threading.Event().wait(0.05)
+
+                # The request is being served, i.e. read.
+                threading.Event().wait(0.2)
+                process.send_signal(signal.SIGTERM)
+                threading.Event().wait(0.2)
+
+                data = {'action': 'backup', 'config': str(config_path)}
+                sock.sendall(json.dumps(data).encode() + b'\n')
+                with sock.makefile('rb') as reader:
+                    self.assertEqual({'ok': True}, json.loads(reader.readline()))
+
+            self.assertEqual('Server stopped.\n', process.stdout.read())
+            self.assertEqual(0, process.wait(5))
+
+        self.assert_file_contents(backup_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assertFalse(socket_path.exists())
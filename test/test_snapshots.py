@@ -0,0 +1,96 @@
+from tempfile import gettempdir
+
+from clibato import ActionError, Content, ConfigError
+from clibato.destination import Destination, Snapshots
+from clibato.manifest import Manifest
+from .support import TestCase
+
+
+class TestSnapshots(TestCase):
+    """Test destination.Snapshots"""
+
+    def test_from_dict(self):
+        """Destination.from_dict() creates Snapshots"""
+        subject = Destination.from_dict({
+            'type': 'snapshots',
+            'path': gettempdir(),
+            'keep': 7
+        })
+
+        self.assertEqual(Snapshots(gettempdir(), keep=7), subject)
+
+    def test_keep_must_be_positive(self):
+        """Keep must be a positive integer"""
+        with self.assertRaisesRegex(ConfigError, 'Keep must be a positive integer: 0'):
+            Snapshots(gettempdir(), keep=0)
+
+    def test_backup(self):
+        """.backup() hard links unchanged files to the previous snapshot"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Snapshots(str(backup_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ]
+
+        subject.backup(contents)
+        (source_path / self.WABBIT_PATH).write_text('I am a wabbit too')
+        subject.backup(contents)
+
+        first, second = subject.snapshots()
+        self.assert_file_contents(first / self.WABBIT_PATH, 'I am a wabbit')
+        self.assert_file_contents(second / self.WABBIT_PATH, 'I am a wabbit too')
+        self.assertTrue((first / self.BUNNY_PATH).samefile(second / self.BUNNY_PATH))
+        self.assertFalse((first / self.WABBIT_PATH).samefile(second / self.WABBIT_PATH))
+
+    def test_backup_prunes_old_snapshots(self):
+        """.backup() keeps the configured number of snapshots"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Snapshots(str(backup_path), keep=2)
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        for _ in range(3):
+            subject.backup(contents)
+
+        snapshots = subject.snapshots()
+        self.assert_length(snapshots, 2)
+        self.assert_file_contents(snapshots[-1] / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_restore(self):
+        """.restore() restores the latest snapshot"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Snapshots(str(backup_path))
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH)
+        ]
+
+        subject.backup(contents)
+        (source_path / self.WABBIT_PATH).write_text('I am a wabbit too')
+        subject.backup(contents)
+        (source_path / self.BUNNY_PATH).unlink()
+        (source_path / self.WABBIT_PATH).unlink()
+        subject.restore(contents)
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit too')
+
+    def test_plan_backup_with_manifest(self):
+        """.plan_backup() plans against a given manifest"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Snapshots(str(backup_path))
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        subject.backup(contents)
+        plan = subject.plan_backup(contents)
+        self.assertEqual(['mkdir', 'link'], [operation.action for operation in plan])
+
+        plan = subject.plan_backup(contents, Manifest(backup_path / 'manifest.json'))
+        self.assertEqual(['mkdir', 'copy'], [operation.action for operation in plan])
+
+    def test_restore_without_snapshots(self):
+        """.restore() fails if there are no snapshots"""
+        _, backup_path = self.create_file_fixtures(location='source')
+        subject = Snapshots(str(backup_path))
+        with self.assertRaisesRegex(ActionError, 'No snapshots found in'):
+            subject.restore([])
@@ -0,0 +1,78 @@
+from clibato import Stats
+from clibato import stats
+from .support import TestCase
+
+
+class TestStats(TestCase):
+    """Test stats.Stats"""
+
+    def test_phase(self):
+        """.phase() adds up the durations and calls of a phase"""
+        subject = Stats()
+        with subject.phase('plan'):
+            pass
+        with subject.phase('plan'):
+            subject.add('plan', files=2, size=10)
+        subject.add('plan', files=1)
+
+        phase = subject.to_dict()['phases']['plan']
+        self.assertEqual(2, phase['calls'])
+        self.assertEqual(3, phase['files'])
+        self.assertEqual(10, phase['bytes'])
+        self.assertGreaterEqual(phase['seconds'], 0)
+
+    def test_phase_with_error(self):
+        """.phase() times a phase that fails"""
+        subject = Stats()
+        with self.assertRaises(OSError), subject.phase('transfer'):
+            raise OSError('Oops')
+
+        self.assertEqual(1, subject.to_dict()['phases']['transfer']['calls'])
+
+    def test_count(self):
+        """.count() increments counters"""
+        subject = Stats()
+        subject.count('git_processes', 2)
+        subject.count('git_processes')
+
+        self.assertEqual({'git_processes': 3}, subject.to_dict()['counters'])
+
+    def test_summary(self):
+        """.summary() has a line per phase, a total and the counters"""
+        subject = Stats()
+        subject.add('transfer', files=2, size=25)
+        subject.count('git_processes', 4)
+
+        lines = subject.summary().splitlines()
+        self.assertRegex(lines[0], r'^Phase +Seconds +Calls +Files +Bytes$')
+        self.assertRegex(lines[1], r'^transfer +0\.000 +0 +2 +25$')
+        self.assertRegex(lines[2], r'^total +[0-9.]+$')
+        self.assertEqual('git_processes: 4', lines[3])
+
+    def test_recording(self):
+        """Stats are only recorded within recording()"""
+        stats.add('transfer', files=1)
+
+        with stats.recording() as subject:
+            with stats.phase('config'):
+                stats.add('transfer', files=1, size=12)
+            stats.count('git_processes')
+
+        stats.count('git_processes')
+
+        data = subject.to_dict()
+        self.assertEqual(['config', 'transfer'], list(data['phases']))
+        self.assertEqual(1, data['phases']['transfer']['files'])
+        self.assertEqual({'git_processes': 1}, data['counters'])
+
+    def test_timed(self):
+        """timed() times calls of a function"""
+        @stats.timed('git_push')
+        def push(branch):
+            return branch
+
+        with stats.recording() as subject:
+            self.assertEqual('main', push('main'))
+            push('main')
+
+        self.assertEqual(2, subject.to_dict()['phases']['git_push']['calls'])
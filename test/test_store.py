@@ -0,0 +1,144 @@
+from pathlib import Path
+from tempfile import gettempdir
+from unittest import mock
+
+from clibato import transfer, Content, ContentTree, ConfigError
+from clibato.destination import Destination, Directory, Store
+from clibato.manifest import digest
+from .support import TestCase
+
+
+class TestStore(TestCase):
+    """Test destination.Store"""
+
+    def test_from_dict(self):
+        """Destination.from_dict() creates a Store"""
+        subject = Destination.from_dict({
+            'type': 'store',
+            'path': gettempdir(),
+            'name': 'bunny'
+        })
+
+        self.assertEqual(Store(gettempdir(), 'bunny'), subject)
+        self.assertEqual('bunny', subject.name())
+
+    def test_inheritance(self):
+        """Store must extend Directory"""
+        self.assert_is_subclass(Store, Directory)
+
+    def test_name_is_validated(self):
+        """Name cannot contain path separators"""
+        for name in [str(Path('bunny', 'wabbit')), '.bunny']:
+            with self.assertRaisesRegex(ConfigError, 'Name is invalid'):
+                Store(gettempdir(), name)
+
+    def test_backup_and_restore(self):
+        """.backup() stores bodies once, .restore() reads them back"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        (source_path / '.bugs').write_text('I am a bunny')
+        contents = [
+            Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, source_path / self.WABBIT_PATH),
+            Content('.bugs', source_path / '.bugs'),
+        ]
+
+        Store(str(backup_path), 'bunny').backup(contents)
+        Store(str(backup_path), 'wabbit').backup(contents)
+
+        objects = [path for path in (backup_path / 'objects').rglob('*') if path.is_file()]
+        self.assert_length(objects, 2)
+        self.assert_file_exists(backup_path / 'refs' / 'bunny.json')
+        self.assert_file_exists(backup_path / 'refs' / 'wabbit.json')
+
+        for content in contents:
+            content.source_path().unlink()
+
+        with self.assertLogs('clibato', None) as cm:
+            Store(str(backup_path), 'wabbit').restore(contents)
+
+        self.assert_length(cm.records, 3)
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_contents(source_path / self.WABBIT_PATH, 'I am a wabbit')
+        self.assert_file_contents(source_path / '.bugs', 'I am a bunny')
+
+    def test_backup_skips_unchanged_files(self):
+        """.backup() only updates the ref for unchanged files"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Store(str(backup_path), 'bunny')
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+
+        subject.backup(contents)
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.backup(contents)
+
+        self.assertEqual(
+            [f'DEBUG:clibato:Unchanged: {source_path / self.BUNNY_PATH}'],
+            [line for line in cm.output if 'Manifest saved' not in line]
+        )
+
+    def test_backup_source_changed(self):
+        """.backup() names objects after what was copied, if a source changes meanwhile"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        contents = [Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)]
+        install_digest = transfer.install_digest
+
+        def change_and_install(source, *args):
+            Path(source).write_text('I am a bunny, still')
+            return install_digest(source, *args)
+
+        with mock.patch.object(transfer, 'install_digest', change_and_install):
+            Store(str(backup_path), 'bunny').backup(contents)
+
+        objects = [path for path in (backup_path / 'objects').rglob('*') if path.is_file()]
+        self.assert_length(objects, 1)
+        self.assertEqual(digest(objects[0]), objects[0].parent.name + objects[0].name)
+
+        # Another host with the old body doesn't get linked to the new one.
+        (source_path / self.BUNNY_PATH).write_text('I am a bunny')
+        Store(str(backup_path), 'wabbit').backup(contents)
+        (source_path / self.BUNNY_PATH).unlink()
+
+        Store(str(backup_path), 'bunny').restore(contents)
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny, still')
+
+        Store(str(backup_path), 'wabbit').restore(contents)
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_backup_and_restore_tree(self):
+        """.backup() and .restore() expand content trees"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Store(str(backup_path), 'bunny')
+        subject.backup([ContentTree('burrow', str(source_path))])
+        (source_path / self.BUNNY_PATH).unlink()
+        (source_path / self.WABBIT_PATH).unlink()
+
+        subject.restore([ContentTree('burrow', str(source_path), exclude=['hole'])])
+
+        self.assert_file_contents(source_path / self.BUNNY_PATH, 'I am a bunny')
+        self.assert_file_not_exists(source_path / self.WABBIT_PATH)
+
+    def test_restore_file_not_found(self):
+        """.restore() logs and continues if a file is not in the ref"""
+        source_path, backup_path = self.create_file_fixtures(location='source')
+        subject = Store(str(backup_path), 'bunny')
+        subject.backup([Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH)])
+        (source_path / self.BUNNY_PATH).unlink()
+
+        with self.assertLogs('clibato', None) as cm:
+            subject.restore([
+                Content('.skunk', source_path / '.skunk'),
+                Content(self.BUNNY_PATH, source_path / self.BUNNY_PATH),
+            ])
+
+        self.assert_log_record(
+            cm.records[0],
+            level='ERROR',
+            message="[Errno 2] No such file or directory: '.skunk'"
+        )
+        self.assert_log_record(
+            cm.records[1],
+            level='INFO',
+            message=f'Restored: {source_path / self.BUNNY_PATH}'
+        )
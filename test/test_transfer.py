@@ -0,0 +1,248 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import time
+from unittest import mock
+
+from clibato import ActionError, transfer
+from clibato.manifest import digest
+from clibato.transfer import Counters, DirectoryCache
+from .support import TestCase
+
+
+class TestTransfer(TestCase):
+    """Test clibato.transfer"""
+
+    def test_run(self):
+        """.run() yields results in the order of the items"""
+        def func(item):
+            time.sleep(0.01 * (5 - item))
+            return item * 10
+
+        results = list(transfer.run(func, range(5), jobs=3))
+
+        self.assertEqual(
+            [(0, 0, None), (1, 10, None), (2, 20, None), (3, 30, None), (4, 40, None)],
+            results
+        )
+
+    def test_run_collects_errors(self):
+        """.run() yields expected errors along with their items"""
+        def func(item):
+            if item % 2:
+                raise FileNotFoundError(item)
+            return item
+
+        for jobs in [1, 4]:
+            results = list(transfer.run(func, range(4), jobs=jobs))
+            self.assertEqual([None, None], [results[0][2], results[2][2]])
+            self.assertIsInstance(results[1][2], FileNotFoundError)
+            self.assertIsInstance(results[3][2], FileNotFoundError)
+
+    def test_run_raises_unexpected_errors(self):
+        """.run() raises errors that aren't expected"""
+        def func(item):
+            raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            list(transfer.run(func, range(4), jobs=2))
+
+    def test_directory_cache(self):
+        """DirectoryCache.ensure() creates directories once"""
+        tempdir = TemporaryDirectory()
+        path = Path(tempdir.name, 'bunny', 'hole')
+        subject = DirectoryCache()
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            subject.ensure(path)
+            subject.ensure(path)
+
+        self.assert_length(cm.records, 1)
+        self.assertTrue(path.is_dir())
+
+    def test_copy(self):
+        """.copy() copies files with each method"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        source.write_bytes(b'I am a bunny' * 100000)
+
+        for method in transfer.COPY_METHODS:
+            target = Path(tempdir.name, f'.bunny.{method}')
+            try:
+                used = transfer.copy(source, target, method)
+            except ActionError:
+                # Reflinks are only supported by some filesystems.
+                self.assertEqual('reflink', method)
+                continue
+
+            self.assertIn(used, transfer.COPY_METHODS)
+            if method != 'auto':
+                self.assertEqual(method, used)
+            self.assertEqual(source.read_bytes(), target.read_bytes())
+
+    def test_copy_overwrites_target(self):
+        """.copy() truncates existing targets"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        source.write_text('I am a bunny')
+        target = Path(tempdir.name, '.wabbit')
+        target.write_text('I am a wabbit, not a bunny')
+
+        with self.assertLogs('clibato', 'DEBUG') as cm:
+            method = transfer.copy(source, target)
+
+        self.assertEqual([f'DEBUG:clibato:Copied with {method}: {source}'], cm.output)
+        self.assert_file_contents(target, 'I am a bunny')
+
+    def test_copy_falls_back_on_empty_copies(self):
+        """.copy() tries the next method if one copies nothing"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        source.write_text('I am a bunny')
+        target = Path(tempdir.name, '.wabbit')
+
+        empty = mock.Mock(return_value=0)
+        with mock.patch.multiple('os', copy_file_range=empty, sendfile=empty, create=True):
+            for method in ['copy_file_range', 'sendfile']:
+                with self.assertRaisesRegex(ActionError, 'copied nothing'):
+                    transfer.copy(source, target, method)
+
+
+        with mock.patch('os.copy_file_range', empty, create=True):
+            self.assertNotEqual('copy_file_range', transfer.copy(source, target))
+
+        self.assert_file_contents(target, 'I am a bunny')
+
+    def test_copy_file_not_found(self):
+        """.copy() raises FileNotFoundError for missing sources"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.skunk')
+
+        for method in transfer.COPY_METHODS:
+            with self.assertRaises(FileNotFoundError):
+                transfer.copy(source, Path(tempdir.name, '.wabbit'), method)
+
+    def test_delta_copy(self):
+        """.delta_copy() only writes blocks that differ"""
+        tempdir = TemporaryDirectory()
+        block_size = transfer.DELTA_BLOCK_SIZE
+        source = Path(tempdir.name, '.bunny')
+        target = Path(tempdir.name, '.wabbit')
+
+        data = bytearray(b'b' * block_size * 4)
+        target.write_bytes(bytes(data) + b'trailing garbage')
+        data[block_size + 1] = ord('w')
+        source.write_bytes(bytes(data))
+
+        counters = Counters()
+        transfer.delta_copy(source, target, counters)
+
+        self.assertEqual(source.read_bytes(), target.read_bytes())
+        self.assertEqual(
+            {'bytes_compared': block_size * 4, 'bytes_written': block_size},
+            counters.as_dict()
+        )
+
+    def test_delta_copy_grows_target(self):
+        """.delta_copy() appends blocks missing from the target"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        target = Path(tempdir.name, '.wabbit')
+        source.write_bytes(b'I am a bunny' * 10000)
+        target.write_bytes(b'I am a bunny' * 5000)
+
+        transfer.delta_copy(source, target)
+
+        self.assertEqual(source.read_bytes(), target.read_bytes())
+
+    def test_replace(self):
+        """.replace() replaces the target, leaving no temporary files"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        target = Path(tempdir.name, '.wabbit')
+        source.write_text('I am a bunny')
+
+        transfer.replace(source, target)
+        self.assert_file_contents(target, 'I am a bunny')
+
+        source.write_text('I am a wabbit')
+        transfer.replace(source, target)
+        self.assert_file_contents(target, 'I am a wabbit')
+        self.assertEqual(
+            ['.bunny', '.wabbit'],
+            sorted(p.name for p in Path(tempdir.name).iterdir())
+        )
+
+    def test_replace_cleans_up(self):
+        """.replace() removes its temporary file on errors"""
+        tempdir = TemporaryDirectory()
+
+        with self.assertRaises(FileNotFoundError):
+            transfer.replace(Path(tempdir.name, '.skunk'), Path(tempdir.name, '.wabbit'))
+
+        self.assertEqual([], list(Path(tempdir.name).iterdir()))
+
+    def test_install_digest(self):
+        """.install_digest() names the target after the digest of the bytes copied"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        source.write_text('I am a bunny')
+        objects = Path(tempdir.name, 'objects')
+        objects.mkdir()
+
+        def locate(checksum):
+            return objects / checksum[:2] / checksum[2:]
+
+        checksum = transfer.install_digest(source, locate, objects)
+
+        self.assertEqual(digest(source), checksum)
+        self.assert_file_contents(objects / checksum[:2] / checksum[2:], 'I am a bunny')
+        self.assertEqual([checksum[:2]], [p.name for p in objects.iterdir()])
+
+    def test_shared_reads(self):
+        """SharedReads reads a file once for all readers, unless it changes"""
+        tempdir = TemporaryDirectory()
+        path = Path(tempdir.name, '.bunny')
+        path.write_text('I am a bunny')
+        subject = transfer.SharedReads(2)
+
+        for _ in range(2):
+            stat, data = subject.read(path)
+            self.assertEqual(b'I am a bunny', data)
+            self.assertEqual(12, stat.st_size)
+
+        path.write_text('I am a bunny, still')
+        self.assertEqual(b'I am a bunny, still', subject.read(path)[1])
+        self.assertEqual({'files_read': 2, 'files_shared': 1}, subject.counters().as_dict())
+
+        with mock.patch.object(transfer.SharedReads, 'MAX_SIZE', 4):
+            self.assertIsNone(subject.read(path))
+
+    def test_copy_shares_reads(self):
+        """.copy() uses shared reads, if any"""
+        tempdir = TemporaryDirectory()
+        source = Path(tempdir.name, '.bunny')
+        source.write_text('I am a bunny')
+
+        self.assertIsNone(transfer.read_shared(source))
+        with transfer.sharing(2) as shared:
+            for name in ['.wabbit', '.bugs']:
+                self.assertEqual('shared', transfer.copy(source, Path(tempdir.name, name)))
+                self.assert_file_contents(Path(tempdir.name, name), 'I am a bunny')
+
+        self.assertEqual(1, shared.counters().get('files_read'))
+        self.assertIsNone(transfer.read_shared(source))
+
+    def test_is_identical(self):
+        """.is_identical() compares sizes, then digests"""
+        tempdir = TemporaryDirectory()
+        bunny = Path(tempdir.name, '.bunny')
+        wabbit = Path(tempdir.name, '.wabbit')
+        bunny.write_text('I am a bunny')
+
+        self.assertFalse(transfer.is_identical(bunny, wabbit))
+
+        wabbit.write_text('I am a bunny')
+        self.assertTrue(transfer.is_identical(bunny, wabbit))
+
+        wabbit.write_text('I am a bugsy')
+        self.assertFalse(transfer.is_identical(bunny, wabbit))
@@ -0,0 +1,188 @@
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+from git import Repo
+
+from clibato import Content, ContentTree
+from clibato.destination import Directory, Snapshots
+from clibato.repository import Repository
+from clibato.watch import Inotify, Poller, Watch, watcher
+from .support import TestCase
+
+INOTIFY = sys.platform.startswith('linux')
+
+
+class TestWatchers(TestCase):
+    """Test watch.Inotify and watch.Poller"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        directory = TemporaryDirectory()
+        self._fixtures.append(directory)
+        self._path = Path(directory.name)
+        (self._path / self.BUNNY_PATH).write_text('I am a bunny')
+
+    def test_poller(self):
+        """Poller reports new and modified files, and new directories"""
+        self._test_watcher(Poller(0.01))
+
+    @unittest.skipUnless(INOTIFY, 'inotify is only available on Linux')
+    def test_inotify(self):
+        """Inotify reports new and modified files, and new directories"""
+        self._test_watcher(Inotify())
+
+    def test_watcher(self):
+        """watcher() polls if requested, or if inotify is not available"""
+        self.assertIsInstance(watcher(poll=True), Poller)
+        self.assertIsInstance(watcher(), Inotify if INOTIFY else Poller)
+
+    def test_add_missing_directory(self):
+        """Missing directories are not watched"""
+        for subject in [Poller()] + ([Inotify()] if INOTIFY else []):
+            with self.assertLogs('clibato', 'WARNING'):
+                self.assertFalse(subject.add(self._path / 'oops'))
+            subject.close()
+
+    def _test_watcher(self, subject):
+        self.assertTrue(subject.add(self._path))
+        self.assertEqual(set(), subject.read(0.05))
+
+        (self._path / self.BUNNY_PATH).write_text('I am a bunny, still')
+        self.assertEqual({self._path / self.BUNNY_PATH}, subject.read(5))
+
+        (self._path / 'hole').mkdir()
+        self.assertEqual({self._path / 'hole'}, subject.read(5))
+
+        subject.close()
+
+
+class TestWatch(TestCase):
+    """Test watch.Watch"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self._source_path, self._backup_path = self.create_file_fixtures(location='source')
+        self._contents = [
+            Content(self.BUNNY_PATH, self._source_path / self.BUNNY_PATH),
+            Content(self.WABBIT_PATH, self._source_path / self.WABBIT_PATH),
+        ]
+
+    def test_backup_changes(self):
+        """.backup_changes() backs up only the changed files"""
+        for poll in [True, False] if INOTIFY else [True]:
+            with self.subTest(poll=poll):
+                destination = Directory(str(self._backup_path))
+                with Watch(self._contents, destination, 0.05, poll) as subject:
+                    self.assertEqual([], subject.backup_changes(0.05))
+
+                    (self._source_path / self.BUNNY_PATH).write_text(f'I am bunny #{poll}')
+                    self.assertEqual([self._contents[0]], subject.backup_changes(5))
+
+                self.assert_file_contents(
+                    self._backup_path / self.BUNNY_PATH,
+                    f'I am bunny #{poll}'
+                )
+                self.assert_file_not_exists(self._backup_path / self.WABBIT_PATH)
+
+    def test_backup_changes_in_tree(self):
+        """.backup_changes() watches new directories of trees"""
+        contents = [ContentTree('.config', self._source_path, exclude=['*.log'])]
+        destination = Directory(str(self._backup_path))
+
+        with Watch(contents, destination, 0.05) as subject:
+            (self._source_path / 'fish').mkdir()
+            (self._source_path / 'fish' / 'config.fish').write_text('set -x EDITOR vim')
+            (self._source_path / 'fish' / 'fish.log').write_text('Oops')
+
+            self.assertEqual(
+                [Content('.config/fish/config.fish', self._source_path / 'fish' / 'config.fish')],
+                subject.backup_changes(5)
+            )
+
+            (self._source_path / 'fish' / 'config.fish').write_text('set -x EDITOR nano')
+            subject.backup_changes(5)
+
+        self.assert_file_contents(
+            self._backup_path / '.config' / 'fish' / 'config.fish',
+            'set -x EDITOR nano'
+        )
+        self.assert_file_not_exists(self._backup_path / '.config' / 'fish' / 'fish.log')
+        self.assert_file_not_exists(self._backup_path / '.config' / self.BUNNY_PATH)
+
+    def test_backup_changes_in_tree_root(self):
+        """.backup_changes() rescans the root of a tree, if its changes were lost"""
+        contents = [ContentTree('.config', self._source_path)]
+        destination = Directory(str(self._backup_path))
+
+        with Watch(contents, destination, 0.05, poll=True) as subject:
+            with mock.patch.object(Poller, 'read', side_effect=[{self._source_path}, set()]):
+                self.assertEqual(
+                    [
+                        Content(f'.config/{self.BUNNY_PATH}', self._source_path / self.BUNNY_PATH),
+                        Content(
+                            f'.config/{self.WABBIT_PATH}',
+                            self._source_path / self.WABBIT_PATH
+                        ),
+                    ],
+                    subject.backup_changes(5)
+                )
+
+        self.assert_file_contents(self._backup_path / '.config' / self.BUNNY_PATH, 'I am a bunny')
+
+    def test_backup_changes_with_snapshots(self):
+        """.backup_changes() backs up all contents, if the destination needs them"""
+        destination = Snapshots(str(self._backup_path))
+
+        with Watch(self._contents, destination, 0.05) as subject:
+            (self._source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+            self.assertEqual(self._contents, subject.backup_changes(5))
+
+        snapshot = destination.snapshots()[0]
+        self.assert_file_contents(snapshot / self.BUNNY_PATH, 'I am a bunny, still')
+        self.assert_file_contents(snapshot / self.WABBIT_PATH, 'I am a wabbit')
+
+    def test_backup_changes_with_repository(self):
+        """.backup_changes() commits a burst of changes at once"""
+        remote_path = self.create_git_remote()
+        destination = Repository(str(self._backup_path), str(remote_path), worktree=False)
+        destination.backup(self._contents)
+        commit = Repo(remote_path).heads['main'].commit
+
+        with Watch(self._contents, destination, 0.2) as subject:
+            (self._source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+            (self._source_path / self.WABBIT_PATH).write_text('I am a wabbit, still')
+            self.assertEqual(self._contents, subject.backup_changes(5))
+
+        head = Repo(remote_path).heads['main'].commit
+        self.assertEqual((commit,), head.parents)
+        self.assertEqual(
+            b'I am a wabbit, still',
+            (head.tree / 'hole' / '.wabbit').data_stream.read()
+        )
+
+    def test_backup_changes_with_unreachable_remote(self):
+        """.backup_changes() keeps watching if a backup fails"""
+        remote_path = self.create_git_remote()
+        destination = Repository(str(self._backup_path), str(remote_path), worktree=False)
+        destination.backup(self._contents)
+        remote_path.rename(remote_path.with_name('moved'))
+
+        with Watch(self._contents, destination, 0.05) as subject:
+            (self._source_path / self.BUNNY_PATH).write_text('I am a bunny, still')
+            with self.assertLogs('clibato', 'ERROR'):
+                self.assertEqual([self._contents[0]], subject.backup_changes(5))
+
+            remote_path.with_name('moved').rename(remote_path)
+            (self._source_path / self.WABBIT_PATH).write_text('I am a wabbit, still')
+            self.assertEqual(self._contents, subject.backup_changes(5))
+
+        head = Repo(remote_path).heads['main'].commit
+        self.assertEqual(
+            b'I am a bunny, still',
+            (head.tree / self.BUNNY_PATH).data_stream.read()
+        )